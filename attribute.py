@@ -0,0 +1,23 @@
+import argparse
+
+from src.attribution_pipeline import METHODS, STRANDS, main
+from src.scoring_pipeline import LAYOUTS
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Gradient attributions of sequences: (N, L, 4) float16 saliency, input x gradient or integrated gradients.")
+	parser.add_argument('-c', '--ckpt', required=True, help="Lightning checkpoint, e.g. logs/experiments/runs/<name>/fold0/checkpoints/best.ckpt")
+	parser.add_argument('--config', default=None, help="config with the net (default: .hydra/config.yaml of the checkpoint's run)")
+	parser.add_argument('-i', '--input', default='-', help="`seq` or `seq<TAB>target` lines, '-' for stdin")
+	parser.add_argument('-o', '--output', required=True, help=".npy file of float16 attributions, (N, L, 4) in the channel order of the layout")
+	parser.add_argument('-m', '--method', default='saliency', choices=METHODS)
+	parser.add_argument('-l', '--layout', default='onehot', choices=list(LAYOUTS), help="input encoding of the datamodule the net was trained with")
+	parser.add_argument('-s', '--strand', default='mean', choices=STRANDS, help="attribute the forward/RC mean prediction (ConjoinedNet), or one strand only")
+	parser.add_argument('--steps', type=int, default=50, help="integration steps of integrated_gradients")
+	parser.add_argument('--baseline', default='zeros', choices=['zeros', 'uniform'], help="integrated_gradients baseline: all-zero or 0.25 per base")
+	parser.add_argument('-b', '--batch_size', type=int, default=256, help="net inputs (sequences x steps) per forward/backward pass")
+	parser.add_argument('--chunk_size', type=int, default=1024, help="sequences read and written at a time")
+	parser.add_argument('-t', '--threads', type=int, default=4)
+	args = parser.parse_args()
+
+	main(args)
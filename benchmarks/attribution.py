@@ -0,0 +1,52 @@
+"""Batched gradient attributions: consistency checks and throughput per method and thread count, on CPU.
+
+python -m benchmarks.attribution -n 64 -t 4
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from src.attribution_pipeline import METHODS, attribute, baseline_like, strand_preds
+from src.datamodules.components.store import encode_many
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.scoring_pipeline import LAYOUTS, onehot_rc
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=64)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    parser.add_argument("--steps", type=int, default=50)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    net = DeepFamQ_CRC().eval().requires_grad_(False)
+    rng = np.random.default_rng(0)
+    seqs = ["".join(rng.choice(list("ACGT"), size=rng.integers(100, 111))) for _ in range(args.num)]
+    x, _ = LAYOUTS["onehot"](*encode_many(seqs))
+
+    # batching does not change the per-sequence gradients
+    batched = attribute(net, x[:8], "saliency", batch_size=8)
+    single = np.concatenate([attribute(net, x[i:i + 1], "saliency", batch_size=1) for i in range(8)])
+    print(f"saliency max |batched - one by one| = {np.abs(batched - single).max():.2e}")
+    # the mean prediction's gradient is the mean of the strand gradients
+    fwd, rc = (attribute(net, x[:8], "saliency", strand=strand) for strand in ["fwd", "rc"])
+    print(f"saliency max |mean - (fwd + rc) / 2| = {np.abs(batched - (fwd + rc) / 2).max():.2e}")
+    # completeness: integrated gradients sum to pred(x) - pred(baseline)
+    ig = attribute(net, x[:8], "integrated_gradients", steps=args.steps, batch_size=args.batch_size)
+    with torch.no_grad():
+        delta = (strand_preds(net, x[:8], onehot_rc) - strand_preds(net, baseline_like(x[:8]), onehot_rc)).numpy()
+    print(f"integrated gradients |sum - delta pred| / |delta pred| = {np.median(np.abs(ig.sum(axis=(1, 2)) - delta) / np.abs(delta)):.2e} (median, {args.steps} steps)")
+
+    for threads in sorted({1, args.threads}):
+        torch.set_num_threads(threads)
+        for method in METHODS:
+            n = args.num if method != "integrated_gradients" else max(1, args.num // 8)
+            start = time.perf_counter()
+            out = attribute(net, x[:n], method, steps=args.steps, batch_size=args.batch_size).astype(np.float16)
+            elapsed = time.perf_counter() - start
+            assert np.isfinite(out).all()
+            print(f"{threads} threads {method:21}: {n / elapsed:8.2f} seqs/sec")
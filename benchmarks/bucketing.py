@@ -0,0 +1,65 @@
+"""Length-bucketed batches with dynamic padding against random batches padded to the longest sequence,
+for DeepFamQ_CRC_VarLen on CPU. Also checks that predictions do not depend on the batching.
+
+python -m benchmarks.bucketing -n 4096 -b 256
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from torch.utils.data import BatchSampler, RandomSampler
+
+from src.datamodules.components.dataset import DynamicPadCollate
+from src.datamodules.components.sampler import BucketBatchSampler
+from src.datamodules.components.store import EncodedRecords, SequenceStore
+from src.models.components.deepfamq_crc_varlen import DeepFamQ_CRC_VarLen
+
+
+def predict(net, collate, batches):
+    preds, indices, steps = [], [], 0
+    start = time.perf_counter()
+    with torch.no_grad():
+        for batch in batches:
+            X, X_rev, _ = collate(batch)
+            preds.append((net(X) + net(X_rev)) / 2)
+            indices.extend(batch)
+            steps += X.size(1) * len(batch)
+    elapsed = time.perf_counter() - start
+    preds = torch.cat(preds)[np.argsort(indices)]
+
+    return preds, elapsed, steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=4096)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    parser.add_argument("-w", "--bucket_width", type=int, default=10)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    # mix of short and long designs
+    lengths = np.concatenate([rng.integers(80, 90, args.num // 2), rng.integers(150, 160, args.num - args.num // 2)])
+    seqs = ["".join(rng.choice(list("ACGT"), size=n)) for n in lengths]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = f"{tmp_dir}/seqs.txt"
+        pd.DataFrame({"seq": seqs, "target": rng.normal(size=len(seqs))}).to_csv(source, sep="\t", header=False, index=False)
+        records = EncodedRecords(SequenceStore.compile(source, tmp_dir))
+        collate = DynamicPadCollate(records)
+        net = DeepFamQ_CRC_VarLen().eval()
+
+        random_batches = list(BatchSampler(RandomSampler(records), args.batch_size, False))
+        bucket_batches = list(BucketBatchSampler(records.seq_lengths(), args.batch_size, args.bucket_width))
+        before, before_time, before_steps = predict(net, collate, random_batches)
+        after, after_time, after_steps = predict(net, collate, bucket_batches)
+
+    err = (before - after).abs().max().item()
+    assert torch.allclose(before, after, atol=1e-5), err
+    print(f"max |random - bucketed| = {err:.2e}")
+    print(f"random batches  : {before_steps / args.num:6.1f} padded positions/seq, {args.num / before_time:8.0f} seqs/sec")
+    print(f"bucketed batches: {after_steps / args.num:6.1f} padded positions/seq, {args.num / after_time:8.0f} seqs/sec ({before_time / after_time:.2f}x)")
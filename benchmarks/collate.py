@@ -0,0 +1,66 @@
+"""Throughput of the training DataLoader (sequences/sec), per-sample OneHotDataset vs batch-level OneHotCollate.
+
+python -m benchmarks.collate -n 100000
+python -m benchmarks.collate -i /data/project/ddp/data/dream/train_sequences.txt -w 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, BatchSampler, RandomSampler, SequentialSampler
+
+from src.datamodules.components.dataset import OneHotDataset, BatchIndexDataset, OneHotCollate
+from src.datamodules.components.store import SequenceStore, EncodedRecords
+
+
+def per_sample_loader(data, batch_size, num_workers, shuffle):
+    return DataLoader(data, batch_size=batch_size, num_workers=num_workers, shuffle=shuffle)
+
+
+def batch_loader(data, batch_size, num_workers, shuffle):
+    sampler = RandomSampler(data) if shuffle else SequentialSampler(data)
+    return DataLoader(
+        BatchIndexDataset(data.records),
+        sampler=BatchSampler(sampler, batch_size, False),
+        batch_size=None,
+        collate_fn=OneHotCollate(data.records),
+        num_workers=num_workers
+    )
+
+
+def bench(loader):
+    start = time.perf_counter()
+    n = sum(len(batch[-1]) for batch in loader)
+
+    return n / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", help="tab-separated sequence file (random sequences if omitted)")
+    parser.add_argument("-n", "--num", type=int, default=100000)
+    parser.add_argument("-b", "--batch_size", type=int, default=1024)
+    parser.add_argument("-w", "--num_workers", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = args.input
+        if source is None:
+            rng = np.random.default_rng(0)
+            source = os.path.join(tmp, "sequences.txt")
+            with open(source, "w") as f:
+                for _ in range(args.num):
+                    seq = "".join(rng.choice(list("ACGTN"), p=[.245, .245, .245, .245, .02], size=rng.integers(80, 130)))
+                    f.write(f"{seq}\t{rng.normal(11, 2):.6f}\n")
+        data = OneHotDataset(EncodedRecords(SequenceStore.compile(source, tmp)))
+
+        for a, b in zip(per_sample_loader(data, args.batch_size, 0, False), batch_loader(data, args.batch_size, 0, False)):
+            assert all(torch.equal(x, y) for x, y in zip(a, b))
+
+        before = bench(per_sample_loader(data, args.batch_size, args.num_workers, True))
+        after = bench(batch_loader(data, args.batch_size, args.num_workers, True))
+        print(f"per-sample collate : {before:10.0f} seqs/sec")
+        print(f"batch collate      : {after:10.0f} seqs/sec ({after / before:.1f}x)")
@@ -0,0 +1,63 @@
+"""CPU throughput of ConjoinedNet training steps (sequences/sec), per-view loop vs fused views.
+
+Mirrors ConjoinedNet.forward with and without `fused_views` on the six ShiftDataset views.
+
+python -m benchmarks.conjoined_views -b 128 -s 10
+"""
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+
+
+def looped(net, tensors):
+    return [net(tensor) for tensor in tensors]
+
+
+def fused(net, tensors):
+    return list(net(torch.cat(tensors)).split(len(tensors[0])))
+
+
+def bench(forward, net, tensors, y, steps):
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.AdamW(net.parameters(), lr=1e-4)
+    start = time.perf_counter()
+    for _ in range(steps):
+        preds = forward(net, tensors)
+        loss = torch.stack([criterion(pred, y) for pred in preds]).mean()
+        optimizer.zero_grad()
+        loss.backward()
+        optimizer.step()
+
+    return steps * len(y) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--batch_size", type=int, default=128)
+    parser.add_argument("-v", "--views", type=int, default=6)
+    parser.add_argument("-s", "--steps", type=int, default=10)
+    parser.add_argument("-t", "--threads", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    net = DeepFamQ_CRC()
+    tensors = [nn.functional.one_hot(torch.randint(4, (args.batch_size, 110)), 4).float() for _ in range(args.views)]
+    y = torch.randn(args.batch_size)
+
+    net.eval()
+    with torch.no_grad():
+        for a, b in zip(looped(net, tensors), fused(net, tensors)):
+            assert torch.allclose(a, b, atol=1e-5)
+
+    net.train()
+    bench(fused, net, tensors, y, 1)  # warm-up
+    before = bench(looped, net, tensors, y, args.steps)
+    after = bench(fused, net, tensors, y, args.steps)
+    print(f"per-view loop : {before:8.1f} seqs/sec")
+    print(f"fused views   : {after:8.1f} seqs/sec ({after / before:.2f}x)")
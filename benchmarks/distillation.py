@@ -0,0 +1,77 @@
+"""Throughput of the distillation student (configs/model/DeepFamQ_crc_distill.yaml) against the teacher ensemble, on CPU.
+
+The teacher is 5 fold nets x 6 views (ShiftDataset shifts x fwd/RC); the student runs once per fwd/RC view.
+Pearson/Spearman retention is logged by DistillNet on validation/test (`*/pearson_retention`, `*/spearman_retention`);
+the streaming metrics it uses are checked against scipy on normalized targets ((t - 11) / 2, the datamodule default).
+
+python -m benchmarks.distillation -n 2048
+"""
+import argparse
+import time
+
+import hydra
+import numpy as np
+from scipy import stats
+import torch
+from omegaconf import OmegaConf
+
+from src.datamodules.components.store import encode_many
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.models.components.ensemble import FoldEnsemble
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
+from src.scoring_pipeline import LAYOUTS
+
+
+def throughput(net, x, n_views, batch_size):
+    with torch.inference_mode():
+        net(x[:8])
+        start = time.perf_counter()
+        for i in range(0, len(x), batch_size):
+            batch = x[i:i + batch_size]
+            net(torch.cat([batch] * n_views)).view(n_views, -1).mean(dim=0)
+
+    return len(x) / (time.perf_counter() - start)
+
+
+def retention_check(n, batch_size, rng):
+    """Retention from the streaming metrics, updated batch by batch as in DistillNet.validation_step, against scipy"""
+    y = (rng.uniform(0, 17, n) - 11) / 2
+    preds = {"student": y + rng.normal(0, 1.5, n), "teacher": y + rng.normal(0, 1.0, n)}
+    metrics = {name: (StreamingSpearmanCorrCoef(), StreamingPearsonCorrCoef()) for name in preds}
+    for start in range(0, n, batch_size):
+        target = torch.tensor(y[start:start + batch_size], dtype=torch.float32)
+        for name, (spearman, pearson) in metrics.items():
+            pred = torch.tensor(preds[name][start:start + batch_size], dtype=torch.float32)
+            spearman.update(pred, target)
+            pearson.update(pred, target)
+
+    streaming = [metrics["student"][i].compute().item() / metrics["teacher"][i].compute().item() for i in range(2)]
+    exact = [
+        stats.spearmanr(preds["student"], y)[0] / stats.spearmanr(preds["teacher"], y)[0],
+        stats.pearsonr(preds["student"], y)[0] / stats.pearsonr(preds["teacher"], y)[0],
+    ]
+    print(f"spearman retention {streaming[0]:.5f} (scipy {exact[0]:.5f}), pearson retention {streaming[1]:.5f} (scipy {exact[1]:.5f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=2048)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+    seqs = ["".join(rng.choice(list("ACGT"), size=110)) for _ in range(args.num)]
+    x, _ = LAYOUTS["onehot"](*encode_many(seqs))
+
+    teacher = FoldEnsemble([DeepFamQ_CRC().eval() for _ in range(5)]).eval()
+    student = hydra.utils.instantiate(OmegaConf.load("configs/model/DeepFamQ_crc_distill.yaml").net).eval()
+
+    teacher_rate = throughput(teacher, x, 6, args.batch_size)
+    student_rate = throughput(student, x, 2, args.batch_size)
+    n_params = [sum(p.numel() for p in net.parameters()) for net in [teacher, student]]
+    print(f"teacher 5 folds x 6 views: {teacher_rate:8.0f} seqs/sec, {n_params[0] / 1e6:6.2f}M parameters")
+    print(f"student 1 net x 2 views  : {student_rate:8.0f} seqs/sec, {n_params[1] / 1e6:6.2f}M parameters ({student_rate / teacher_rate:.1f}x)")
+
+    retention_check(200000, 1024, rng)
@@ -0,0 +1,72 @@
+"""Micro-benchmark of per-sample one-hot encoding (sequences/sec), legacy dict mapping vs lookup table.
+
+python -m benchmarks.encoding -n 20000
+python -m benchmarks.encoding -i /data/project/ddp/data/dream/train_sequences.txt -n 100000
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from src.datamodules.components.encoding import ONE_HOT_ATCG, encode, one_hot, pad_left, reverse_complement
+
+
+BASE2VEC = {
+    "A": [1., 0., 0., 0.],
+    "T": [0., 1., 0., 0.],
+    "C": [0., 0., 1., 0.],
+    "G": [0., 0., 0., 1.],
+    "N": [0., 0., 0., 0.]
+}
+
+
+def legacy_encode(seq, max_len=110):
+    # Previous OneHotDataset.seq2mat + reverse_complement
+    if len(seq) > max_len:
+        seq = seq[len(seq) - max_len:]
+    else:
+        seq = "N" * (max_len - len(seq)) + seq
+    fwd = torch.tensor(list(map(lambda x: BASE2VEC[x], seq)), dtype=torch.float32)
+    rev = fwd.flip(0).index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
+
+    return fwd, rev
+
+
+def lut_encode(seq, max_len=110):
+    seq_idx = pad_left(encode(seq), max_len)
+    fwd = torch.from_numpy(one_hot(seq_idx, ONE_HOT_ATCG))
+    rev = torch.from_numpy(one_hot(reverse_complement(seq_idx), ONE_HOT_ATCG))
+
+    return fwd, rev
+
+
+def bench(fn, seqs):
+    start = time.perf_counter()
+    for seq in seqs:
+        fn(seq)
+
+    return len(seqs) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", help="tab-separated sequence file (random sequences if omitted)")
+    parser.add_argument("-n", "--num", type=int, default=20000)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    if args.input:
+        with open(args.input) as f:
+            seqs = [line.split("\t")[0] for _, line in zip(range(args.num), f)]
+    else:
+        rng = np.random.default_rng(0)
+        seqs = ["".join(rng.choice(list("ACGT"), size=rng.integers(80, 120))) for _ in range(args.num)]
+
+    for fwd_a, fwd_b in zip(map(legacy_encode, seqs[:100]), map(lut_encode, seqs[:100])):
+        assert all(torch.equal(a, b) for a, b in zip(fwd_a, fwd_b))
+
+    before = bench(legacy_encode, seqs)
+    after = bench(lut_encode, seqs)
+    print(f"dict mapping : {before:10.0f} seqs/sec")
+    print(f"lookup table : {after:10.0f} seqs/sec ({after / before:.1f}x)")
@@ -0,0 +1,55 @@
+"""Fold ensemble in one pass over the data against one scoring run per checkpoint, on CPU.
+
+python -m benchmarks.ensemble -n 2048 -m 5
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from src.datamodules.components.store import encode_many
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.models.components.ensemble import FoldEnsemble
+from src.scoring_pipeline import LAYOUTS, predict_batch, predict_members
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=2048)
+    parser.add_argument("-m", "--members", type=int, default=5)
+    parser.add_argument("-b", "--batch_size", type=int, default=1024)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    rng = np.random.default_rng(0)
+    seqs = ["".join(rng.choice(list("ACGTN"), p=[0.24] * 4 + [0.04], size=rng.integers(100, 111))) for _ in range(args.num)]
+    nets = []
+    for seed in range(args.members):
+        torch.manual_seed(seed)
+        nets.append(DeepFamQ_CRC().eval())
+    ensemble = FoldEnsemble(nets).eval()
+
+    # previous workflow: every checkpoint scores (reads and encodes) the data, then the outputs are averaged
+    start = time.perf_counter()
+    separate = np.stack([
+        np.concatenate([predict_batch(net, seqs[i:i + args.batch_size]).numpy() for i in range(0, args.num, args.batch_size)])
+        for net in nets
+    ])
+    separate_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    members = []
+    for i in range(0, args.num, args.batch_size):
+        x, x_rev = LAYOUTS["onehot"](*encode_many(seqs[i:i + args.batch_size]))
+        members.append(predict_members(ensemble, x, x_rev))
+    members = torch.cat(members, dim=1)
+    combined = ensemble.reduce(members).numpy()
+    ensemble_time = time.perf_counter() - start
+
+    err = max(np.abs(separate - members.numpy()).max(), np.abs(separate.mean(axis=0) - combined).max())
+    assert err < 1e-5, err
+    print(f"max |ensemble - separate runs| = {err:.2e}")
+    print(f"{args.members} separate runs: {args.num / separate_time:8.0f} seqs/sec")
+    print(f"ensemble      : {args.num / ensemble_time:8.0f} seqs/sec ({separate_time / ensemble_time:.2f}x)")
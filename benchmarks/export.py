@@ -0,0 +1,63 @@
+"""Exported TorchScript graph (src/export_pipeline.py, loaded with src/runtime.py) against the eager net.
+
+Checks that the in-graph fwd/RC (and ShiftDataset shift) views reproduce `forward_strands` / `view_inputs` on
+sequences shorter and longer than the input, and compares load time and throughput.
+
+python -m benchmarks.export -n 2048 -t 4
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from src.datamodules.components.store import encode_many
+from src.datamodules.components.teacher import SHIFT_VIEWS, view_inputs
+from src.export_pipeline import export
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.runtime import ExportedNet
+from src.scoring_pipeline import forward_strands
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=2048)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    seqs = ["".join(rng.choice(list("ACGTN"), p=[0.24] * 4 + [0.04], size=rng.integers(80, 130))) for _ in range(args.num)]
+    net = DeepFamQ_CRC().eval()
+
+    with torch.inference_mode():
+        start = time.perf_counter()
+        ref = np.concatenate([
+            forward_strands(net, *encode_many(seqs[i:i + args.batch_size]), "onehot", True).numpy()
+            for i in range(0, len(seqs), args.batch_size)
+        ])
+        eager_rate = len(seqs) / (time.perf_counter() - start)
+        idx, lengths = encode_many(seqs[:args.batch_size])
+        ref_shifts = torch.stack([net(view_inputs(idx, lengths, view)) for view in SHIFT_VIEWS]).mean(dim=0).numpy()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path, shifts_path = os.path.join(tmp_dir, "net.ts"), os.path.join(tmp_dir, "net_shifts.ts")
+        export(net, path)
+        export(net, shifts_path, shifts=True)
+
+        start = time.perf_counter()
+        exported = ExportedNet(path)
+        load_time = time.perf_counter() - start
+        exported.predict(seqs[:8])
+        start = time.perf_counter()
+        preds = exported.predict(seqs, args.batch_size)
+        rate = len(seqs) / (time.perf_counter() - start)
+        shift_preds = ExportedNet(shifts_path).predict(seqs[:args.batch_size])
+
+    print(f"eager      : {eager_rate:8.0f} seqs/sec")
+    print(f"torchscript: {rate:8.0f} seqs/sec, loaded in {load_time * 1000:.0f} ms")
+    print(f"max abs diff fwd/RC {np.abs(preds - ref).max():.1e}, shift views {np.abs(shift_preds - ref_shifts).max():.1e}")
@@ -0,0 +1,89 @@
+"""Batched one-hot mutagenesis against scoring all mutant strings, plus multi-process scaling, on CPU.
+
+python -m benchmarks.ism -n 8 -w 2
+"""
+import argparse
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from src.datamodules.components.encoding import ONE_HOT_ATCG, encode, pad_left
+from src.ism_pipeline import ism_sequences, run
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.models.components.deepfamq_crc_dh import DeepFamQ_CRC as DeepFamQ_CRC_DH
+from src.scoring_pipeline import predict_batch
+
+ATCG = "ATCG"
+
+
+def string_ism(net, seq, layout="onehot"):
+    # previous workflow: every mutant of the sequence positions as a string through the scoring path
+    pad = 110 - len(seq) if layout == "onehot" else 0
+    seq = "N" * pad + seq
+    mutants, sites = [], []
+    for p in range(pad, len(seq)):
+        for b in ATCG:
+            if seq[p] != b:
+                mutants.append(seq[:p] + b + seq[p + 1:])
+                sites.append((p, ATCG.index(b)))
+    preds = predict_batch(net, [seq] + mutants)
+    effects = np.zeros((len(seq), 4), dtype=np.float32)
+    for (p, b), pred in zip(sites, preds[1:].tolist()):
+        effects[p, b] = pred - preds[0].item()
+
+    return effects
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=8)
+    parser.add_argument("-b", "--batch_size", type=int, default=1024)
+    parser.add_argument("-w", "--workers", type=int, default=2)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(args.threads)
+    net = DeepFamQ_CRC().eval()
+    rng = np.random.default_rng(0)
+    seqs = ["".join(rng.choice(list("ACGT"), size=rng.integers(100, 111))) for _ in range(args.num)]
+
+    start = time.perf_counter()
+    before = np.stack([string_ism(net, seq) for seq in seqs])
+    before_time = time.perf_counter() - start
+    start = time.perf_counter()
+    after = ism_sequences(net, seqs, batch_size=args.batch_size)
+    after_time = time.perf_counter() - start
+    err = np.abs(before - after).max()
+    assert err < 1e-5, err
+    # one-hot channels are A, T, C, G; the reference base has no effect
+    ref = ONE_HOT_ATCG[np.stack([pad_left(encode(seq)) for seq in seqs])] == 1
+    assert (after[ref] == 0).all()
+    # the N padding on the left is not mutated
+    pads = np.arange(110) < 110 - np.array([len(seq) for seq in seqs])[:, None]
+    assert pads.any() and (after[pads] == 0).all()
+    print(f"max |batched - strings| = {err:.2e}")
+    print(f"mutant strings : {args.num / before_time:6.2f} seqs/sec")
+    print(f"batched one-hot: {args.num / after_time:6.2f} seqs/sec ({before_time / after_time:.2f}x)")
+
+    # dh layout: (N, 4, L) input, A, C, G, T channels
+    dh = ism_sequences(DeepFamQ_CRC_DH().eval(), seqs[:2], "dh", batch_size=args.batch_size)
+    assert dh.shape == (2, 110, 4)
+
+    if args.workers > 1:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            text = "".join(f"{seq}\n" for seq in seqs)
+            start = time.perf_counter()
+            run(net, io.StringIO(text), os.path.join(tmp_dir, "single.npy"), batch_size=args.batch_size, chunk_size=2, threads=args.threads)
+            single_time = time.perf_counter() - start
+            start = time.perf_counter()
+            run(net, io.StringIO(text), os.path.join(tmp_dir, "multi.npy"), batch_size=args.batch_size, chunk_size=2,
+                workers=args.workers, threads=max(1, args.threads // args.workers))
+            multi_time = time.perf_counter() - start
+            assert np.allclose(np.load(os.path.join(tmp_dir, "single.npy")), np.load(os.path.join(tmp_dir, "multi.npy")), atol=1e-5)
+        print(f"1 process x {args.threads} threads: {args.num / single_time:6.2f} seqs/sec")
+        print(f"{args.workers} processes x {max(1, args.threads // args.workers)} threads: {args.num / multi_time:6.2f} seqs/sec (spawn start-up included)")
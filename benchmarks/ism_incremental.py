@@ -0,0 +1,40 @@
+"""Incremental mutagenesis (cached reference activations) against full recomputation of every mutant, on CPU.
+
+python -m benchmarks.ism_incremental -n 8
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from src.ism_pipeline import ism_sequences
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=8)
+    parser.add_argument("-b", "--batch_size", type=int, default=1024)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(args.threads)
+    net = DeepFamQ_CRC().eval()
+    rng = np.random.default_rng(0)
+    # a few N, and lengths < 110 so that the left N padding is skipped
+    seqs = ["".join(rng.choice(list("ACGTN"), p=[0.24] * 4 + [0.04], size=rng.integers(100, 111))) for _ in range(args.num)]
+
+    for rc in [False, True]:
+        start = time.perf_counter()
+        full = ism_sequences(net, seqs, rc=rc, batch_size=args.batch_size)
+        full_time = time.perf_counter() - start
+        start = time.perf_counter()
+        incremental = ism_sequences(net, seqs, rc=rc, batch_size=args.batch_size, incremental=True)
+        incremental_time = time.perf_counter() - start
+        err = np.abs(full - incremental).max()
+        assert err < 1e-5, err
+        print(f"rc={rc!s:5} max |incremental - full| = {err:.2e}")
+        print(f"  full recomputation: {args.num / full_time:6.2f} seqs/sec")
+        print(f"  incremental       : {args.num / incremental_time:6.2f} seqs/sec ({full_time / incremental_time:.2f}x)")
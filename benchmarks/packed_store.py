@@ -0,0 +1,67 @@
+"""Size of the 2-bit packed SequenceStore against uint8 indices and `df.to_records()` strings, and
+batched unpack + one-hot throughput.
+
+python -m benchmarks.packed_store -n 200000
+python -m benchmarks.packed_store -i /data/project/ddp/data/dream/train_sequences.txt
+"""
+import argparse
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.datamodules.components.encoding import ONE_HOT_ATCG, ONE_HOT_ATCG_V2, PAD_IDX, one_hot
+from src.datamodules.components.store import EncodedRecords, SequenceStore, encode_many, pad_left_many
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-i", "--input", help="tab-separated sequence file (random sequences if omitted)")
+    parser.add_argument("-n", "--num", type=int, default=200000)
+    parser.add_argument("-b", "--batch_size", type=int, default=1024)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.input:
+            source = args.input
+        else:
+            rng = np.random.default_rng(0)
+            bases = np.array(list("ACGTN"))
+            seqs = ["".join(bases[rng.choice(5, size=rng.integers(80, 150), p=[.2475] * 4 + [.01])]) for _ in range(args.num)]
+            source = f"{tmp_dir}/seqs.txt"
+            pd.DataFrame({"seq": seqs, "target": rng.normal(11, 2, size=len(seqs))}).to_csv(source, sep="\t", header=False, index=False)
+
+        df = pd.read_csv(source, sep="\t", names=["seq", "target"])
+        seqs, lengths = encode_many(df.seq.tolist())
+        start = time.perf_counter()
+        store = SequenceStore.compile(source, tmp_dir)
+        print(f"compiled {len(store)} sequences in {time.perf_counter() - start:.1f}s")
+
+        # round trip, N and pad positions included
+        rows = np.arange(len(store))
+        for start in range(0, len(store), 1 << 16):
+            assert np.array_equal(store.unpack(rows[start:start + (1 << 16)])[:, :seqs.shape[1]], seqs[start:start + (1 << 16)])
+        assert np.array_equal(store.has_n, (seqs == 4).any(axis=1))
+
+        records = df.to_records()
+        records_bytes = records.nbytes + sum(map(sys.getsizeof, records.seq))
+        packed_bytes = store.packed.nbytes + store.mask.nbytes
+        print(f"df.to_records() + str : {records_bytes / 2**20:8.1f} MB")
+        print(f"uint8 indices          : {seqs.nbytes / 2**20:8.1f} MB")
+        print(f"2-bit packed + N mask  : {packed_bytes / 2**20:8.1f} MB ({packed_bytes / seqs.nbytes:.0%} of uint8)")
+
+        records = EncodedRecords(store)
+        batches = np.array_split(np.random.default_rng(1).permutation(len(store)), max(1, len(store) // args.batch_size))
+        for name, table, pad in [("OneHotDataset", ONE_HOT_ATCG, 4), ("OneHotDataset_v2", ONE_HOT_ATCG_V2, PAD_IDX)]:
+            start = time.perf_counter()
+            for batch in batches:
+                ref = one_hot(pad_left_many(seqs, lengths[batch], 110, pad, batch), table)
+            before = time.perf_counter() - start
+            start = time.perf_counter()
+            for batch in batches:
+                out = one_hot(records.gather(batch, 110, pad)[0], table)
+            after = time.perf_counter() - start
+            assert np.array_equal(out, ref)
+            print(f"{name:16s} one-hot: uint8 {len(store) / before:10.0f} seqs/sec, packed {len(store) / after:10.0f} seqs/sec")
@@ -0,0 +1,53 @@
+"""Design-loop style scoring with and without the prediction cache: every round rescores the previous
+round's sequences plus new single-base variants of them.
+
+python -m benchmarks.prediction_cache -n 512 -r 5
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.scoring_pipeline import PredictionCache, predict_batch
+
+
+def mutate(seq, rng):
+    pos = rng.integers(len(seq))
+    return seq[:pos] + rng.choice([b for b in "ACGT" if b != seq[pos]]) + seq[pos + 1:]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=512, help="sequences per round")
+    parser.add_argument("-r", "--rounds", type=int, default=5)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(4)
+    net = DeepFamQ_CRC().eval()
+    rng = np.random.default_rng(0)
+    library = ["".join(rng.choice(list("ACGT"), size=110)) for _ in range(args.num)]
+    rounds = []
+    for _ in range(args.rounds):
+        rounds.append(library)
+        # keep half of the designs, replace the rest by variants of the kept ones
+        kept = library[: args.num // 2]
+        library = kept + [mutate(seq, rng) for seq in kept]
+
+    timings = {}
+    for name, cache in [("no cache", None), ("LRU cache", PredictionCache("benchmark"))]:
+        preds = []
+        start = time.perf_counter()
+        for seqs in rounds:
+            for i in range(0, len(seqs), args.batch_size):
+                preds.append(predict_batch(net, seqs[i:i + args.batch_size], cache=cache))
+        timings[name] = (time.perf_counter() - start, torch.cat(preds))
+        hit_rate = "" if cache is None else f", {100 * cache.hit_rate():.1f}% hit rate"
+        print(f"{name:9s}: {timings[name][0]:6.2f}s{hit_rate}")
+
+    err = (timings["no cache"][1] - timings["LRU cache"][1]).abs().max().item()
+    assert err < 1e-5, err
+    print(f"max |cached - uncached| = {err:.2e}, {timings['no cache'][0] / timings['LRU cache'][0]:.2f}x")
@@ -0,0 +1,65 @@
+"""int8 DeepFamQ_CRC (src/quantization_pipeline.py) against fp32 on CPU: agreement with the fp32 net, throughput and
+that the saved artifact reloads (as `load_net` does) to exactly the in-memory quantized net.
+
+Random weights and sequences, so only the fp32/int8 agreement is meaningful; `quantize.py --report` gives the
+Pearson/Spearman of a trained net on the HQ test set.
+
+python -m benchmarks.quantization -n 2048 -t 1
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import torch
+from omegaconf import OmegaConf
+
+from src.datamodules.components.store import encode_many
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.quantization_pipeline import quantize, save_quantized
+from src.scoring_pipeline import LAYOUTS, load_net
+
+
+def predict(net, x, batch_size):
+    with torch.inference_mode():
+        net(x[:8])
+        start = time.perf_counter()
+        preds = torch.cat([net(x[i:i + batch_size]).view(-1) for i in range(0, len(x), batch_size)])
+
+    return preds.numpy(), len(x) / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=2048)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    parser.add_argument("-t", "--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    seqs = ["".join(rng.choice(list("ACGT"), size=110)) for _ in range(args.num)]
+    x, _ = LAYOUTS["onehot"](*encode_many(seqs))
+    calibration = list(x[:4 * args.batch_size].split(args.batch_size))
+
+    net_config = OmegaConf.create({"_target_": "src.models.components.deepfamq_crc.DeepFamQ_CRC"})
+    net = DeepFamQ_CRC().eval()
+    fp32, fp32_rate = predict(net, x, args.batch_size)
+    print(f"fp32              : {fp32_rate:8.0f} seqs/sec")
+
+    for static_convs in [False, True]:
+        qnet = quantize(net, calibration, static_convs)
+        preds, rate = predict(qnet, x, args.batch_size)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "net.int8.pt")
+            save_quantized(qnet, net_config, path, static_convs)
+            reloaded, _ = predict(load_net(path), x, args.batch_size)
+            size = os.path.getsize(path) / 2 ** 20
+        name = "int8 static convs" if static_convs else "int8 dynamic    "
+        print(
+            f"{name} : {rate:8.0f} seqs/sec ({rate / fp32_rate:.2f}x), {size:.1f} MB, "
+            f"pearson vs fp32 {np.corrcoef(preds, fp32)[0, 1]:.4f}, max abs diff {np.abs(preds - fp32).max():.2e}, "
+            f"reload max abs diff {np.abs(reloaded - preds).max():.1e}"
+        )
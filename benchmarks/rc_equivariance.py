@@ -0,0 +1,76 @@
+"""Checks the RC-equivariant nets against the two-pass (forward + reverse-complement) output and times
+one pass of DeepFamQ_CRC_RC against the two passes of DeepFamQ_CRC on CPU.
+
+python -m benchmarks.rc_equivariance -b 64
+"""
+import argparse
+import time
+
+import torch
+
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.models.components.deepfamq_crc_rc import DeepFamQ_CRC_RC, DeepFamQ_CRC_DH_RC, half_swap, rc_features
+
+
+def random_one_hot(bsz, seq_len=110):
+    # (N, 4, L) with some all-zero N columns
+    x = torch.nn.functional.one_hot(torch.randint(5, (bsz, seq_len)), 5)[..., :4].float()
+
+    return x.transpose(1, 2)
+
+
+def check(net, perm, channels_last, bsz):
+    x = random_one_hot(bsz)
+    x_rev = rc_features(x, perm)
+    if channels_last:
+        x, x_rev = x.transpose(1, 2), x_rev.transpose(1, 2)
+
+    with torch.no_grad():
+        one_pass = net(x)
+        two_pass = (net(x) + net(x_rev)) / 2
+    err = (one_pass - two_pass).abs().max().item()
+    assert torch.allclose(one_pass, two_pass, atol=1e-5), err
+
+    return err
+
+
+def check_layers(net, perm, bsz):
+    # every layer maps the RC input to the RC of its output
+    x = random_one_hot(bsz)
+    x_rev = rc_features(x, perm)
+    with torch.no_grad():
+        for layer in [net.conv_blocks1, net.lstm, net.conv_blocks2]:
+            x, x_rev = layer(x), layer(x_rev)
+            assert torch.allclose(rc_features(x, half_swap(x.size(1))), x_rev, atol=1e-5), type(layer).__name__
+
+
+def bench(fn, steps):
+    start = time.perf_counter()
+    with torch.no_grad():
+        for _ in range(steps):
+            fn()
+
+    return (time.perf_counter() - start) / steps
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--batch_size", type=int, default=64)
+    parser.add_argument("-s", "--steps", type=int, default=5)
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    atcg, acgt = torch.LongTensor([1, 0, 3, 2]), torch.LongTensor([3, 2, 1, 0])
+    net, net_dh = DeepFamQ_CRC_RC().eval(), DeepFamQ_CRC_DH_RC().eval()
+    check_layers(net, atcg, 8)
+    check_layers(net_dh, acgt, 8)
+    print(f"DeepFamQ_CRC_RC    max |one pass - two-pass mean| = {check(net, atcg, True, 16):.2e}")
+    print(f"DeepFamQ_CRC_DH_RC max |one pass - two-pass mean| = {check(net_dh, acgt, False, 16):.2e}")
+
+    baseline = DeepFamQ_CRC().eval()
+    x = random_one_hot(args.batch_size).transpose(1, 2)
+    x_rev = rc_features(x.transpose(1, 2), atcg).transpose(1, 2)
+    before = bench(lambda: (baseline(x) + baseline(x_rev)) / 2, args.steps)
+    after = bench(lambda: net(x), args.steps)
+    print(f"DeepFamQ_CRC two passes : {1000 * before:8.1f} ms/batch")
+    print(f"DeepFamQ_CRC_RC one pass: {1000 * after:8.1f} ms/batch ({before / after:.2f}x)")
@@ -0,0 +1,70 @@
+"""Per-sample latency of IndexDataset before (decode + Bio.Seq reverse complement + dict mapping) and after
+(complement lookup + flip on the encoded indices).
+
+python -m benchmarks.reverse_complement -n 20000
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+from Bio.Seq import Seq
+
+from src.datamodules.components.dataset import IndexDataset
+from src.datamodules.components.encoding import decode
+from src.datamodules.components.store import EncodedRecords, SequenceStore
+
+
+class LegacyIndexDataset(IndexDataset):
+    # Previous IndexDataset
+    base2idx = {"A": 0, "T": 1, "C": 2, "G": 3, "N": 4}
+
+    def legacy_seq2vec(self, seq, max_len=110):
+        seq = seq[:max_len]
+        mat = torch.tensor(list(map(lambda x: self.base2idx[x], seq)), dtype=torch.long)
+        mat = torch.cat([mat, 4 * torch.ones(max_len - len(seq), dtype=torch.long)])
+        return mat
+
+    def __getitem__(self, idx):
+        seq, target = self.records[idx]
+        seq = decode(seq)
+        X = self.legacy_seq2vec(seq)
+        X_rev = self.legacy_seq2vec(Seq(seq).reverse_complement())
+        y = torch.tensor(float(target), dtype=torch.float32)
+
+        return X, X_rev, y
+
+
+def bench(dataset):
+    start = time.perf_counter()
+    for i in range(len(dataset)):
+        dataset[i]
+
+    return 1e6 * (time.perf_counter() - start) / len(dataset)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=20000)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    rng = np.random.default_rng(0)
+    bases = np.array(list("ACGTN"))
+    seqs = ["".join(bases[rng.choice(5, size=rng.integers(80, 140), p=[.24] * 4 + [.04])]) for _ in range(args.num)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        source = f"{tmp_dir}/seqs.txt"
+        pd.DataFrame({"seq": seqs, "target": rng.normal(size=len(seqs))}).to_csv(source, sep="\t", header=False, index=False)
+        records = EncodedRecords(SequenceStore.compile(source, tmp_dir))
+        legacy, dataset = LegacyIndexDataset(records), IndexDataset(records)
+
+        for i in range(min(1000, len(records))):
+            assert all(torch.equal(a, b) for a, b in zip(legacy[i], dataset[i]))
+
+        before = bench(legacy)
+        after = bench(dataset)
+    print(f"Bio.Seq + dict      : {before:6.1f} us/sample")
+    print(f"complement + flip   : {after:6.1f} us/sample ({before / after:.1f}x)")
@@ -0,0 +1,69 @@
+"""Offline check of the scoring server: starts it on a Unix socket with a randomly initialized DeepFamQ_CRC,
+fires concurrent client requests and compares the answers with direct `predict_batch` calls.
+
+python -m benchmarks.serving -c 32 -r 20
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import torch
+
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.scoring_pipeline import predict_batch
+from src.serving_pipeline import MicroBatcher, ScoringClient, ScoringServer
+
+
+def client_loop(unix_socket, requests):
+    client = ScoringClient(unix_socket=unix_socket)
+    preds = [client.score(seqs) for seqs in requests]
+    client.close()
+
+    return preds
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--clients", type=int, default=32)
+    parser.add_argument("-r", "--requests", type=int, default=20, help="requests per client")
+    parser.add_argument("-b", "--max_batch", type=int, default=256)
+    parser.add_argument("-w", "--max_wait", type=float, default=5.0, help="milliseconds")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    torch.set_num_threads(4)
+    net = DeepFamQ_CRC().eval()
+    rng = np.random.default_rng(0)
+    requests = [
+        [["".join(rng.choice(list("ACGT"), size=rng.integers(80, 120))) for _ in range(rng.integers(1, 9))] for _ in range(args.requests)]
+        for _ in range(args.clients)
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        unix_socket = os.path.join(tmp_dir, "score.sock")
+        server = ScoringServer({"deepfamq_crc": MicroBatcher(net, max_batch=args.max_batch, max_wait=args.max_wait / 1000)})
+        started = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(server.serve(unix_socket=unix_socket, started=started)), daemon=True).start()
+        started.wait()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.clients) as pool:
+            answers = list(pool.map(client_loop, [unix_socket] * args.clients, requests))
+        elapsed = time.perf_counter() - start
+        metrics = ScoringClient(unix_socket=unix_socket).metrics()["deepfamq_crc"]
+
+    seqs = [seq for client_requests in requests for request in client_requests for seq in request]
+    served = np.array([pred for client_answers in answers for answer in client_answers for pred in answer])
+    direct = predict_batch(net, seqs).numpy()
+    err = np.abs(served - direct).max()
+    assert np.allclose(served, direct, atol=1e-5), err
+
+    print(f"max |served - direct| = {err:.2e}")
+    print(f"{metrics['requests']} requests, {metrics['sequences']} sequences in {metrics['batches']} batches, {metrics['sequences'] / elapsed:.0f} seqs/sec")
+    print(f"latency p50 {metrics['latency_ms_p50']:.1f} ms, p99 {metrics['latency_ms_p99']:.1f} ms")
+    print(f"mean batch size {metrics['batch_size_mean']:.1f}, fill {metrics['batch_fill_mean']:.0%}")
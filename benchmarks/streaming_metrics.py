@@ -0,0 +1,58 @@
+"""Streaming Pearson/Spearman metrics (src/models/components/metrics.py) against scipy on a fold-sized set.
+
+Updates batch by batch as validation does, checks the Spearman histogram error against its bound and that
+states summed from two shards (as across DDP processes) give the same result as one metric.
+
+python -m benchmarks.streaming_metrics -n 1300000
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+from scipy import stats
+
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=1300000)
+    parser.add_argument("-b", "--batch_size", type=int, default=65536)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    targets = {
+        "uniform": rng.uniform(0, 17, args.num),
+        "skewed": np.clip(rng.gamma(2, 2, args.num), 0, 17),
+        "rounded": np.round(rng.normal(10, 2, args.num), 1),
+        # datamodule normalize=True: (t - 11) / 2, what the nets are trained on
+        "normalized": (rng.uniform(0, 17, args.num) - 11) / 2,
+    }
+    for name, y in targets.items():
+        y = torch.tensor(y, dtype=torch.float32)
+        p = y + 2.5 * y.std() / 4.9 * torch.randn(len(y))
+        pearson, spearman = StreamingPearsonCorrCoef(), StreamingSpearmanCorrCoef()
+        shards = [StreamingSpearmanCorrCoef(), StreamingSpearmanCorrCoef()]
+
+        start = time.perf_counter()
+        for start_row in range(0, len(y), args.batch_size):
+            batch = p[start_row:start_row + args.batch_size], y[start_row:start_row + args.batch_size]
+            pearson.update(*batch)
+            spearman.update(*batch)
+        elapsed = time.perf_counter() - start
+        # merged histograms need the same bins, as set_range gives every DDP process
+        for shard in shards:
+            shard.min_value, shard.max_value = spearman.min_value, spearman.max_value
+        for i, start_row in enumerate(range(0, len(y), args.batch_size)):
+            shards[i % 2].update(p[start_row:start_row + args.batch_size], y[start_row:start_row + args.batch_size])
+        merged = StreamingSpearmanCorrCoef()
+        merged.counts = shards[0].counts + shards[1].counts
+
+        exact_pearson = stats.pearsonr(p.double().numpy(), y.double().numpy())[0]
+        exact_spearman = stats.spearmanr(p.numpy(), y.numpy())[0]
+        print(
+            f"{name:10s}: pearson err {abs(pearson.compute().item() - exact_pearson):.1e}, "
+            f"spearman err {abs(spearman.compute().item() - exact_spearman):.1e} (bound {spearman.error_bound().item():.1e}), "
+            f"merged diff {abs(merged.compute().item() - spearman.compute().item()):.1e}, {len(y) / elapsed / 1e6:.0f}M rows/sec"
+        )
@@ -0,0 +1,73 @@
+"""Cached teacher predictions (TeacherTargets) against scoring every batch with the teacher ensemble, on CPU.
+
+python -m benchmarks.teacher_cache -n 4096 -m 5
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from src.datamodules.components.dataset import ShiftDataset
+from src.datamodules.components.store import EncodedRecords, SequenceStore
+from src.datamodules.components.teacher import SHIFT_VIEWS, TeacherDataset, TeacherTargets
+from src.models.components.deepfamq_crc import DeepFamQ_CRC
+from src.models.components.ensemble import FoldEnsemble
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--num", type=int, default=4096)
+    parser.add_argument("-m", "--members", type=int, default=5)
+    parser.add_argument("-b", "--batch_size", type=int, default=256)
+    parser.add_argument("-t", "--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        rng = np.random.default_rng(0)
+        seqs = ["".join(rng.choice(list("ACGT"), size=rng.integers(100, 111))) for _ in range(args.num)]
+        source = os.path.join(tmp_dir, "seqs.txt")
+        pd.DataFrame({"seq": seqs, "target": rng.normal(size=args.num)}).to_csv(source, sep="\t", header=False, index=False)
+        store = SequenceStore.compile(source, tmp_dir)
+
+        nets, ckpt_paths = [], []
+        for seed in range(args.members):
+            torch.manual_seed(seed)
+            nets.append(DeepFamQ_CRC().eval())
+            ckpt_paths.append(os.path.join(tmp_dir, f"fold{seed}", "checkpoints", "best.ckpt"))
+            os.makedirs(os.path.dirname(ckpt_paths[-1]))
+            torch.save({"state_dict": {f"net.{k}": v for k, v in nets[-1].state_dict().items()}}, ckpt_paths[-1])
+        config_path = os.path.join(tmp_dir, "config.yaml")
+        with open(config_path, "w") as f:
+            f.write("net:\n  _target_: src.models.components.deepfamq_crc.DeepFamQ_CRC\n")
+        teacher = FoldEnsemble(nets).eval()
+
+        start = time.perf_counter()
+        targets = TeacherTargets(store, ckpt_paths, SHIFT_VIEWS, config_path, args.batch_size)
+        build_time = time.perf_counter() - start
+
+        data = TeacherDataset(ShiftDataset(EncodedRecords(store)), targets)
+        loader = torch.utils.data.DataLoader(data, batch_size=args.batch_size)
+
+        # one epoch with the teachers scoring every view of every batch
+        start = time.perf_counter()
+        streamed = []
+        with torch.inference_mode():
+            for batch in loader:
+                streamed.append(teacher(torch.cat(batch[:-2])).view(len(SHIFT_VIEWS), -1).T)
+        streamed_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        cached = torch.cat([batch[-1] for batch in loader])
+        cached_time = time.perf_counter() - start
+
+    err = (torch.cat(streamed) - cached).abs().max().item()
+    assert err < 1e-2, err
+    print(f"max |cached (float16) - streamed| = {err:.2e}")
+    print(f"build cache ({args.members} checkpoints x {len(SHIFT_VIEWS)} views): {build_time:.1f}s")
+    print(f"epoch with teacher forward passes: {args.num / streamed_time:8.0f} seqs/sec")
+    print(f"epoch with cached teacher_y      : {args.num / cached_time:8.0f} seqs/sec ({streamed_time / cached_time:.1f}x)")
@@ -0,0 +1,20 @@
+import argparse
+
+from src.export_pipeline import FORMATS, main
+from src.scoring_pipeline import LAYOUTS
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Exports the net of a checkpoint with its input encoding and fwd/RC (and shift) view averaging as a frozen TorchScript or ONNX graph; load it with src.runtime.ExportedNet.")
+	parser.add_argument('-c', '--ckpt', required=True, help="Lightning checkpoint, e.g. logs/experiments/runs/<name>/fold0/checkpoints/best.ckpt")
+	parser.add_argument('--config', default=None, help="config with the net (default: .hydra/config.yaml of the checkpoint's run)")
+	parser.add_argument('-o', '--output', required=True, help="e.g. fold0.ts, or fold0.onnx (+ fold0.onnx.json metadata)")
+	parser.add_argument('-f', '--format', default='torchscript', choices=FORMATS)
+	parser.add_argument('-l', '--layout', default='onehot', choices=list(LAYOUTS), help="input encoding of the datamodule the net was trained with")
+	parser.add_argument('--no_rc', action='store_true', help="forward strand only (MainNet) instead of forward/RC mean")
+	parser.add_argument('--shifts', action='store_true', help="also average the ShiftDataset left/right shift views (onehot layout)")
+	parser.add_argument('--max_len', type=int, default=110)
+	parser.add_argument('-t', '--threads', type=int, default=4)
+	args = parser.parse_args()
+
+	main(args)
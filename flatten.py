@@ -1,19 +1,33 @@
 import argparse
-import json
 import numpy as np
 from scipy import stats
 
-def gaussian_to_uniform(x):
-    return stats.norm.cdf(x, loc=x.mean(), scale=x.std()) * 3 - 1.5
+from src.utils.predictions import open_writer, read_predictions
+
+def gaussian_to_uniform(x, mean, std):
+    return stats.norm.cdf(x, loc=mean, scale=std) * 3 - 1.5
+
+def moments(path):
+    # first pass: mean and (population) std, merging per-chunk statistics (Chan et al.)
+    n, mean, m2 = 0, 0.0, 0.0
+    for _, preds in read_predictions(path):
+        n_b, mean_b = len(preds), preds.mean()
+        m2_b = np.square(preds - mean_b).sum()
+        delta = mean_b - mean
+        mean += delta * n_b / (n + n_b)
+        m2 += m2_b + delta ** 2 * n * n_b / (n + n_b)
+        n += n_b
+
+    return mean, np.sqrt(m2 / n)
 
 if __name__ == '__main__':
 	parser = argparse.ArgumentParser()
-	parser.add_argument('-i', '--input')
-	parser.add_argument('-o', '--output')
+	parser.add_argument('-i', '--input', help="submission file (.json, .tsv or .bin)")
+	parser.add_argument('-o', '--output', help="output file (.json, .tsv or .bin)")
 	args = parser.parse_args()
 
-	with open(args.input, 'r') as inFile, open(args.output, 'w') as outFile:
-		orig = json.loads(inFile.read())
-		predictions = np.array(list(orig.values()))
-		flattened = dict(zip(orig.keys(), gaussian_to_uniform(predictions)))
-		print(json.dumps(flattened), file=outFile)
\ No newline at end of file
+	mean, std = moments(args.input)
+	# second pass: transform chunk by chunk
+	with open_writer(args.output) as writer:
+		for ids, preds in read_predictions(args.input):
+			writer.write(gaussian_to_uniform(preds, mean, std), ids)
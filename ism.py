@@ -0,0 +1,22 @@
+import argparse
+
+from src.ism_pipeline import main
+from src.scoring_pipeline import LAYOUTS
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="In silico saturation mutagenesis: (N, L, 4) effects of every single-base substitution.")
+	parser.add_argument('-c', '--ckpt', required=True, help="Lightning checkpoint, e.g. logs/experiments/runs/<name>/fold0/checkpoints/best.ckpt")
+	parser.add_argument('--config', default=None, help="config with the net (default: .hydra/config.yaml of the checkpoint's run)")
+	parser.add_argument('-i', '--input', default='-', help="`seq` or `seq<TAB>target` lines, '-' for stdin")
+	parser.add_argument('-o', '--output', required=True, help=".npy file of float32 pred(mutant) - pred(reference), (N, L, 4) in the channel order of the layout")
+	parser.add_argument('-l', '--layout', default='onehot', choices=list(LAYOUTS), help="input encoding of the datamodule the net was trained with")
+	parser.add_argument('-b', '--batch_size', type=int, default=4096, help="mutants per forward pass")
+	parser.add_argument('--chunk_size', type=int, default=64, help="reference sequences per task")
+	parser.add_argument('-w', '--workers', type=int, default=1, help="processes, each with --threads torch threads")
+	parser.add_argument('-t', '--threads', type=int, default=4)
+	parser.add_argument('--incremental', action='store_true', help="reuse the reference conv/LSTM activations (DeepFamQ_CRC nets, onehot layout)")
+	parser.add_argument('--no_rc', action='store_true', help="forward strand only (MainNet) instead of forward/RC mean")
+	args = parser.parse_args()
+
+	main(args)
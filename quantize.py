@@ -0,0 +1,26 @@
+import argparse
+
+from src.scoring_pipeline import LAYOUTS
+from src.quantization_pipeline import main
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="int8 post-training quantization of a trained net for CPU inference (score.py, serve.py, predict.py load the output like a checkpoint).")
+	parser.add_argument('-c', '--ckpt', required=True, help="Lightning checkpoint, e.g. logs/experiments/runs/<name>/fold0/checkpoints/best.ckpt")
+	parser.add_argument('--config', default=None, help="config with the net (default: .hydra/config.yaml of the checkpoint's run)")
+	parser.add_argument('-o', '--output', required=True, help="quantized net, e.g. fold0.int8.pt")
+	parser.add_argument('-d', '--data', default=None, help="`seq<TAB>target` file (e.g. the HQ test set) for --static_convs calibration and --report")
+	parser.add_argument('-l', '--layout', default='onehot', choices=list(LAYOUTS), help="input encoding of the datamodule the net was trained with")
+	parser.add_argument('--static_convs', action='store_true', help="also quantize the conv blocks, calibrated on the first batches of --data (LSTM/Linear only otherwise)")
+	parser.add_argument('--calibration_batches', type=int, default=8)
+	parser.add_argument('--engine', default='x86', choices=['x86', 'fbgemm', 'qnnpack'], help="quantized kernels, qnnpack for ARM")
+	parser.add_argument('--report', action='store_true', help="compare accuracy and throughput of the fp32 and int8 nets on --data")
+	parser.add_argument('--no_rc', action='store_true', help="forward strand only (MainNet) instead of forward/RC mean in --report")
+	parser.add_argument('-b', '--batch_size', type=int, default=1024)
+	parser.add_argument('-t', '--threads', type=int, default=4)
+	args = parser.parse_args()
+
+	if (args.static_convs or args.report) and args.data is None:
+		parser.error("--static_convs and --report need --data")
+
+	main(args)
@@ -0,0 +1,24 @@
+import argparse
+
+from src.models.components.ensemble import COMBINES
+from src.scoring_pipeline import LAYOUTS, main
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Scores sequences with a trained net without Hydra/Lightning Trainer.")
+	parser.add_argument('-c', '--ckpt', required=True, nargs='+', help="Lightning checkpoint, e.g. logs/experiments/runs/<name>/fold0/checkpoints/best.ckpt; several for a fold ensemble of the same architecture")
+	parser.add_argument('--config', default=None, help="config with the net (default: .hydra/config.yaml of the checkpoint's run)")
+	parser.add_argument('-i', '--input', default='-', help="`seq` or `seq<TAB>target` lines, '-' for stdin")
+	parser.add_argument('-o', '--output', default='-', help="`seq<TAB>prediction` lines, '-' for stdout")
+	parser.add_argument('-l', '--layout', default='onehot', choices=list(LAYOUTS), help="input encoding of the datamodule the net was trained with")
+	parser.add_argument('-b', '--batch_size', type=int, default=4096)
+	parser.add_argument('-t', '--threads', type=int, default=4)
+	parser.add_argument('--no_rc', action='store_true', help="forward strand only (MainNet) instead of forward/RC mean")
+	parser.add_argument('--combine', default='mean', choices=COMBINES, help="how the predictions of several checkpoints are combined")
+	parser.add_argument('--weights', type=float, nargs='+', default=None, help="one weight per checkpoint for --combine weighted")
+	parser.add_argument('--members', action='store_true', help="also write the prediction of every checkpoint, one column each (not cached)")
+	parser.add_argument('--cache_entries', type=int, default=0, help="keep up to this many predictions in an LRU cache (0: no cache unless --cache_dir)")
+	parser.add_argument('--cache_dir', default=None, help="persist cached predictions here, keyed by checkpoint hash, and reuse them in later runs")
+	args = parser.parse_args()
+
+	main(args)
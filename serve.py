@@ -0,0 +1,23 @@
+import argparse
+
+from src.scoring_pipeline import LAYOUTS
+from src.serving_pipeline import main
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="Long-lived local scoring server that micro-batches concurrent requests.")
+	parser.add_argument('-c', '--ckpt', required=True, nargs='+', help="one or more Lightning checkpoints, optionally as name=path (default name: the run directory)")
+	parser.add_argument('--config', default=None, help="config with the net (default: .hydra/config.yaml of each checkpoint's run)")
+	parser.add_argument('-l', '--layout', default='onehot', choices=list(LAYOUTS), help="input encoding of the datamodule the nets were trained with")
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('-p', '--port', type=int, default=8008)
+	parser.add_argument('-u', '--unix_socket', default=None, help="listen on this Unix socket instead of host:port")
+	parser.add_argument('-b', '--max_batch', type=int, default=1024, help="max sequences per forward pass")
+	parser.add_argument('-w', '--max_wait', type=float, default=5.0, help="max milliseconds a request waits for its batch to fill")
+	parser.add_argument('-t', '--threads', type=int, default=4)
+	parser.add_argument('--no_rc', action='store_true', help="forward strand only (MainNet) instead of forward/RC mean")
+	parser.add_argument('--cache_entries', type=int, default=1000000, help="LRU prediction cache size per net (0: no cache)")
+	parser.add_argument('--cache_dir', default=None, help="persist cached predictions here, keyed by checkpoint hash, and reuse them in later runs")
+	args = parser.parse_args()
+
+	main(args)
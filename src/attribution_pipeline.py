@@ -0,0 +1,137 @@
+import sys
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.datamodules.components.store import encode_many
+from src.scoring_pipeline import LAYOUTS, REVERSE_COMPLEMENTS, load_net, read_chunks, write_npy
+
+METHODS = ["saliency", "input_x_gradient", "integrated_gradients"]
+STRANDS = ["mean", "fwd", "rc"]
+
+
+def strand_preds(net: nn.Module, x, rc_fn, strand: str = "mean"):
+    """(B,) predictions of the forward strand, the reverse complement or their mean as in ConjoinedNet.
+
+    The reverse complement is taken inside the graph, so gradients come back in forward-strand coordinates.
+    """
+    if strand == "fwd":
+        return net(x).view(-1)
+    if strand == "rc":
+        return net(rc_fn(x)).view(-1)
+
+    return net(torch.cat([x, rc_fn(x)])).view(2, -1).mean(dim=0)
+
+
+def gradients(net: nn.Module, x, rc_fn, strand: str = "mean"):
+    """d pred / d x of a batch of net inputs, same shape as `x`"""
+    x = x.detach().requires_grad_()
+    with torch.enable_grad():
+        preds = strand_preds(net, x, rc_fn, strand)
+        # predictions are independent per sequence (eval mode), so the gradient of the sum is per sequence
+        grad, = torch.autograd.grad(preds.sum(), x)
+
+    return grad
+
+
+def baseline_like(x, baseline: str = "zeros"):
+    if baseline == "zeros":
+        return torch.zeros_like(x)
+    if baseline == "uniform":
+        return torch.full_like(x, 0.25)
+    raise ValueError(f"Unknown baseline {baseline}")
+
+
+def attribute(
+    net: nn.Module,
+    x: torch.Tensor,
+    method: str = "saliency",
+    layout: str = "onehot",
+    strand: str = "mean",
+    steps: int = 50,
+    baseline: str = "zeros",
+    batch_size: int = 256
+) -> np.ndarray:
+    """Gradient attributions of a batch of net inputs.
+
+    - saliency:             d pred / d x
+    - input_x_gradient:     x * d pred / d x
+    - integrated_gradients: (x - baseline) * mean of d pred / d x along the straight path from `baseline`
+                            ("zeros" or "uniform" 0.25), midpoint rule with `steps` points
+
+    `x` is the one-hot net input of the layout, (N, L, 4) for "onehot" and (N, 4, L) for "dh"; at most
+    `batch_size` net inputs (sequences x integration steps) go through each forward/backward pass.
+    Returns (N, L, 4) float32 in the channel order of the layout.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method}")
+    rc_fn = REVERSE_COMPLEMENTS[layout]
+
+    attributions = torch.empty(x.shape)
+    if method == "integrated_gradients":
+        alphas = ((torch.arange(steps) + 0.5) / steps).view(-1, *[1] * x.dim())
+        group = max(1, batch_size // steps)
+        for start in range(0, len(x), group):
+            inputs = x[start:start + group]
+            base = baseline_like(inputs, baseline)
+            path = (base + alphas * (inputs - base)).flatten(0, 1)
+            grad = gradients(net, path, rc_fn, strand).view(steps, *inputs.shape).mean(dim=0)
+            attributions[start:start + group] = (inputs - base) * grad
+    else:
+        for start in range(0, len(x), batch_size):
+            inputs = x[start:start + batch_size]
+            grad = gradients(net, inputs, rc_fn, strand)
+            attributions[start:start + batch_size] = inputs * grad if method == "input_x_gradient" else grad
+
+    if layout != "onehot":
+        attributions = attributions.transpose(1, 2)
+
+    return attributions.numpy()
+
+
+def run(
+    net: nn.Module,
+    input_file,
+    output_path: str,
+    method: str = "saliency",
+    layout: str = "onehot",
+    strand: str = "mean",
+    steps: int = 50,
+    baseline: str = "zeros",
+    batch_size: int = 256,
+    chunk_size: int = 1024
+) -> int:
+    """Writes the (N, L, 4) float16 attributions of every sequence of `input_file` to the .npy file `output_path`.
+
+    Sequences are read and attributed `chunk_size` at a time and appended to the output as they come, so neither
+    is held in memory.
+    """
+    # every layout pads to a fixed net input length
+    length = LAYOUTS[layout](*encode_many(["A"]))[0].numel() // 4
+    attributions = (
+        attribute(net, LAYOUTS[layout](*encode_many(chunk))[0], method, layout, strand, steps, baseline, batch_size)
+        for chunk in read_chunks(input_file, chunk_size) if chunk
+    )
+
+    return write_npy(output_path, attributions, (length, 4), np.float16)
+
+
+def main(args) -> None:
+    torch.set_num_threads(args.threads)
+    net = load_net(args.ckpt, args.config)
+    # only input gradients are needed
+    net.requires_grad_(False)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    start = time.perf_counter()
+    try:
+        n = run(net, input_file, args.output, args.method, args.layout, args.strand, args.steps, args.baseline,
+                args.batch_size, args.chunk_size)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"{args.method} of {n} sequences in {elapsed:.1f}s ({n / elapsed:.1f} seqs/sec) -> {args.output}", file=sys.stderr)
@@ -1,44 +1,33 @@
 import numpy as np
 import torch
 from torch.utils.data import Dataset
-from Bio.Seq import Seq
+from src.datamodules.components.encoding import (
+    C_IDX, T_IDX, N_IDX, PAD_IDX, COMPLEMENT, IDX2ATCG, ONE_HOT_ATCG, ONE_HOT_ATCG_V2, one_hot, pad_left, reverse_complement
+)
 
 
 class OneHotDataset(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0., 0., 0., 0.]
-        }
-    
-    def seq2mat(self,seq, max_len=110):
-        if len(seq) > max_len:
-            seq = seq[len(seq) - max_len :]
-        else:
-            seq = "N" * (max_len - len(seq)) + seq
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
-    
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ATCG
+    
+    def seq2idx(self, seq, max_len=110):
+        return pad_left(seq, max_len, N_IDX)
+    
+    def seq2mat(self, seq_idx):
+        return torch.from_numpy(one_hot(seq_idx, self.one_hot_matrix))
 
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        X = self.seq2mat(seq)
-        X_rev = self.reverse_complement(X)
+        seq, target = self.records[idx]
+        seq_idx = self.seq2idx(seq)
+        X = self.seq2mat(seq_idx)
+        X_rev = self.seq2mat(reverse_complement(seq_idx))
         y = torch.tensor(float(target), dtype=torch.float32)
         
         return X, X_rev, y
@@ -47,44 +36,31 @@ class OneHotDataset(Dataset):
 class WeightDataset(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        df["target_int"] = np.round(df.target).astype(int)
-        n_targets = df.target_int.value_counts()
+        target_int = np.round(records.target_values()).astype(int)
+        _, target_idx, n_targets = np.unique(target_int, return_inverse=True, return_counts=True)
         sample_weights = np.log(n_targets.sum() / n_targets)
-        df["weights"] = df["target_int"].map(lambda x: sample_weights[x])
-        df = df.drop("target_int", axis=1)
+        self.weights = sample_weights[target_idx]
         
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0., 0., 0., 0.]
-        }
-    
-    def seq2mat(self,seq, max_len=110):
-        if len(seq) > max_len:
-            seq = seq[len(seq) - max_len :]
-        else:
-            seq = "N" * (max_len - len(seq)) + seq
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
-    
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ATCG
+    
+    def seq2idx(self, seq, max_len=110):
+        return pad_left(seq, max_len, N_IDX)
+    
+    def seq2mat(self, seq_idx):
+        return torch.from_numpy(one_hot(seq_idx, self.one_hot_matrix))
 
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target, weight = self.records[idx]
-        X = self.seq2mat(seq)
-        X_rev = self.reverse_complement(X)
+        seq, target = self.records[idx]
+        weight = self.weights[idx]
+        seq_idx = self.seq2idx(seq)
+        X = self.seq2mat(seq_idx)
+        X_rev = self.seq2mat(reverse_complement(seq_idx))
         target = (target - 11) / 2
         y = torch.tensor(float(target), dtype=torch.float32)
         w = torch.tensor(weight, dtype=torch.float32)
@@ -94,39 +70,25 @@ class WeightDataset(Dataset):
 class OneHotDataset_v2(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0.25, 0.25, 0.25, 0.25],
-            "X": [0., 0., 0., 0.]
-        }
-    
-    def seq2mat(self,seq, max_len=110):
-        if len(seq) > max_len:
-            seq = seq[len(seq) - max_len :]
-        else:
-            seq = "X" * (max_len - len(seq)) + seq
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
-    
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ATCG_V2
+    
+    def seq2idx(self, seq, max_len=110):
+        return pad_left(seq, max_len, PAD_IDX)
+    
+    def seq2mat(self, seq_idx):
+        return torch.from_numpy(one_hot(seq_idx, self.one_hot_matrix))
 
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        X = self.seq2mat(seq)
-        X_rev = self.reverse_complement(X)
+        seq, target = self.records[idx]
+        seq_idx = self.seq2idx(seq)
+        X = self.seq2mat(seq_idx)
+        X_rev = self.seq2mat(reverse_complement(seq_idx))
         y = torch.tensor(float(target), dtype=torch.float32)
         
         return X, X_rev, y
@@ -136,25 +98,24 @@ class OneHotDataset_v2(Dataset):
 class IndexDataset(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        self.records = df.to_records()
-        self.base2idx = {"A": 0, "T": 1, "C": 2, "G": 3, "N": 4}
-    
-    def seq2vec(self, seq, max_len=110):
-        seq = seq[:max_len]
-        mat = torch.tensor(list(map(lambda x: self.base2idx[x], seq)), dtype=torch.long)
-        mat = torch.cat([mat, 4 * torch.ones(max_len - len(seq), dtype=torch.long)])
-        return mat
+        self.records = records
+    
+    def seq2vec(self, seq_idx, max_len=110):
+        # A, T, C, G, N = 0, 1, 2, 3, 4, trimmed or padded with N on the right
+        seq_idx = seq_idx[:max_len]
+        vec = np.full(max_len, 4, dtype=np.int64)
+        vec[:len(seq_idx)] = IDX2ATCG[seq_idx]
+        return torch.from_numpy(vec)
 
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        seq, target = line.split("\t")
+        seq, target = self.records[idx]
         X = self.seq2vec(seq)
-        X_rev = self.seq2vec(Seq(seq).reverse_complement())
+        X_rev = self.seq2vec(reverse_complement(seq))
         y = torch.tensor(float(target), dtype=torch.float32)
         
         return X, X_rev, y
@@ -163,43 +124,101 @@ class IndexDataset(Dataset):
 class ShiftDataset(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0., 0., 0., 0.]
-        }
-    
-    def seq2mat(self, seq, max_len=110):
-        if len(seq) > max_len:
-            seq = seq[len(seq) - max_len :]
-        else:
-            seq = "N" * (max_len - len(seq)) + seq
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
-    
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
-        
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ATCG
+    
+    def seq2mat(self, seq_idx):
+        return torch.from_numpy(one_hot(seq_idx, self.one_hot_matrix))
+
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        ls_seq = "C" + seq[:-1]
-        rs_seq = seq[1:] + "T"
-        fwd_tensors = [self.seq2mat(ls_seq), self.seq2mat(seq), self.seq2mat(rs_seq)]
-        rev_tensors = [self.reverse_complement(fwd_tensor) for fwd_tensor in fwd_tensors]
+        seq, target = self.records[idx]
+        ls_seq = np.insert(seq[:-1], 0, C_IDX)
+        rs_seq = np.insert(seq[1:], len(seq) - 1, T_IDX)
+        fwd_idxs = [pad_left(ls_seq), pad_left(seq), pad_left(rs_seq)]
+        fwd_tensors = [self.seq2mat(fwd_idx) for fwd_idx in fwd_idxs]
+        rev_tensors = [self.seq2mat(reverse_complement(fwd_idx)) for fwd_idx in fwd_idxs]
         tensors = fwd_tensors + rev_tensors
         y = torch.tensor(float(target), dtype=torch.float32)
         tensors.append(y)
         
         return tuple(tensors)
     
+
+
+class BatchIndexDataset(Dataset):
+    """Used with a BatchSampler: returns the indices of a whole batch, which OneHotCollate turns into tensors."""
+    def __init__(
+        self, 
+        records
+    ):
+        self.records = records
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, indices):
+        return np.asarray(indices)
+
+
+class OneHotCollate:
+    """Batched OneHotDataset / OneHotDataset_v2.
+
+    Gathers the (B, L) uint8 slice of the batch from the store, one-hot encodes it with a single
+    table lookup and gets the reverse complement by flipping along L and swapping A<->T, C<->G.
+    """
+    def __init__(
+        self, 
+        records, 
+        one_hot_matrix=ONE_HOT_ATCG, 
+        pad=N_IDX, 
+        max_len=110
+    ):
+        self.records = records
+        self.one_hot_matrix = torch.from_numpy(one_hot_matrix)
+        self.pad = pad
+        self.max_len = max_len
+        self.complement = torch.LongTensor([1, 0, 3, 2])  # channel order is A, T, C, G
+
+    def __call__(self, indices):
+        seq_idx, targets = self.records.gather(indices, self.max_len, self.pad)
+        X = self.one_hot_matrix[torch.from_numpy(seq_idx).long()]
+        X_rev = X.flip(1).index_select(2, self.complement)
+        y = torch.from_numpy(targets.astype(np.float32))
+
+        return X, X_rev, y
+
+
+class DynamicPadCollate:
+    """Variable-length OneHotCollate: sequences are right-padded with PAD_IDX to the longest one of the batch, not trimmed.
+
+    The reverse complement is right-padded as well, so both strands start at position 0. Used with
+    BucketBatchSampler so that the padding is at most one bucket width; only nets that do not
+    assume a fixed length (e.g. deepfamq_crc_varlen) can consume these batches.
+    """
+    def __init__(
+        self, 
+        records, 
+        one_hot_matrix=ONE_HOT_ATCG
+    ):
+        self.records = records
+        self.one_hot_matrix = torch.from_numpy(one_hot_matrix)
+
+    def __call__(self, indices):
+        rows = self.records.rows[np.asarray(indices)]
+        lengths = self.records.store.lengths[rows]
+        seqs = self.records.store.unpack(rows)[:, :lengths.max()]
+
+        pos = lengths[:, None] - 1 - np.arange(seqs.shape[1])
+        rev = COMPLEMENT[np.take_along_axis(seqs, np.maximum(pos, 0), axis=1)]
+        rev[pos < 0] = PAD_IDX
+
+        X = self.one_hot_matrix[torch.from_numpy(seqs).long()]
+        X_rev = self.one_hot_matrix[torch.from_numpy(rev).long()]
+        y = torch.from_numpy(np.asarray(self.records.targets[rows], dtype=np.float32))
+
+        return X, X_rev, y
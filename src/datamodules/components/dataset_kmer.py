@@ -1,101 +1,61 @@
 import numpy as np
 import torch
 from torch.utils.data import Dataset
-from Bio.Seq import Seq
-import itertools
+from src.datamodules.components.encoding import IDX2ATCG, N_IDX, pad_left
 
 
-class KmerDataset(Dataset):
-    def __init__(
-        self, 
-        df,
-        k
-    ):
-        self.records = df.to_records()
+# k-mers are numbered in base 5 over the "ATCGN" alphabet, first base most significant,
+# i.e. the row of the old `itertools.product(*["ATCGN"] * k)` one-hot table
+COMPLEMENT_DIGIT = np.array([1, 0, 3, 2, 4], dtype=np.int64)
 
-        self.k = k
-        kmers = ["".join(v) for v in itertools.product(*["ATCGN"] * k)]
-        kmer2idx = {kmer: i for i, kmer in enumerate(kmers)}
 
+def kmer_ids(seq_idx, k):
+    """(..., L) base indices -> (..., L-k+1) int64 k-mer ids in [0, 5**k), rolling base-5 hash over the last axis"""
+    digits = IDX2ATCG[seq_idx]
+    n = digits.shape[-1] - k + 1
+    ids = np.zeros(digits.shape[:-1] + (n,), dtype=np.int64)
+    for i in range(k):
+        ids = ids * 5 + digits[..., i: i + n]
 
-        def idx2vec(length, idx):
-            vec = [0.] * length
-            vec[idx] += 1
+    return ids
 
-            return vec
 
-        self.kmer2vec = {kmer: idx2vec(5**k, idx) for idx, kmer in enumerate(kmer2idx)}
-    
-    def seq2mat(self, seq, max_len=110):
-        if len(seq) > max_len:
-            seq = seq[len(seq) - max_len :]
-        else:
-            seq = "N" * (max_len - len(seq)) + seq
-        
-        mat = []
-        for i in range(len(seq) - self.k + 1):
-            mat.append(self.kmer2vec[seq[i:i+self.k]])
+def reverse_complement_kmers(ids, k):
+    """k-mer ids of the reverse-complement sequence, computed from the forward ids without re-encoding.
 
-        return torch.tensor(mat, dtype=torch.float32)
-    
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
+    Complementing every digit and reversing their order maps the id of a k-mer to the id of its RC;
+    reversing along the last axis then gives the k-mers of the RC sequence in order.
+    """
+    ids = ids[..., ::-1]
+    rc_ids = np.zeros_like(ids)
+    for _ in range(k):
+        ids, digit = np.divmod(ids, 5)
+        rc_ids = rc_ids * 5 + COMPLEMENT_DIGIT[digit]
 
-    def __len__(self):
-        return len(self.records)
-    
-    def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        X = self.seq2mat(seq)
-        X_rev = self.seq2mat(Seq(seq).reverse_complement())
-        y = torch.tensor(float(target), dtype=torch.float32)
-        
-        return X, X_rev, y
-    
-    
-class ShiftDataset(Dataset):
+    return rc_ids
+
+
+class KmerDataset(Dataset):
+    """(L-k+1,) int64 k-mer ids, consumed by an embedding layer instead of a dense (L-k+1, 5**k) one-hot"""
     def __init__(
         self, 
-        df
+        records,
+        k
     ):
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0., 0., 0., 0.]
-        }
-    
-    def seq2mat(self, seq, max_len=110):
-        if len(seq) > max_len:
-            seq = seq[len(seq) - max_len :]
-        else:
-            seq = "N" * (max_len - len(seq)) + seq
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
+        self.records = records
+        self.k = k
     
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
-        
+    def seq2idx(self, seq, max_len=110):
+        return pad_left(seq, max_len, N_IDX)
+
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        ls_seq = "C" + seq[:-1]
-        rs_seq = seq[1:] + "T"
-        fwd_tensors = [self.seq2mat(ls_seq), self.seq2mat(seq), self.seq2mat(rs_seq)]
-        rev_tensors = [self.reverse_complement(fwd_tensor) for fwd_tensor in fwd_tensors]
-        tensors = fwd_tensors + rev_tensors
+        seq, target = self.records[idx]
+        ids = kmer_ids(self.seq2idx(seq), self.k)
+        X = torch.from_numpy(ids)
+        X_rev = torch.from_numpy(reverse_complement_kmers(ids, self.k))
         y = torch.tensor(float(target), dtype=torch.float32)
-        tensors.append(y)
         
-        return tuple(tensors)
-    
+        return X, X_rev, y
@@ -6,116 +6,140 @@ from torch.utils.data import Dataset, DataLoader
 
 import numpy as np
 import random
+from src.datamodules.components.encoding import (
+    PAD_IDX, ONE_HOT_ACGT, SCAFFOLD_LEFT, SCAFFOLD_RIGHT, one_hot, reverse_complement
+)
+
+
+def embed_in_scaffold(seqs, lengths):
+    """(B, W) right-padded base indices -> (B, 37 + W + 76) with every sequence placed between the vector scaffolds"""
+    left = len(SCAFFOLD_LEFT)
+    ext = np.full((len(seqs), left + seqs.shape[1] + len(SCAFFOLD_RIGHT)), PAD_IDX, dtype=np.uint8)
+    ext[:, :left] = SCAFFOLD_LEFT
+    ext[:, left:left + seqs.shape[1]] = seqs
+    cols = np.arange(ext.shape[1] - left) - lengths[:, None]
+    right = (cols >= 0) & (cols < len(SCAFFOLD_RIGHT))
+    ext[:, left:][right] = SCAFFOLD_RIGHT[cols[right]]
+
+    return ext
+
+
+def shifted_views(seqs, lengths, shifts, pad_right, max_length=110):
+    """All shifted and padded views of a batch with one gather.
+
+    Equivalent to shifting each sequence by `shift` bases into the scaffold (10bp at most), then
+    padding it to `max_length` with the right (`pad_right`) or left scaffold, or trimming it from the right.
+    seqs: (B, W) right-padded base indices, lengths: (B,), shifts: (T,), pad_right: (B, T) -> (B, T, max_length)
+    """
+    left = len(SCAFFOLD_LEFT)
+    n = lengths[:, None, None].astype(np.int64)
+    shift = np.asarray(shifts)[None, :, None]
+    j = np.arange(max_length)[None, None, :]
+    pad = max_length - n
+    pos_right = np.where(j < n, left + shift + j, left + j)
+    pos_left = np.where(j >= pad, left + shift + j - pad, left - pad + j)
+    pos = np.where((n < max_length) & ~pad_right[:, :, None], pos_left, pos_right)
+
+    ext = embed_in_scaffold(seqs, lengths)
+    views = np.take_along_axis(ext, pos.reshape(len(ext), -1), axis=1)
+
+    return views.reshape(pos.shape)
 
 
 class ShiftDataset(Dataset):
-    def __init__(self, df, max_length=110, tta=3):
+    def __init__(self, records, max_length=110, tta=3):
         super().__init__()
-        self.base2int = {'A': 0, 'C': 1, 'G': 2, 'T': 3, 'N': 4}
-        self.one_hot_matrix = torch.tensor([
-            [1., 0., 0., 0.],
-            [0., 1., 0., 0.],
-            [0., 0., 1., 0.],
-            [0., 0., 0., 1.],
-            [0., 0., 0., 0.],
-        ])
-        
-        self.records = df.to_records()
+        self.one_hot_matrix = ONE_HOT_ACGT
+
+        self.records = records
         self.max_length = max_length
 
         self.tta = tta
         assert self.tta % 2 == 1
+        self.shifts = np.array([i - self.tta // 2 for i in range(self.tta)])
 
-    def _get_shifted_sequence(self, seq, shift):
-        if shift == 0:
-            return seq
-        elif shift < 0:
-            shift = -shift
-            return 'CGATTCGAAC'[-shift:] + seq[:-shift]
-        else:
-            return seq[shift:] + 'TCTTAATTAA'[:shift] # 10bp scaffold + seq + 10bp scaffold
-
-    def _pad(self, seq):
-        # Make sure that sequence length is exactly `max_length`.
-        vector_left = 'GCTAGCAGGAATGATGCAAAAGGTTCCCGATTCGAAC'
-        vector_right = 'TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACGA'
-        
-        if len(seq) < self.max_length:
-            if random.random() < 0.5: 
-                seq = seq + vector_right[:self.max_length - len(seq)] # Pad right.
-            else:
-                seq = vector_left[-(self.max_length - len(seq)):] + seq # Pad left.
-        elif len(seq) > self.max_length: # Trim it from the right.
-            seq = seq[:self.max_length]
-
-        # if len(seq) < self.max_length:
-            # seq = 'N' * (self.max_length - len(seq)) + seq  # Pad left with 'N'.
-        # elif len(seq) > self.max_length:
-            # seq = seq[-self.max_length:]  # Trim it from the left.
-
-        return seq
-    
     def __getitem__(self, i):
-        seq, exp = self.records[i].seq, self.records[i].target
+        seq, exp = self.records[i]
 
-        seqs = []
-        shift_range = [i - self.tta // 2 for i in range(self.tta)]
-        for shift in shift_range:
-            seq_shifted = self._get_shifted_sequence(seq, shift)
-            seq_shifted = self._pad(seq_shifted)
+        # one draw per shift, in the same order as padding the views one by one
+        if len(seq) < self.max_length:
+            pad_right = np.array([[random.random() < 0.5 for _ in self.shifts]])
+        else:
+            pad_right = np.ones((1, self.tta), dtype=bool)
+        views = shifted_views(seq[None], np.array([len(seq)]), self.shifts, pad_right, self.max_length)[0]
 
-            seq_shifted_int = [self.base2int[base] for base in seq_shifted]
-            seq_shifted = self.one_hot_matrix[seq_shifted_int].T
-            seqs.append(seq_shifted)
+        # (tta, L) -> forward/RC interleaved (2 * tta, 4, L) one-hot
+        views = np.stack([views, reverse_complement(views)], axis=1).reshape(2 * self.tta, self.max_length)
+        seqs = list(torch.from_numpy(np.ascontiguousarray(one_hot(views, self.one_hot_matrix).transpose(0, 2, 1))).unbind(0))
 
-            seq_shifted_rc = seq_shifted.flip([0, 1])
-            seqs.append(seq_shifted_rc)
-        
         seqs.append(torch.tensor([exp]).float())
-        
+
         return tuple(seqs)
 
     def __len__(self):
         return len(self.records)
 
 
+class ShiftCollate:
+    """Batched ShiftDataset (BaseDataset with tta=1), used with dataset.BatchIndexDataset.
+
+    Draws the padding sides in the same order as the per-sample path, so batches are bit-identical for a fixed seed.
+    """
+    def __init__(self, records, tta=3, max_length=110):
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ACGT
+        self.max_length = max_length
+        self.tta = tta
+        self.shifts = np.array([i - self.tta // 2 for i in range(self.tta)])
+
+    def __call__(self, indices):
+        rows = self.records.rows[np.asarray(indices)]
+        store = self.records.store
+        lengths = store.lengths[rows]
+        seqs = store.unpack(rows)
+
+        pad_right = np.ones((len(rows), self.tta), dtype=bool)
+        for b in np.flatnonzero(lengths < self.max_length):
+            pad_right[b] = [random.random() < 0.5 for _ in self.shifts]
+        views = shifted_views(seqs, lengths, self.shifts, pad_right, self.max_length)
+
+        # (B, tta, L) -> (2 * tta, B, 4, L), forward/RC interleaved
+        views = np.stack([views, reverse_complement(views)], axis=2).reshape(len(rows), 2 * self.tta, self.max_length)
+        X = torch.from_numpy(np.ascontiguousarray(one_hot(views, self.one_hot_matrix).transpose(1, 0, 3, 2)))
+        y = torch.from_numpy(np.asarray(self.records.targets[rows], dtype=np.float32).reshape(-1, 1))
+
+        return tuple(X.unbind(0)) + (y,)
+
+
 class BaseDataset(Dataset):
-    def __init__(self, df, max_length=110):
+    def __init__(self, records, max_length=110):
         super().__init__()
-        self.base2int = {'A': 0, 'C': 1, 'G': 2, 'T': 3, 'N': 4}
-        self.one_hot_matrix = torch.tensor([
-            [1., 0., 0., 0.],
-            [0., 1., 0., 0.],
-            [0., 0., 1., 0.],
-            [0., 0., 0., 1.],
-            [0., 0., 0., 0.],
-        ])
-        
-        self.records = df.to_records()
+        self.one_hot_matrix = ONE_HOT_ACGT
+
+        self.records = records
         self.max_length = max_length
-    
+
+    def seq2mat(self, seq_idx):
+        # (max_length,) base indices -> (4, max_length) one-hot
+        return torch.from_numpy(np.ascontiguousarray(one_hot(seq_idx, self.one_hot_matrix).T))
+
     def __getitem__(self, i):
-        seq, exp = self.records[i].seq, self.records[i].target
+        seq, exp = self.records[i]
 
         # Make sure that sequence length is exactly `max_length`.
-        vector_left = 'GCTAGCAGGAATGATGCAAAAGGTTCCCGATTCGAAC'
-        vector_right = 'TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACGA'
-        
         if len(seq) < self.max_length:
-            if random.random() < 0.5: 
-                seq = seq + vector_right[:self.max_length - len(seq)] # Pad right.
+            if random.random() < 0.5:
+                seq = np.concatenate([seq, SCAFFOLD_RIGHT[:self.max_length - len(seq)]]) # Pad right.
             else:
-                seq = vector_left[-(self.max_length - len(seq)):] + seq # Pad left.
+                seq = np.concatenate([SCAFFOLD_LEFT[-(self.max_length - len(seq)):], seq]) # Pad left.
         elif len(seq) > self.max_length: # Trim it from the right.
             seq = seq[:self.max_length]
 
-        # One-hot encode sequence.
-        seq_int = [self.base2int[base] for base in seq]
-        seq = self.one_hot_matrix[seq_int].T # Produces 4 x max_length one-hot tensor. (in fact it's one-hot except columns for 'N')
-
-        seq_rc = seq.flip([0, 1])
+        # One-hot encode sequence. (4 x max_length; in fact it's one-hot except columns for 'N')
+        seq_rc = self.seq2mat(reverse_complement(seq))
+        seq = self.seq2mat(seq)
 
         return seq, seq_rc, torch.tensor([exp]).float()
 
     def __len__(self):
-        return len(self.records)
\ No newline at end of file
+        return len(self.records)
@@ -1,42 +1,33 @@
 import numpy as np
 import torch
 from torch.utils.data import Dataset
+from src.datamodules.components.encoding import (
+    C_IDX, ONE_HOT_ATCG, SCAFFOLD_RIGHT, one_hot, reverse_complement
+)
 
 
 class OneHotDataset(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0., 0., 0., 0.]
-        }
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ATCG
     
-    def seq2mat(self, seq, max_len=110):
-        vec = "TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACG"
-        seq = seq + vec
-        seq = seq[:max_len]
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
+    def seq2idx(self, seq, max_len=110):
+        return np.concatenate([seq, SCAFFOLD_RIGHT])[:max_len]
+    
+    def seq2mat(self, seq_idx):
+        return torch.from_numpy(one_hot(seq_idx, self.one_hot_matrix))
     
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
-
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        X = self.seq2mat(seq)
-        X_rev = self.reverse_complement(X)
+        seq, target = self.records[idx]
+        seq_idx = self.seq2idx(seq)
+        X = self.seq2mat(seq_idx)
+        X_rev = self.seq2mat(reverse_complement(seq_idx))
         y = torch.tensor(float(target), dtype=torch.float32)
         
         return X, X_rev, y
@@ -45,38 +36,25 @@ class OneHotDataset(Dataset):
 class ShiftDataset(Dataset):
     def __init__(
         self, 
-        df
+        records
     ):
-        self.records = df.to_records()
-        self.base2vec = {
-            "A": [1., 0., 0., 0.],
-            "T": [0., 1., 0., 0.],
-            "C": [0., 0., 1., 0.],
-            "G": [0., 0., 0., 1.],
-            "N": [0., 0., 0., 0.]
-        }
+        self.records = records
+        self.one_hot_matrix = ONE_HOT_ATCG
     
-    def seq2mat(self, seq, max_len=110):
-        seq = seq[:max_len]
-        mat = torch.tensor(list(map(lambda x: self.base2vec[x], seq)), dtype=torch.float32)
-        return mat
+    def seq2mat(self, seq_idx):
+        return torch.from_numpy(one_hot(seq_idx, self.one_hot_matrix))
     
-    def reverse_complement(self, fwd_tensor):
-        temp = fwd_tensor.flip(0)
-        rev_tensor = temp.index_select(dim=1, index=torch.LongTensor([1, 0, 3, 2]))
-        
-        return rev_tensor
-        
     def __len__(self):
         return len(self.records)
     
     def __getitem__(self, idx):
-        _, seq, target = self.records[idx]
-        seq = seq + "TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACG"
-        ls_seq = "C" + seq + "TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACG"
-        rs_seq = seq[1:] + "TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACG"
-        fwd_tensors = [self.seq2mat(ls_seq), self.seq2mat(seq), self.seq2mat(rs_seq)]
-        rev_tensors = [self.reverse_complement(fwd_tensor) for fwd_tensor in fwd_tensors]
+        seq, target = self.records[idx]
+        seq = np.concatenate([seq, SCAFFOLD_RIGHT])
+        ls_seq = np.insert(seq, 0, C_IDX)
+        rs_seq = np.concatenate([seq[1:], SCAFFOLD_RIGHT])
+        fwd_idxs = [ls_seq[:110], seq[:110], rs_seq[:110]]
+        fwd_tensors = [self.seq2mat(fwd_idx) for fwd_idx in fwd_idxs]
+        rev_tensors = [self.seq2mat(reverse_complement(fwd_idx)) for fwd_idx in fwd_idxs]
         tensors = fwd_tensors + rev_tensors
         y = torch.tensor(float(target), dtype=torch.float32)
         tensors.append(y)
@@ -0,0 +1,122 @@
+import numpy as np
+
+
+# Canonical base indices shared by every dataset. Channel order of the one-hot output is decided
+# by the one-hot table, so the same uint8 index array serves both the "ATCG" and "ACGT" layouts.
+A_IDX, C_IDX, G_IDX, T_IDX, N_IDX, PAD_IDX = range(6)  # "X" pad is told apart from N only by OneHotDataset_v2
+INVALID = 255
+
+BASE2IDX = np.full(256, INVALID, dtype=np.uint8)
+for _base, _idx in zip("ACGTNX", range(6)):
+    BASE2IDX[ord(_base)] = _idx
+
+IDX2BASE = np.frombuffer(b"ACGTNX", dtype=np.uint8)
+
+# Base index -> A, T, C, G, N order used by IndexDataset and the k-mer digits (X counts as N)
+IDX2ATCG = np.array([0, 2, 3, 1, 4, 4], dtype=np.int64)
+
+# Complement in index space: A <-> T, C <-> G, N -> N, X -> X
+COMPLEMENT = np.array([T_IDX, G_IDX, C_IDX, A_IDX, N_IDX, PAD_IDX], dtype=np.uint8)
+
+# One-hot tables indexed by base index -> channel vector
+ONE_HOT_ATCG = np.array([
+    [1., 0., 0., 0.],  # A
+    [0., 0., 1., 0.],  # C
+    [0., 0., 0., 1.],  # G
+    [0., 1., 0., 0.],  # T
+    [0., 0., 0., 0.],  # N
+    [0., 0., 0., 0.],  # X
+], dtype=np.float32)
+
+ONE_HOT_ATCG_V2 = np.array([
+    [1., 0., 0., 0.],
+    [0., 0., 1., 0.],
+    [0., 0., 0., 1.],
+    [0., 1., 0., 0.],
+    [0.25, 0.25, 0.25, 0.25],
+    [0., 0., 0., 0.],
+], dtype=np.float32)
+
+ONE_HOT_ACGT = np.array([
+    [1., 0., 0., 0.],
+    [0., 1., 0., 0.],
+    [0., 0., 1., 0.],
+    [0., 0., 0., 1.],
+    [0., 0., 0., 0.],
+    [0., 0., 0., 0.],
+], dtype=np.float32)
+
+# MPRA plasmid scaffold flanking the random promoter region
+VECTOR_LEFT = "GCTAGCAGGAATGATGCAAAAGGTTCCCGATTCGAAC"
+VECTOR_RIGHT = "TCTTAATTAAAAAAAGATAGAAAACATTAGGAGTGTAACACAAGACTTTCGGATCCTGAGCAGGCAAGATAAACGA"
+
+
+def encode(seq: str) -> np.ndarray:
+    """Maps a nucleotide string to a uint8 array of base indices with a 256-entry lookup table."""
+    idx = BASE2IDX[np.frombuffer(seq.encode("ascii"), dtype=np.uint8)]
+    if idx.size and idx.max() == INVALID:
+        raise ValueError(f"Unexpected character in sequence: {seq}")
+
+    return idx
+
+
+def decode(idx: np.ndarray) -> str:
+    """Inverse of `encode`"""
+
+    return IDX2BASE[idx].tobytes().decode("ascii")
+
+
+def pad_left(idx: np.ndarray, max_len: int = 110, pad: int = N_IDX) -> np.ndarray:
+    """Left-pads with `pad` or trims from the left so that the length is exactly `max_len`."""
+    if len(idx) > max_len:
+        return idx[len(idx) - max_len:]
+
+    return np.concatenate([np.full(max_len - len(idx), pad, dtype=np.uint8), idx])
+
+
+def reverse_complement(idx: np.ndarray) -> np.ndarray:
+    """Reverse complement along the last axis; works for a single sequence or a (B, L) batch."""
+
+    return COMPLEMENT[idx[..., ::-1]]
+
+
+def pack_2bit(seqs: np.ndarray, lengths: np.ndarray):
+    """Right-padded (N, W) base indices -> (N, ceil(W/4)) uint8 2-bit codes and (N, ceil(W/8)) uint8 N bitmask.
+
+    A, C, G, T are stored as their indices 0-3, four bases per byte with the first base in the high bits.
+    N positions are stored as A and flagged in the bitmask; pad positions are told apart by `lengths` alone.
+    """
+    cols = np.arange(seqs.shape[1])
+    inside = cols < lengths[:, None]
+    if (inside & (seqs == PAD_IDX)).any():
+        raise ValueError("Pad characters inside sequences cannot be packed")
+    codes = np.where(seqs < N_IDX, seqs, 0)
+    codes = np.pad(codes, ((0, 0), (0, -seqs.shape[1] % 4))).reshape(len(seqs), -1, 4)
+    packed = (codes[..., 0] << 6) | (codes[..., 1] << 4) | (codes[..., 2] << 2) | codes[..., 3]
+
+    return packed.astype(np.uint8), np.packbits(inside & (seqs == N_IDX), axis=1)
+
+
+# Byte -> its four 2-bit codes, high bits first
+BYTE2CODES = ((np.arange(256)[:, None] >> np.array([6, 4, 2, 0])) & 3).astype(np.uint8)
+
+
+def unpack_2bit(packed: np.ndarray, mask: np.ndarray, lengths: np.ndarray, width: int = None) -> np.ndarray:
+    """Inverse of `pack_2bit` for a (B, ceil(W/4)) slice of rows -> (B, width) base indices right-padded with PAD_IDX"""
+    if width is None:
+        width = packed.shape[1] * 4
+    seqs = BYTE2CODES[packed].reshape(len(packed), -1)[:, :width]
+    seqs[np.unpackbits(mask, axis=1, count=width).view(bool)] = N_IDX
+    seqs[np.arange(width) >= lengths[:, None]] = PAD_IDX
+
+    return seqs
+
+
+def one_hot(idx: np.ndarray, table: np.ndarray = ONE_HOT_ATCG) -> np.ndarray:
+    """(..., L) base indices -> (..., L, 4) float32 one-hot"""
+
+    return table[idx]
+
+
+SCAFFOLD_LEFT = encode(VECTOR_LEFT)
+SCAFFOLD_RIGHT = encode(VECTOR_RIGHT)
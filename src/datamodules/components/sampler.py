@@ -0,0 +1,50 @@
+import math
+
+import numpy as np
+import torch
+from torch.utils.data import Sampler
+
+
+class BucketBatchSampler(Sampler):
+    """Batches of indices whose sequences fall in the same `bucket_width`-bp length bucket.
+
+    With `shuffle`, indices are shuffled within each bucket and the batches of all buckets are
+    shuffled together every epoch, using torch's global RNG like RandomSampler.
+    """
+    def __init__(
+        self,
+        lengths: np.ndarray,
+        batch_size: int,
+        bucket_width: int = 10,
+        shuffle: bool = True,
+        drop_last: bool = False
+    ):
+        self.buckets = np.asarray(lengths) // bucket_width
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.drop_last = drop_last
+
+    def __iter__(self):
+        order = torch.randperm(len(self.buckets)).numpy() if self.shuffle else np.arange(len(self.buckets))
+        order = order[np.argsort(self.buckets[order], kind="stable")]
+        bounds = np.flatnonzero(np.diff(self.buckets[order])) + 1
+
+        batches = []
+        for bucket in np.split(order, bounds):
+            for start in range(0, len(bucket), self.batch_size):
+                batch = bucket[start:start + self.batch_size]
+                if self.drop_last and len(batch) < self.batch_size:
+                    continue
+                batches.append(batch.tolist())
+
+        if self.shuffle:
+            batches = [batches[i] for i in torch.randperm(len(batches)).tolist()]
+
+        return iter(batches)
+
+    def __len__(self):
+        _, counts = np.unique(self.buckets, return_counts=True)
+        if self.drop_last:
+            return int(sum(count // self.batch_size for count in counts))
+
+        return int(sum(math.ceil(count / self.batch_size) for count in counts))
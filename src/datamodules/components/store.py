@@ -0,0 +1,195 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import KFold
+
+from src.datamodules.components.encoding import BASE2IDX, INVALID, N_IDX, PAD_IDX, pack_2bit, unpack_2bit
+
+
+def file_digest(path: str, chunk_size: int = 1 << 23) -> str:
+    """Content hash of a source file, used as the cache key of its compiled store."""
+    h = hashlib.blake2b(digest_size=8)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+
+    return h.hexdigest()
+
+
+def encode_many(seqs, chunk_size: int = 1 << 18):
+    """Encodes a list of strings into a right-padded (N, max_len) uint8 index array plus lengths."""
+    lengths = np.fromiter(map(len, seqs), dtype=np.int32, count=len(seqs))
+    width = int(lengths.max()) if len(seqs) else 0
+    out = np.full((len(seqs), width), PAD_IDX, dtype=np.uint8)
+    cols = np.arange(width)
+    for start in range(0, len(seqs), chunk_size):
+        stop = min(start + chunk_size, len(seqs))
+        buf = BASE2IDX[np.frombuffer("".join(seqs[start:stop]).encode("ascii"), dtype=np.uint8)]
+        if buf.size and buf.max() == INVALID:
+            raise ValueError(f"Unexpected character in sequences {start}-{stop}")
+        # boolean assignment fills in row-major order, i.e. sequence by sequence
+        out[start:stop][cols < lengths[start:stop, None]] = buf
+
+    return out, lengths
+
+
+def pad_left_many(seqs, lengths, max_len: int = 110, pad: int = N_IDX, rows=None):
+    """Batched `pad_left` of right-padded (N, W) base indices (optionally only `rows` of them) -> (B, max_len)"""
+    if rows is None:
+        rows = np.arange(len(lengths))
+    pos = lengths[:, None] - max_len + np.arange(max_len)
+    out = seqs[rows[:, None], np.maximum(pos, 0)]
+    out[pos < 0] = pad
+
+    return out
+
+
+class SequenceStore:
+    """Pre-encoded `seq<TAB>target` file.
+
+    Compiled once per source file (keyed by its content hash) into `.npy` arrays that are opened
+    with `mmap_mode="r"`, so forked DataLoader workers share the same pages:
+    - packed.npy  (N, ceil(W/4)) uint8, 2-bit base codes (see `pack_2bit`)
+    - mask.npy    (N, ceil(W/8)) uint8, bitmask of N positions
+    - lengths.npy (N,) int32
+    - targets.npy (N,) float32
+    Rows are unpacked to uint8 base indices, right-padded with PAD_IDX, on access.
+    """
+    files = ("packed", "mask", "lengths", "targets")
+    version = 2
+
+    def __init__(self, path: str):
+        self.path = path
+        self._open()
+
+    def _open(self):
+        for name in self.files:
+            setattr(self, name, np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r"))
+
+    def __getstate__(self):
+        # Re-open the memory maps instead of pickling their contents to spawned workers
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.path = state["path"]
+        self._open()
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def __getitem__(self, i):
+        length = self.lengths[i]
+        n_bytes = -(-length // 4)
+
+        return unpack_2bit(self.packed[i:i + 1, :n_bytes], self.mask[i:i + 1], self.lengths[i:i + 1], length)[0]
+
+    def unpack(self, rows: np.ndarray) -> np.ndarray:
+        """(B,) rows -> (B, W) uint8 base indices, right-padded with PAD_IDX"""
+        return unpack_2bit(self.packed[rows], self.mask[rows], self.lengths[rows])
+
+    @property
+    def has_n(self) -> np.ndarray:
+        """(N,) bool, whether the sequence contains N"""
+        return self.mask.any(axis=1)
+
+    def fold_ids(self, rows: Optional[np.ndarray] = None, name: str = "all", n_splits: int = 5, random_state: int = 123456789) -> np.ndarray:
+        """int8 fold id of each of `rows` (all rows by default), cached next to the encoded arrays.
+
+        Same splits as `KFold(n_splits, shuffle=True, random_state).split(rows)`: fold `i` is
+        validated on `rows[fold_ids == i]` and trained on `rows[fold_ids != i]`, both in row order.
+        `name` tells cached subsets apart, e.g. the N-less rows.
+        """
+        n = len(self) if rows is None else len(rows)
+        path = os.path.join(self.path, f"folds-{name}-{n}-{n_splits}-{random_state}.npy")
+        if not os.path.exists(path):
+            fold_ids = np.empty(n, dtype=np.int8)
+            kfold = KFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+            for i, (_, val_idx) in enumerate(kfold.split(np.empty((n, 1)))):
+                fold_ids[val_idx] = i
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, fold_ids)
+            os.replace(tmp_path, path)
+
+        return np.load(path)
+
+    @staticmethod
+    def store_path(source: str, cache_dir: Optional[str] = None) -> str:
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.dirname(os.path.abspath(source)), "encoded")
+        stem = os.path.splitext(os.path.basename(source))[0]
+
+        return os.path.join(cache_dir, f"{stem}-{file_digest(source)}-v{SequenceStore.version}")
+
+    @classmethod
+    def compile(cls, source: str, cache_dir: Optional[str] = None) -> "SequenceStore":
+        """Loads the compiled store of `source`, building it first if it does not exist yet.
+
+        `source` may also be the directory of an already compiled store.
+        """
+        if os.path.isdir(source):
+            return cls(source)
+        path = cls.store_path(source, cache_dir)
+        if os.path.isdir(path):
+            return cls(path)
+
+        df = pd.read_csv(source, sep="\t", names=["seq", "target"])
+        seqs, lengths = encode_many(df.seq.tolist())
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = tempfile.mkdtemp(dir=os.path.dirname(path))
+        packed, mask = zip(*[
+            pack_2bit(seqs[start:start + (1 << 18)], lengths[start:start + (1 << 18)]) for start in range(0, max(1, len(seqs)), 1 << 18)
+        ])
+        np.save(os.path.join(tmp_path, "packed.npy"), np.concatenate(packed))
+        np.save(os.path.join(tmp_path, "mask.npy"), np.concatenate(mask))
+        np.save(os.path.join(tmp_path, "lengths.npy"), lengths)
+        np.save(os.path.join(tmp_path, "targets.npy"), df.target.to_numpy(dtype=np.float32))
+        try:
+            os.rename(tmp_path, path)
+        except OSError:
+            # compiled concurrently by another process
+            shutil.rmtree(tmp_path)
+
+        return cls(path)
+
+
+class EncodedRecords:
+    """Subset of a SequenceStore, used by the datasets in place of `df.to_records()`.
+
+    Indexing returns `(seq, target)` where `seq` is the uint8 base index array of the sequence.
+    `targets` is aligned with the rows of the store (e.g. normalized targets).
+    """
+    def __init__(self, store: SequenceStore, rows: Optional[np.ndarray] = None, targets: Optional[np.ndarray] = None):
+        self.store = store
+        self.rows = np.arange(len(store)) if rows is None else np.asarray(rows)
+        self.targets = store.targets if targets is None else targets
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        row = self.rows[i]
+
+        return self.store[row], self.targets[row]
+
+    def target_values(self) -> np.ndarray:
+        return np.asarray(self.targets[self.rows])
+
+    def seq_lengths(self) -> np.ndarray:
+        return np.asarray(self.store.lengths[self.rows])
+
+    def gather(self, indices, max_len: int = 110, pad: int = N_IDX):
+        """Batched `pad_left`: (B,) indices -> (B, max_len) uint8 base indices and (B,) targets.
+
+        Sequences are right-aligned, i.e. left-padded with `pad` or trimmed from the left.
+        """
+        rows = self.rows[np.asarray(indices)]
+        seqs = pad_left_many(self.store.unpack(rows), self.store.lengths[rows], max_len, pad)
+
+        return seqs, np.asarray(self.targets[rows])
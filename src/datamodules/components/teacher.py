@@ -0,0 +1,154 @@
+import os
+from typing import List, Optional
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset
+
+from src.datamodules.components.encoding import C_IDX, ONE_HOT_ATCG, T_IDX, reverse_complement
+from src.datamodules.components.store import SequenceStore, file_digest, pad_left_many
+
+
+# net input views in the order the datasets return them
+STRAND_VIEWS = ["fwd", "rc"]  # OneHotDataset
+SHIFT_VIEWS = ["left", "fwd", "right", "left_rc", "rc", "right_rc"]  # ShiftDataset
+
+
+def shift_seqs(seqs: np.ndarray, lengths: np.ndarray, shift: str) -> np.ndarray:
+    """ShiftDataset shifts of right-padded (B, W) base indices, lengths are unchanged.
+
+    "left" prepends C and drops the last base, "right" drops the first base and appends T.
+    """
+    if shift == "left":
+        out = np.empty_like(seqs)
+        out[:, 1:] = seqs[:, :-1]
+        out[:, 0] = C_IDX
+        return out
+    if shift == "right":
+        out = np.empty_like(seqs)
+        out[:, :-1] = seqs[:, 1:]
+        out[np.arange(len(seqs)), lengths - 1] = T_IDX
+        return out
+
+    return seqs
+
+
+def view_inputs(seqs: np.ndarray, lengths: np.ndarray, view: str, max_len: int = 110) -> torch.Tensor:
+    """(B, max_len, 4) one-hot net inputs of a view, as built by OneHotDataset / ShiftDataset"""
+    seq_idx = pad_left_many(shift_seqs(seqs, lengths, view.split("_")[0]), lengths, max_len)
+    if view.endswith("rc"):
+        seq_idx = reverse_complement(seq_idx)
+
+    return torch.from_numpy(ONE_HOT_ATCG[seq_idx])
+
+
+class TeacherTargets:
+    """Teacher predictions aligned to the rows of a SequenceStore, one float16 array per checkpoint and view.
+
+    Arrays are `<store>/teachers/<checkpoint hash>-<view>.npy`. The store directory is keyed by the hash
+    of its source file, so an array is only reused for the same data, checkpoint and view. Missing arrays are
+    computed once with the checkpoint's net and then opened with `mmap_mode="r"`. Indexing with store rows
+    returns the (..., V) float32 mean over the checkpoints, views in the order of `views`.
+    """
+    def __init__(
+        self,
+        store: SequenceStore,
+        ckpt_paths: List[str],
+        views: List[str],
+        config_path: Optional[str] = None,
+        batch_size: int = 4096
+    ):
+        self.views = list(views)
+        self.paths = []
+        for ckpt_path in ckpt_paths:
+            digest = file_digest(ckpt_path)
+            paths = [os.path.join(store.path, "teachers", f"{digest}-{view}.npy") for view in self.views]
+            missing = [view for view, path in zip(self.views, paths) if not os.path.exists(path)]
+            if missing:
+                self.build(store, ckpt_path, missing, config_path, batch_size)
+            self.paths.append(paths)
+        self._open()
+
+    def _open(self):
+        self.arrays = [[np.load(path, mmap_mode="r") for path in paths] for paths in self.paths]
+
+    def __getstate__(self):
+        # Re-open the memory maps in the DataLoader workers
+        return {"views": self.views, "paths": self.paths}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._open()
+
+    def __getitem__(self, rows):
+        preds = np.asarray([[array[rows] for array in arrays] for arrays in self.arrays], dtype=np.float32)
+
+        return np.moveaxis(preds.mean(axis=0), 0, -1)
+
+    @staticmethod
+    def build(store: SequenceStore, ckpt_path: str, views: List[str], config_path: Optional[str] = None, batch_size: int = 4096):
+        from src.scoring_pipeline import load_net
+
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+        net = load_net(ckpt_path, config_path).to(device)
+        preds = {view: np.empty(len(store), dtype=np.float16) for view in views}
+        with torch.inference_mode():
+            for start in range(0, len(store), batch_size):
+                rows = np.arange(start, min(start + batch_size, len(store)))
+                seqs, lengths = store.unpack(rows), store.lengths[rows]
+                for view in views:
+                    x = view_inputs(seqs, lengths, view).to(device)
+                    preds[view][rows] = net(x).view(-1).float().cpu().numpy()
+
+        digest = file_digest(ckpt_path)
+        os.makedirs(os.path.join(store.path, "teachers"), exist_ok=True)
+        for view in views:
+            path = os.path.join(store.path, "teachers", f"{digest}-{view}.npy")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, preds[view])
+            os.replace(tmp_path, path)
+
+
+class TeacherDataset(Dataset):
+    """Appends the (V,) cached teacher predictions of the sample's views to the items of `dataset`: (*x, y, teacher_y)"""
+    def __init__(
+        self,
+        dataset: Dataset,
+        teacher: TeacherTargets
+    ):
+        self.dataset = dataset
+        self.teacher = teacher
+        self.records = dataset.records
+
+    def __getattr__(self, name):
+        # one_hot_matrix etc. of the wrapped dataset
+        if name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def __getitem__(self, idx):
+        teacher_y = torch.from_numpy(self.teacher[self.records.rows[idx]])
+
+        return (*self.dataset[idx], teacher_y)
+
+
+class TeacherCollate:
+    """TeacherDataset for the batch collate functions: appends the (B, V) cached teacher predictions"""
+    def __init__(
+        self,
+        collate_fn,
+        records,
+        teacher: TeacherTargets
+    ):
+        self.collate_fn = collate_fn
+        self.records = records
+        self.teacher = teacher
+
+    def __call__(self, indices):
+        teacher_y = torch.from_numpy(self.teacher[self.records.rows[np.asarray(indices)]])
+
+        return (*self.collate_fn(indices), teacher_y)
@@ -1,11 +1,15 @@
-from typing import Union, Optional, Tuple
-import pandas as pd
-from sklearn.model_selection import KFold
+from typing import List, Union, Optional, Tuple
+import numpy as np
 
+import hydra
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
 from pytorch_lightning import LightningDataModule
-from src.datamodules.components.dataset import OneHotDataset, IndexDataset, ShiftDataset, OneHotDataset_v2
+from src.datamodules.components.store import SequenceStore, EncodedRecords
+from src.datamodules.components.dataset import OneHotDataset, IndexDataset, ShiftDataset, OneHotDataset_v2, BatchIndexDataset, OneHotCollate, DynamicPadCollate
+from src.datamodules.components.sampler import BucketBatchSampler
+from src.datamodules.components.encoding import N_IDX, PAD_IDX
+from src.datamodules.components.teacher import SHIFT_VIEWS, STRAND_VIEWS, TeacherCollate, TeacherDataset, TeacherTargets
 
 
     
@@ -20,7 +24,12 @@ class MyDataModule(LightningDataModule):
         fold: Union[int, str] = "None",
         shift: bool = False,
         one_hot: bool = True,
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None,
+        batch_collate: bool = False,
+        bucket_width: Optional[int] = None,
+        teacher_ckpts: Optional[List[str]] = None,
+        teacher_config: Optional[str] = None
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -35,40 +44,63 @@ class MyDataModule(LightningDataModule):
             self.dataset = OneHotDataset
         else:
             self.dataset = IndexDataset
+        # one-hot encode whole batches in the collate function instead of per sample
+        assert not self.hparams.batch_collate or self.dataset is OneHotDataset
+        # variable-length batches are built by the batch collate function
+        assert not self.hparams.bucket_width or self.hparams.batch_collate
+        # teacher predictions are cached for the one-hot views
+        assert not self.hparams.teacher_ckpts or self.dataset is not IndexDataset
+        self.pad = N_IDX
+    
+    def _with_teacher(self, data):
+        """Serves (*x, y, teacher_y) with the teachers' cached predictions of every view, see TeacherTargets"""
+        if not self.hparams.teacher_ckpts:
+            return data
+        ckpt_paths = [hydra.utils.to_absolute_path(path) for path in self.hparams.teacher_ckpts]
+        config_path = self.hparams.teacher_config and hydra.utils.to_absolute_path(self.hparams.teacher_config)
+        views = SHIFT_VIEWS if self.dataset is ShiftDataset else STRAND_VIEWS
+        teacher = TeacherTargets(data.records.store, ckpt_paths, views, config_path)
+
+        return TeacherDataset(data, teacher)
     
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self._with_teacher(self.dataset(train_records))
+            self.val_data = self._with_teacher(self.dataset(val_records))
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self._with_teacher(self.dataset(EncodedRecords(test_store, None, test_targets)))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
     
     def train_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.train_data, shuffle=True, drop_last=True)
         return DataLoader(
             dataset=self.train_data, 
             batch_size=self.hparams.batch_size,
@@ -79,6 +111,8 @@ class MyDataModule(LightningDataModule):
         )
     
     def val_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.val_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.val_data, 
             batch_size=self.hparams.batch_size,
@@ -89,6 +123,8 @@ class MyDataModule(LightningDataModule):
         )
     
     def test_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.test_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.test_data, 
             batch_size=self.hparams.batch_size,
@@ -99,6 +135,8 @@ class MyDataModule(LightningDataModule):
         )
     
     def predict_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.predict_data, shuffle=False, drop_last=False, bucket=False)
         return DataLoader(
             dataset=self.predict_data, 
             batch_size=self.hparams.batch_size,
@@ -108,6 +146,26 @@ class MyDataModule(LightningDataModule):
             pin_memory=True
         )
 
+    def _batch_dataloader(self, data, shuffle, drop_last, bucket=True):
+        sampler = RandomSampler(data) if shuffle else SequentialSampler(data)
+        batch_sampler = BatchSampler(sampler, self.hparams.batch_size, drop_last)
+        collate_fn = OneHotCollate(data.records, data.one_hot_matrix, self.pad)
+        if self.hparams.bucket_width:
+            # pad each batch only to its longest sequence; predictions keep their order
+            if bucket:
+                batch_sampler = BucketBatchSampler(data.records.seq_lengths(), self.hparams.batch_size, self.hparams.bucket_width, shuffle, drop_last)
+            collate_fn = DynamicPadCollate(data.records, data.one_hot_matrix)
+        if isinstance(data, TeacherDataset):
+            collate_fn = TeacherCollate(collate_fn, data.records, data.teacher)
+        return DataLoader(
+            dataset=BatchIndexDataset(data.records),
+            sampler=batch_sampler,
+            batch_size=None,
+            collate_fn=collate_fn,
+            num_workers=self.hparams.num_workers,
+            pin_memory=True
+        )
+
 
 class MyDataModule_v2(LightningDataModule):
     def __init__(
@@ -118,7 +176,10 @@ class MyDataModule_v2(LightningDataModule):
         batch_size: int = 1024, 
         num_workers: int = 4,
         fold: Union[int, str] = "None",
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None,
+        batch_collate: bool = False,
+        bucket_width: Optional[int] = None
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -127,40 +188,47 @@ class MyDataModule_v2(LightningDataModule):
         self.val_data: Optional[Dataset] = None
         self.test_data: Optional[Dataset] = None
         self.dataset = OneHotDataset_v2
+        assert not self.hparams.bucket_width or self.hparams.batch_collate
+        self.pad = PAD_IDX
     
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
     
     def train_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.train_data, shuffle=True, drop_last=True)
         return DataLoader(
             dataset=self.train_data, 
             batch_size=self.hparams.batch_size,
@@ -171,6 +239,8 @@ class MyDataModule_v2(LightningDataModule):
         )
     
     def val_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.val_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.val_data, 
             batch_size=self.hparams.batch_size,
@@ -181,6 +251,8 @@ class MyDataModule_v2(LightningDataModule):
         )
     
     def test_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.test_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.test_data, 
             batch_size=self.hparams.batch_size,
@@ -191,6 +263,8 @@ class MyDataModule_v2(LightningDataModule):
         )
     
     def predict_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.predict_data, shuffle=False, drop_last=False, bucket=False)
         return DataLoader(
             dataset=self.predict_data, 
             batch_size=self.hparams.batch_size,
@@ -202,6 +276,25 @@ class MyDataModule_v2(LightningDataModule):
 
 
 
+    def _batch_dataloader(self, data, shuffle, drop_last, bucket=True):
+        sampler = RandomSampler(data) if shuffle else SequentialSampler(data)
+        batch_sampler = BatchSampler(sampler, self.hparams.batch_size, drop_last)
+        collate_fn = OneHotCollate(data.records, data.one_hot_matrix, self.pad)
+        if self.hparams.bucket_width:
+            # pad each batch only to its longest sequence; predictions keep their order
+            if bucket:
+                batch_sampler = BucketBatchSampler(data.records.seq_lengths(), self.hparams.batch_size, self.hparams.bucket_width, shuffle, drop_last)
+            collate_fn = DynamicPadCollate(data.records, data.one_hot_matrix)
+        return DataLoader(
+            dataset=BatchIndexDataset(data.records),
+            sampler=batch_sampler,
+            batch_size=None,
+            collate_fn=collate_fn,
+            num_workers=self.hparams.num_workers,
+            pin_memory=True
+        )
+
+
 class NlessDataModule(MyDataModule):
     def __init__(
         self, 
@@ -213,42 +306,46 @@ class NlessDataModule(MyDataModule):
         fold: Union[int, str] = "None",
         shift: bool = False,
         one_hot: bool = True,
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None,
+        batch_collate: bool = False,
+        bucket_width: Optional[int] = None
     ):
-        super().__init__(train_dir, test_dir, batch_size, num_workers, fold, shift, one_hot, normalize)
+        super().__init__(train_dir, test_dir, predict_dir, batch_size, num_workers, fold, shift, one_hot, normalize, cache_dir, batch_collate, bucket_width)
         
     
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                df = df[df.seq.map(lambda x: "N" not in x)]  # No N in sequence
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.flatnonzero(~store.has_n)  # No N in sequence
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids(rows, "nless")
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                train_df = train_df[train_df.seq.map(lambda x: "N" not in x)]  # No N in sequence
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
+                train_rows = np.flatnonzero(~train_store.has_n)  # No N in sequence
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, train_rows, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
-    
\ No newline at end of file
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
@@ -1,10 +1,10 @@
 from typing import Union, Optional, Tuple
-import pandas as pd
-from sklearn.model_selection import KFold
+import numpy as np
 
 import torch
 from torch.utils.data import Dataset, DataLoader
 from pytorch_lightning import LightningDataModule
+from src.datamodules.components.store import SequenceStore, EncodedRecords
 from src.datamodules.components.dataset_kmer import KmerDataset
 
 
@@ -19,7 +19,8 @@ class MyDataModule(LightningDataModule):
         num_workers: int = 4,
         fold: Union[int, str] = "None",
         normalize: bool = True,
-        k: int = 2
+        k: int = 2,
+        cache_dir: Optional[str] = None
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -33,34 +34,37 @@ class MyDataModule(LightningDataModule):
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df, self.hparams.k)
-            self.val_data = self.dataset(val_df, self.hparams.k)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records, self.hparams.k)
+            self.val_data = self.dataset(val_records, self.hparams.k)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df, self.hparams.k)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets), self.hparams.k)
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df, self.hparams.k)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store), self.hparams.k)
     
     def train_dataloader(self):
         return DataLoader(
@@ -1,10 +1,10 @@
 from typing import Union, Optional, Tuple
-import pandas as pd
-from sklearn.model_selection import KFold
+import numpy as np
 
 import torch
 from torch.utils.data import Dataset, DataLoader
 from pytorch_lightning import LightningDataModule
+from src.datamodules.components.store import SequenceStore, EncodedRecords
 from src.datamodules.components.dataset_lrpadvec import OneHotDataset, ShiftDataset
 
 
@@ -20,7 +20,8 @@ class MyDataModule(LightningDataModule):
         fold: Union[int, str] = "None",
         shift: bool = False,
         one_hot: bool = True,
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -37,34 +38,37 @@ class MyDataModule(LightningDataModule):
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
     
     def train_dataloader(self):
         return DataLoader(
@@ -116,7 +120,8 @@ class MyDataModule_v2(LightningDataModule):
         batch_size: int = 1024, 
         num_workers: int = 4,
         fold: Union[int, str] = "None",
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -129,34 +134,37 @@ class MyDataModule_v2(LightningDataModule):
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
     
     def train_dataloader(self):
         return DataLoader(
@@ -211,42 +219,44 @@ class NlessDataModule(MyDataModule):
         fold: Union[int, str] = "None",
         shift: bool = False,
         one_hot: bool = True,
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None
     ):
-        super().__init__(train_dir, test_dir, batch_size, num_workers, fold, shift, one_hot, normalize)
+        super().__init__(train_dir, test_dir, predict_dir, batch_size, num_workers, fold, shift, one_hot, normalize, cache_dir)
         
     
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                df = df[df.seq.map(lambda x: "N" not in x)]  # No N in sequence
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.flatnonzero(~store.has_n)  # No N in sequence
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids(rows, "nless")
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                train_df = train_df[train_df.seq.map(lambda x: "N" not in x)]  # No N in sequence
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
+                train_rows = np.flatnonzero(~train_store.has_n)  # No N in sequence
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, train_rows, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
-    
\ No newline at end of file
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
@@ -1,11 +1,12 @@
 from typing import Union, Optional, Tuple
-import pandas as pd
-from sklearn.model_selection import KFold
+import numpy as np
 
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import Dataset, DataLoader, BatchSampler, RandomSampler, SequentialSampler
 from pytorch_lightning import LightningDataModule
-from src.datamodules.components.dataset_lrpadvec_dh import BaseDataset, ShiftDataset
+from src.datamodules.components.store import SequenceStore, EncodedRecords
+from src.datamodules.components.dataset import BatchIndexDataset
+from src.datamodules.components.dataset_lrpadvec_dh import BaseDataset, ShiftDataset, ShiftCollate
 
 
     
@@ -20,7 +21,9 @@ class MyDataModule(LightningDataModule):
         fold: Union[int, str] = "None",
         shift: bool = False,
         one_hot: bool = True,
-        normalize: bool = True
+        normalize: bool = True,
+        cache_dir: Optional[str] = None,
+        batch_collate: bool = False
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -37,36 +40,41 @@ class MyDataModule(LightningDataModule):
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
                 if self.hparams.normalize:
-                    df["target"] = (df.target - 11) / 2
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                    targets = (targets - 11) / 2
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
                 if self.hparams.normalize:
-                    train_df["target"] = (train_df.target - 11) / 2
-                    val_df["target"] = (val_df.target - 11) / 2
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                    train_targets = (train_targets - 11) / 2
+                    val_targets = (val_targets - 11) / 2
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
             if self.hparams.normalize:
-                test_df["target"] = (test_df.target - 11) / 2
+                test_targets = (test_targets - 11) / 2
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
     
     def train_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.train_data, shuffle=True, drop_last=True)
         return DataLoader(
             dataset=self.train_data, 
             batch_size=self.hparams.batch_size,
@@ -77,6 +85,8 @@ class MyDataModule(LightningDataModule):
         )
     
     def val_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.val_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.val_data, 
             batch_size=self.hparams.batch_size,
@@ -87,6 +97,8 @@ class MyDataModule(LightningDataModule):
         )
     
     def test_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.test_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.test_data, 
             batch_size=self.hparams.batch_size,
@@ -97,6 +109,8 @@ class MyDataModule(LightningDataModule):
         )
     
     def predict_dataloader(self):
+        if self.hparams.batch_collate:
+            return self._batch_dataloader(self.predict_data, shuffle=False, drop_last=False)
         return DataLoader(
             dataset=self.predict_data, 
             batch_size=self.hparams.batch_size,
@@ -106,3 +120,14 @@ class MyDataModule(LightningDataModule):
             pin_memory=True
         )
 
+    def _batch_dataloader(self, data, shuffle, drop_last):
+        # shifted/RC views of the whole batch are built in the collate function
+        sampler = RandomSampler(data) if shuffle else SequentialSampler(data)
+        return DataLoader(
+            dataset=BatchIndexDataset(data.records),
+            sampler=BatchSampler(sampler, self.hparams.batch_size, drop_last),
+            batch_size=None,
+            collate_fn=ShiftCollate(data.records, getattr(data, "tta", 1), data.max_length),
+            num_workers=self.hparams.num_workers,
+            pin_memory=True
+        )
@@ -1,11 +1,11 @@
 from typing import Union, Optional, Tuple
-import pandas as pd
+import numpy as np
 from scipy import stats
-from sklearn.model_selection import KFold
 
 import torch
 from torch.utils.data import Dataset, DataLoader
 from pytorch_lightning import LightningDataModule
+from src.datamodules.components.store import SequenceStore, EncodedRecords
 from src.datamodules.components.dataset import OneHotDataset, IndexDataset, ShiftDataset, OneHotDataset_v2
 
 
@@ -20,7 +20,8 @@ class UniformDataModule(LightningDataModule):
         num_workers: int = 4,
         fold: Union[int, str] = "None",
         shift: bool = False,
-        one_hot: bool = True
+        one_hot: bool = True,
+        cache_dir: Optional[str] = None
     ):
         super().__init__()
         self.save_hyperparameters(logger=False)
@@ -39,31 +40,34 @@ class UniformDataModule(LightningDataModule):
     def setup(self, stage=None):
         if stage == "fit" or stage == None:
             if self.hparams.fold != "None":
-                df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                df["target"] = stats.norm.cdf(df.target, loc=11.0, scale=2.0) * 3 - 1.5
-                kfold = KFold(n_splits=5, shuffle=True, random_state=123456789)
-                for i, (train_idx, val_idx) in enumerate(kfold.split(df)):
-                    if i == self.hparams.fold:
-                        break
-                train_df = df.iloc[train_idx]
-                val_df = df.iloc[val_idx]
+                store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                targets = store.targets
+                rows = np.arange(len(store))
+                targets = stats.norm.cdf(targets, loc=11.0, scale=2.0) * 3 - 1.5
+                fold_ids = store.fold_ids()
+                train_records = EncodedRecords(store, rows[fold_ids != self.hparams.fold], targets)
+                val_records = EncodedRecords(store, rows[fold_ids == self.hparams.fold], targets)
             else:
-                train_df = pd.read_csv(self.hparams.train_dir, sep="\t", names=["seq", "target"])
-                val_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
-                train_df["target"] = stats.norm.cdf(train_df.target, loc=11.0, scale=2.0) * 3 - 1.5
-                val_df["target"] = stats.norm.cdf(val_df.target, loc=11.0, scale=2.0) * 3 - 1.5
-            self.train_data = self.dataset(train_df)
-            self.val_data = self.dataset(val_df)
+                train_store = SequenceStore.compile(self.hparams.train_dir, self.hparams.cache_dir)
+                val_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+                train_targets, val_targets = train_store.targets, val_store.targets
+                train_targets = stats.norm.cdf(train_targets, loc=11.0, scale=2.0) * 3 - 1.5
+                val_targets = stats.norm.cdf(val_targets, loc=11.0, scale=2.0) * 3 - 1.5
+                train_records = EncodedRecords(train_store, None, train_targets)
+                val_records = EncodedRecords(val_store, None, val_targets)
+            self.train_data = self.dataset(train_records)
+            self.val_data = self.dataset(val_records)
         
         if stage == "test" or stage == None:
-            test_df = pd.read_csv(self.hparams.test_dir, sep="\t", names=["seq", "target"])
-            test_df["target"] = stats.norm.cdf(test_df.target, loc=11.0, scale=2.0) * 3 - 1.5
+            test_store = SequenceStore.compile(self.hparams.test_dir, self.hparams.cache_dir)
+            test_targets = test_store.targets
+            test_targets = stats.norm.cdf(test_targets, loc=11.0, scale=2.0) * 3 - 1.5
                 
-            self.test_data = self.dataset(test_df)
+            self.test_data = self.dataset(EncodedRecords(test_store, None, test_targets))
             
         if stage == "predict" or stage == None:
-            predict_df = pd.read_csv(self.hparams.predict_dir, sep="\t", names=["seq", "target"])
-            self.predict_data = self.dataset(predict_df)
+            predict_store = SequenceStore.compile(self.hparams.predict_dir, self.hparams.cache_dir)
+            self.predict_data = self.dataset(EncodedRecords(predict_store))
     
     def train_dataloader(self):
         return DataLoader(
@@ -0,0 +1,106 @@
+import json
+import sys
+import time
+
+import torch
+import torch.nn as nn
+
+from src.datamodules.components.encoding import (
+    C_IDX, COMPLEMENT, ONE_HOT_ACGT, ONE_HOT_ATCG, PAD_IDX, T_IDX
+)
+from src.runtime import encode_inputs, metadata_path
+from src.scoring_pipeline import load_net
+
+
+FORMATS = ["torchscript", "onnx"]
+TABLES = {"onehot": ONE_HOT_ATCG, "dh": ONE_HOT_ACGT}
+
+
+class InferenceGraph(nn.Module):
+    """Net plus its input encoding and view averaging: (B, W) uint8 base indices -> (B,) mean prediction.
+
+    Views are the forward strand, its reverse complement (`rc`) and, for the onehot layout, the ShiftDataset
+    shifts (`shifts`: C prepended / T appended); they are built in index space and scored in one net call.
+    """
+    def __init__(
+        self,
+        net: nn.Module,
+        layout: str = "onehot",
+        rc: bool = True,
+        shifts: bool = False
+    ):
+        super().__init__()
+        if shifts and layout != "onehot":
+            raise ValueError("shift views need the onehot layout")
+        self.net = net
+        self.layout = layout
+        self.rc = rc
+        self.shifts = shifts
+        self.register_buffer("table", torch.from_numpy(TABLES[layout]))
+        self.register_buffer("complement", torch.from_numpy(COMPLEMENT).long())
+
+    def shift_views(self, idx):
+        # idx is left-padded with X and one column wider than the net input, so that the left shift of a
+        # sequence longer than the input keeps the base before the window (as ShiftDataset, which shifts
+        # before padding/trimming). The sequence starts at the first non-pad column.
+        prev, idx = idx[:, :-1], idx[:, 1:]
+        pad = idx == PAD_IDX
+        left = torch.where(~pad & (prev == PAD_IDX), torch.full_like(idx, C_IDX), prev)
+        right = torch.where(pad, idx, torch.cat([idx[:, 1:], torch.full_like(idx[:, :1], T_IDX)], dim=1))
+
+        return [left, idx, right]
+
+    def forward(self, idx):
+        idx = idx.long()
+        views = self.shift_views(idx) if self.shifts else [idx]
+        if self.rc:
+            views = views + [self.complement[view.flip(1)] for view in views]
+        x = self.table[torch.cat(views)]
+        if self.layout == "dh":
+            x = x.transpose(1, 2)
+
+        return self.net(x).view(len(views), -1).mean(dim=0)
+
+
+def export(
+    net: nn.Module,
+    path: str,
+    layout: str = "onehot",
+    rc: bool = True,
+    shifts: bool = False,
+    fmt: str = "torchscript",
+    max_len: int = 110
+) -> InferenceGraph:
+    """Traces `net` with its views into a frozen TorchScript module (`_extra_files` metadata) or an ONNX file
+    (metadata in `<path>.json`) with a dynamic batch axis.
+    """
+    graph = InferenceGraph(net, layout, rc, shifts).eval()
+    # input width W: max_len, one more column for the shift views
+    width = max_len + shifts
+    meta = json.dumps({"layout": layout, "width": width, "rc": rc, "shifts": shifts})
+    example = torch.from_numpy(encode_inputs(["ACGTN" * (width // 5 + 1), "ACGT"], layout, width))
+    with torch.no_grad():
+        if fmt == "torchscript":
+            # einops.rearrange and the view building are traced into plain permute/gather ops
+            module = torch.jit.freeze(torch.jit.trace(graph, example))
+            module = torch.jit.optimize_for_inference(module)
+            torch.jit.save(module, path, _extra_files={"meta.json": meta})
+        elif fmt == "onnx":
+            torch.onnx.export(
+                graph, (example,), path, input_names=["seqs"], output_names=["preds"],
+                dynamic_axes={"seqs": {0: "batch"}, "preds": {0: "batch"}}, opset_version=17, dynamo=False
+            )
+            with open(metadata_path(path), "w") as f:
+                f.write(meta)
+        else:
+            raise ValueError(f"Unknown format {fmt}")
+
+    return graph
+
+
+def main(args) -> None:
+    torch.set_num_threads(args.threads)
+    net = load_net(args.ckpt, args.config)
+    start = time.perf_counter()
+    export(net, args.output, args.layout, not args.no_rc, args.shifts, args.format, args.max_len)
+    print(f"Exported {args.format} graph to {args.output} in {time.perf_counter() - start:.1f}s", file=sys.stderr)
@@ -0,0 +1,274 @@
+import multiprocessing as mp
+import sys
+import time
+from collections import deque
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from einops import rearrange
+
+from src.datamodules.components.store import encode_many
+from src.scoring_pipeline import LAYOUTS, REVERSE_COMPLEMENTS, load_net, onehot_rc, predict_views, read_chunks, write_npy
+
+
+def sequence_positions(lengths, width: int, layout: str = "onehot"):
+    """(N, L) mask of the positions holding the sequences, not the N padding (onehot, on the left) or the vector
+    scaffold (dh, on the right) of the net input
+    """
+    cols = torch.arange(width)
+    lengths = torch.as_tensor(lengths)[:, None]
+
+    return cols >= width - lengths if layout == "onehot" else cols < lengths
+
+
+def mutation_sites(x, positions=None):
+    """(N, L, 4) one-hot -> (seq, pos, base) index tensors of every single-base substitution.
+
+    A base is a substitution if it is not already set at that position, so three per A/C/G/T and four per N.
+    With the (N, L) `positions` mask, only those positions are mutated.
+    """
+    sites = x != 1
+    if positions is not None:
+        sites &= positions[..., None]
+
+    return sites.nonzero(as_tuple=True)
+
+
+class IncrementalDeepFamQ:
+    """Evaluates single-base mutants of deepfamq_crc.DeepFamQ_CRC-style nets from cached reference activations.
+
+    A substitution at position p only changes the first ConvBlock outputs within `kernel_size // 2` of p, i.e.
+    a few pooled columns [c_lo, c_hi]. Those columns are recomputed from the mutant; the rest are the reference
+    activations. The forward LSTM direction then restarts from the reference state before c_lo and the backward
+    direction from the reference state after c_hi. A change propagates through every later step of a direction, so
+    the forward direction is rerun over [c_lo, end) and the backward one over [0, c_hi]: L + c_hi - c_lo + 1 of the
+    2 L steps of a full pass. The second ConvBlock stage and the FC head are run in full, so the gain over full
+    recomputation is bounded by the first ConvBlock stage and about half of the LSTM.
+    Works in eval mode (dropout off) on (N, L, 4) inputs.
+    """
+    def __init__(self, net: nn.Module):
+        self.net = net
+        self.convs = [block.main[0] for block in net.conv_blocks1]
+        self.pool_size = net.conv_blocks1[0].main[2].kernel_size
+        self.half = max(conv.kernel_size[0] // 2 for conv in self.convs)
+        assert all(conv.kernel_size[0] % 2 == 1 for conv in self.convs), "'same' padding is symmetric only for odd kernels"
+        assert net.lstm.bidirectional and net.lstm.num_layers == 1 and not net.lstm.batch_first
+        self.fwd = self.direction(net.lstm, "")
+        self.bwd = self.direction(net.lstm, "_reverse")
+
+    @staticmethod
+    def direction(lstm: nn.LSTM, suffix: str) -> nn.LSTM:
+        # one direction of the bidirectional LSTM, so that it can be started from a given state
+        uni = nn.LSTM(lstm.input_size, lstm.hidden_size)
+        uni.load_state_dict({f"{name}_l0": getattr(lstm, f"{name}_l0{suffix}") for name in ["weight_ih", "weight_hh", "bias_ih", "bias_hh"]})
+
+        return uni.eval()
+
+    @staticmethod
+    def states(lstm: nn.LSTM, x):
+        # (L, N, C) -> (L, N, H) hidden and cell states after every step. The hidden states are the output of one
+        # LSTM call; the input, forget and cell gates only depend on the input and the previous hidden state, so
+        # they are one matmul for all steps and only the elementwise cell update c = f * c + i * g runs step by step
+        h, _ = lstm(x)
+        h_prev = torch.cat([h.new_zeros(1, *h.shape[1:]), h[:-1]])
+        rows = 3 * lstm.hidden_size
+        weight = torch.cat([lstm.weight_ih_l0[:rows], lstm.weight_hh_l0[:rows]], dim=1)
+        gates = torch.cat([x, h_prev], dim=2) @ weight.T + (lstm.bias_ih_l0 + lstm.bias_hh_l0)[:rows]
+        i, f, g = gates.chunk(3, dim=2)
+        f, update = torch.sigmoid(f), torch.sigmoid(i) * torch.tanh(g)
+        c = torch.empty_like(h)
+        for t in range(len(x)):
+            c[t] = f[t] * c[t - 1] + update[t] if t > 0 else update[t]
+
+        return h, c
+
+    def head(self, x):
+        # rest of DeepFamQ_CRC.forward after the LSTM
+        x = rearrange(x, "L N C -> N C L")
+        x = torch.cat([conv(x) for conv in self.net.conv_blocks2], dim=1)
+
+        return self.net.fc(x).view(-1)
+
+    @torch.inference_mode()
+    def reference(self, x) -> dict:
+        """Cached activations of the reference inputs (N, L, 4)"""
+        x = rearrange(x, "N L C -> N C L")
+        pooled = rearrange(torch.cat([block(x) for block in self.net.conv_blocks1], dim=1), "N C L -> L N C")
+        fwd_h, fwd_c = self.states(self.fwd, pooled)
+        bwd_h, bwd_c = self.states(self.bwd, pooled.flip(0))
+        ref = {"pooled": pooled, "fwd_h": fwd_h, "fwd_c": fwd_c, "bwd_h": bwd_h.flip(0), "bwd_c": bwd_c.flip(0)}
+        ref["pred"] = self.head(torch.cat([ref["fwd_h"], ref["bwd_h"]], dim=2))
+
+        return ref
+
+    @torch.inference_mode()
+    def predict(self, ref: dict, mutants, seq_idx, p_min: int, p_max: int):
+        """(B,) predictions of `mutants` (B, L, 4), which differ from their references `seq_idx` only within [p_min, p_max]"""
+        pooled_len = len(ref["pooled"])
+        c_lo = max(0, (p_min - self.half) // self.pool_size)
+        c_hi = min(pooled_len - 1, (p_max + self.half) // self.pool_size)
+        if c_lo > c_hi:
+            # only positions cut off by the last pooling window changed
+            return ref["pred"][seq_idx]
+
+        # first ConvBlock stage on the affected pooled columns only
+        x = F.pad(rearrange(mutants, "N L C -> N C L"), (self.half, self.half))
+        start, stop = c_lo * self.pool_size + self.half, (c_hi + 1) * self.pool_size + self.half
+        window = torch.cat([
+            F.max_pool1d(F.relu(F.conv1d(x[..., start - k // 2: stop + k // 2], conv.weight, conv.bias)), self.pool_size)
+            for conv, k in zip(self.convs, (conv.kernel_size[0] for conv in self.convs))
+        ], dim=1)
+        pooled = ref["pooled"][:, seq_idx].clone()
+        pooled[c_lo:c_hi + 1] = rearrange(window, "N C L -> L N C")
+
+        zeros = pooled.new_zeros(1, len(seq_idx), self.fwd.hidden_size)
+        state = (ref["fwd_h"][c_lo - 1, seq_idx][None], ref["fwd_c"][c_lo - 1, seq_idx][None]) if c_lo > 0 else (zeros, zeros)
+        fwd, _ = self.fwd(pooled[c_lo:], state)
+        fwd = torch.cat([ref["fwd_h"][:c_lo, seq_idx], fwd])
+
+        state = (ref["bwd_h"][c_hi + 1, seq_idx][None], ref["bwd_c"][c_hi + 1, seq_idx][None]) if c_hi < pooled_len - 1 else (zeros, zeros)
+        bwd, _ = self.bwd(pooled[:c_hi + 1].flip(0), state)
+        bwd = torch.cat([bwd.flip(0), ref["bwd_h"][c_hi + 1:, seq_idx]])
+
+        return self.head(torch.cat([fwd, bwd], dim=2))
+
+
+def ism(
+    net: nn.Module,
+    x: torch.Tensor,
+    layout: str = "onehot",
+    rc: bool = True,
+    batch_size: int = 4096,
+    incremental: bool = False,
+    lengths=None
+) -> np.ndarray:
+    """In silico saturation mutagenesis of a batch of reference net inputs.
+
+    `x` is the one-hot net input of the layout, (N, L, 4) for "onehot" and (N, 4, L) for "dh". Mutants are
+    made on the one-hot tensor and run through the net `batch_size` at a time, averaged with their reverse
+    complement if `rc`. Returns (N, L, 4) float32 `pred(mutant) - pred(reference)` in the channel order of
+    the layout, 0 at the reference base. With the sequence `lengths`, the padding or scaffold positions of the
+    input are not mutated and stay 0.
+
+    With `incremental` (DeepFamQ_CRC-style nets, "onehot" layout), mutants are evaluated with
+    IncrementalDeepFamQ from the cached reference activations, one pooling window of positions at a time.
+    """
+    channels_last = layout == "onehot"
+    rc_fn = REVERSE_COMPLEMENTS[layout] if rc else None
+    x = x if channels_last else x.transpose(1, 2)
+
+    def predict(x):
+        x = x if channels_last else x.transpose(1, 2)
+        return predict_views(net, x, rc_fn(x) if rc else None)
+
+    effects = torch.zeros(x.shape)
+    eye = torch.eye(x.size(2), dtype=x.dtype)
+    positions = sequence_positions(lengths, x.size(1), layout) if lengths is not None else None
+    seq_idx, pos, base = mutation_sites(x, positions)
+    if incremental:
+        assert layout == "onehot"
+        engine = IncrementalDeepFamQ(net)
+        refs = [engine.reference(x)] + ([engine.reference(onehot_rc(x))] if rc else [])
+        ref = sum(r["pred"] for r in refs) / len(refs)
+        # batches of mutants within one pooling window, so that they share the recomputed columns
+        order = torch.argsort(pos, stable=True)
+        seq_idx, pos, base = seq_idx[order], pos[order], base[order]
+        bounds = torch.cat([torch.tensor([0]), (torch.diff(pos // engine.pool_size) != 0).nonzero()[:, 0] + 1, torch.tensor([len(pos)])]).tolist()
+        batches = [(i, min(i + batch_size, stop)) for start, stop in zip(bounds[:-1], bounds[1:]) for i in range(start, stop, batch_size)]
+    else:
+        ref = predict(x)
+        batches = [(i, min(i + batch_size, len(seq_idx))) for i in range(0, len(seq_idx), batch_size)]
+
+    for start, stop in batches:
+        s, p, b = seq_idx[start:stop], pos[start:stop], base[start:stop]
+        mutants = x[s]
+        mutants[torch.arange(len(s)), p] = eye[b]
+        if incremental:
+            p_min, p_max = p.min().item(), p.max().item()
+            preds = engine.predict(refs[0], mutants, s, p_min, p_max)
+            if rc:
+                length = x.size(1)
+                preds = (preds + engine.predict(refs[1], onehot_rc(mutants), s, length - 1 - p_max, length - 1 - p_min)) / 2
+        else:
+            preds = predict(mutants)
+        effects[s, p, b] = preds - ref[s]
+
+    return effects.numpy()
+
+
+def ism_sequences(net: nn.Module, seqs, layout: str = "onehot", rc: bool = True, batch_size: int = 4096, incremental: bool = False) -> np.ndarray:
+    """`ism` of a list of sequence strings, encoded like `score`"""
+    seqs, lengths = encode_many(seqs)
+    x, _ = LAYOUTS[layout](seqs, lengths)
+
+    return ism(net, x, layout, rc, batch_size, incremental, lengths)
+
+
+_worker = {}
+
+
+def _init_worker(net, layout, rc, batch_size, threads, incremental):
+    torch.set_num_threads(threads)
+    _worker.update(net=net, layout=layout, rc=rc, batch_size=batch_size, incremental=incremental)
+
+
+def _ism_worker(seqs):
+    return ism_sequences(_worker["net"], seqs, _worker["layout"], _worker["rc"], _worker["batch_size"], _worker["incremental"])
+
+
+def imap_bounded(pool, func, iterable, ahead: int):
+    """`pool.imap` that reads `iterable` only `ahead` tasks before the results (imap queues all of it at once)"""
+    pending = deque()
+    for item in iterable:
+        pending.append(pool.apply_async(func, (item,)))
+        if len(pending) >= ahead:
+            yield pending.popleft().get()
+    while pending:
+        yield pending.popleft().get()
+
+
+def run(net: nn.Module, input_file, output_path: str, layout: str = "onehot", rc: bool = True,
+        batch_size: int = 4096, chunk_size: int = 64, workers: int = 1, threads: int = 4, incremental: bool = False) -> int:
+    """Writes the (N, L, 4) effects of every sequence of `input_file` to the .npy file `output_path`.
+
+    Sequences are processed `chunk_size` at a time. With `workers` > 1, chunks are spread over that many
+    processes with `threads` torch threads each, which scales better on many-core CPUs than intra-op threads.
+    The input is read as the chunks are processed (two per worker ahead) and the effects written as they come.
+    """
+    chunks = (chunk for chunk in read_chunks(input_file, chunk_size) if chunk)
+    # every layout pads to a fixed net input length
+    length = LAYOUTS[layout](*encode_many(["A"]))[0].numel() // 4
+
+    if workers > 1:
+        pool = mp.get_context("spawn").Pool(workers, _init_worker, (net, layout, rc, batch_size, threads, incremental))
+        results = imap_bounded(pool, _ism_worker, chunks, 2 * workers)
+    else:
+        torch.set_num_threads(threads)
+        pool = None
+        results = (ism_sequences(net, chunk, layout, rc, batch_size, incremental) for chunk in chunks)
+
+    try:
+        n = write_npy(output_path, results, (length, 4), np.float32)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    return n
+
+
+def main(args) -> None:
+    net = load_net(args.ckpt, args.config)
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    start = time.perf_counter()
+    try:
+        n = run(net, input_file, args.output, args.layout, not args.no_rc, args.batch_size, args.chunk_size, args.workers, args.threads,
+                args.incremental)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+    elapsed = time.perf_counter() - start
+
+    print(f"Mutagenesis of {n} sequences in {elapsed:.1f}s ({n / elapsed:.2f} seqs/sec) -> {args.output}", file=sys.stderr)
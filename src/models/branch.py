@@ -1,14 +1,12 @@
 from typing import Any, List
-import json
-from collections import OrderedDict
-import numpy as np
-import pandas as pd
 
 import torch
 import torch.nn as nn
 from pytorch_lightning import LightningModule
-from torchmetrics import MaxMetric, PearsonCorrCoef, SpearmanCorrCoef
+from torchmetrics import MaxMetric
 from cosine_annealing_warmup import CosineAnnealingWarmupRestarts
+from src.utils.predictions import open_writer
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
 
 
 class MainNet(LightningModule):
@@ -28,11 +26,11 @@ class MainNet(LightningModule):
         
         self.criterion = nn.HuberLoss()
         
-        self.val_pearson = PearsonCorrCoef()
-        self.test_pearson = PearsonCorrCoef()
+        self.val_pearson = StreamingPearsonCorrCoef()
+        self.test_pearson = StreamingPearsonCorrCoef()
         
-        self.val_spearman = SpearmanCorrCoef()
-        self.test_spearman = SpearmanCorrCoef()
+        self.val_spearman = StreamingSpearmanCorrCoef()
+        self.test_spearman = StreamingSpearmanCorrCoef()
         
         # for logging best so far validation accuracy
         self.val_spearman_best = MaxMetric()
@@ -133,15 +131,14 @@ class MainNet(LightningModule):
         
         return preds
     
+    def on_predict_start(self):
+        self.submission = open_writer('../../../../../submission.json')
+        
+    def on_predict_batch_end(self, outputs, batch, batch_idx, dataloader_idx):
+        self.submission.write(outputs.float().cpu().numpy())
+    
     def on_predict_epoch_end(self, outputs):
-        data_path = '/data/project/ddp/data/dream/test_sequences.txt'
-        df = pd.read_csv(data_path, sep='\t', names=['sequence', 'measured_expression'])
-        pred = np.array(torch.cat(outputs[0]))
-        df['measured_expression'] = pred
-        
-        prediction_dict = {str(i): float(df.measured_expression.values[i]) for i in range(len(pred))}
-        with open('../../../../../submission.json', 'w') as f:
-            json.dump(prediction_dict, f)
+        self.submission.close()
 
         print("Saved submission file!")
         
@@ -0,0 +1,177 @@
+from typing import List
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from einops import rearrange
+
+
+# Reverse-complement parameter sharing: every feature map (N, C, L) is laid out so that its RC
+# (flip along L + channel permutation `perm`) is what the same layer outputs for the RC input.
+# Input one-hot: `perm` is the complement of the alphabet. Hidden features: the first half of
+# the channels are forward-strand units, the second half their RC twins, so `perm` swaps halves.
+
+def rc_features(x, perm):
+    # x: (N, C, L)
+
+    return x.index_select(1, perm).flip(-1)
+
+
+def half_swap(channels):
+    return torch.cat([torch.arange(channels // 2, channels), torch.arange(channels // 2)])
+
+
+class RCConvBlock(nn.Module):
+    """ConvBlocks of all kernel sizes, each filter paired with its reverse-complement twin"""
+    def __init__(
+        self,
+        in_perm: torch.Tensor,
+        out_dim: int = 320,
+        kernel_size: List = [9, 15],
+        pool_size: int = 3,
+        dropout: float = 0.2,
+    ):
+        super().__init__()
+        assert all(k % 2 == 1 for k in kernel_size), "'same' padding is symmetric only for odd kernels"
+        conv_each_dim = int(out_dim / (2 * len(kernel_size)))
+        self.convs = nn.ModuleList([nn.Conv1d(len(in_perm), conv_each_dim, k, padding="same") for k in kernel_size])
+        self.register_buffer("in_perm", in_perm, persistent=False)
+        self.pool_size = pool_size
+        self.dropout = nn.Dropout(dropout)
+
+    def forward(self, x):
+        # x: (N, C, L)
+        fwd_outs, rev_outs = [], []
+        for conv in self.convs:
+            weight = torch.cat([conv.weight, conv.weight.index_select(1, self.in_perm).flip(-1)])
+            bias = torch.cat([conv.bias, conv.bias])
+            fwd_out, rev_out = F.conv1d(x, weight, bias, padding="same").chunk(2, dim=1)
+            fwd_outs.append(fwd_out)
+            rev_outs.append(rev_out)
+        x = F.relu(torch.cat(fwd_outs + rev_outs, dim=1))
+
+        if self.pool_size > 1:
+            # crop symmetrically so that pooling windows of both strands line up
+            crop = x.size(-1) % self.pool_size
+            assert crop % 2 == 0
+            x = F.max_pool1d(x[..., crop // 2: x.size(-1) - crop // 2], self.pool_size)
+
+        return self.dropout(x)
+
+
+class RCBiLSTM(nn.Module):
+    """BiLSTM whose backward direction is the forward LSTM run on the RC features"""
+    def __init__(
+        self,
+        input_dim: int = 320,
+        hidden_dim: int = 320
+    ):
+        super().__init__()
+        self.lstm = nn.LSTM(input_size=input_dim, hidden_size=hidden_dim, batch_first=True)
+        self.register_buffer("perm", half_swap(input_dim), persistent=False)
+
+    def forward(self, x):
+        # x: (N, C, L) -> (N, 2H, L)
+        bsz = x.size(0)
+        x = torch.cat([x, rc_features(x, self.perm)])
+        x, (h, c) = self.lstm(rearrange(x, "N C L -> N L C"))
+        x = torch.cat([x[:bsz], x[bsz:].flip(1)], dim=2)
+
+        return rearrange(x, "N L C -> N C L")
+
+
+class RCInvariantLinear(nn.Linear):
+    """Linear layer on flattened (C, L) RC features, symmetrized over both strands"""
+    def __init__(
+        self,
+        channels: int,
+        length: int,
+        out_features: int
+    ):
+        super().__init__(channels * length, out_features)
+        self.channels = channels
+        self.length = length
+        self.register_buffer("perm", half_swap(channels), persistent=False)
+
+    def forward(self, x):
+        weight = self.weight.view(-1, self.channels, self.length)
+        weight = (weight + rc_features(weight, self.perm)) / 2
+
+        return F.linear(x, weight.flatten(1), self.bias)
+
+
+class DeepFamQ_CRC_RC(nn.Module):
+    """RC-equivariant DeepFamQ_CRC
+
+    Both strands are computed in one pass and the prediction is exactly RC-invariant,
+    i.e. equal to the average over the forward and reverse-complement inputs.
+    Input: (N, L, 4) one-hot in A, T, C, G order.
+    """
+    def __init__(
+        self,
+        conv_out_dim: int = 320,
+        conv_kernel_size: List = [9, 15],
+        pool_size: int = 3,
+        lstm_hidden_dim: int = 320,
+        fc_hidden_dim: int = 64,
+        dropout1: float = 0.2,
+        dropout2: float = 0.5,
+        complement: List = [1, 0, 3, 2],
+        seq_len: int = 110
+    ):
+        super().__init__()
+        pool_out_len = seq_len // pool_size
+        pool_out_len = pool_out_len // pool_size
+
+        self.conv_blocks1 = RCConvBlock(torch.LongTensor(complement), conv_out_dim, conv_kernel_size, pool_size, dropout1)
+
+        self.lstm = RCBiLSTM(conv_out_dim, lstm_hidden_dim)
+
+        self.conv_blocks2 = RCConvBlock(half_swap(lstm_hidden_dim * 2), lstm_hidden_dim, conv_kernel_size, pool_size, dropout1)
+
+        self.fc = nn.Sequential(
+            nn.Flatten(),
+            nn.Dropout(dropout2),
+            RCInvariantLinear(lstm_hidden_dim, pool_out_len, fc_hidden_dim),
+            nn.ReLU(),
+            nn.Linear(fc_hidden_dim, fc_hidden_dim),
+            nn.ReLU(),
+            nn.Linear(fc_hidden_dim, 1)
+        )
+
+    def features(self, x):
+        # x: (N, C, L)
+        x = self.conv_blocks1(x)
+        x = self.lstm(x)
+        x = self.conv_blocks2(x)
+
+        return self.fc(x)
+
+    def forward(self, x):
+        x = rearrange(x, "N L C -> N C L")
+        x = self.features(x)
+        x = rearrange(x, "N 1 -> N")
+
+        return x
+
+
+class DeepFamQ_CRC_DH_RC(DeepFamQ_CRC_RC):
+    """RC-equivariant deepfamq_crc_dh.DeepFamQ_CRC
+
+    Input: (N, 4, L) one-hot in A, C, G, T order, output: (N, 1).
+    """
+    def __init__(
+        self,
+        conv_out_dim: int = 320,
+        conv_kernel_size: List = [9, 15],
+        pool_size: int = 1,
+        lstm_hidden_dim: int = 320,
+        fc_hidden_dim: int = 64,
+        dropout1: float = 0.2,
+        dropout2: float = 0.5,
+        complement: List = [3, 2, 1, 0],
+        seq_len: int = 110
+    ):
+        super().__init__(conv_out_dim, conv_kernel_size, pool_size, lstm_hidden_dim, fc_hidden_dim, dropout1, dropout2, complement, seq_len)
+
+    def forward(self, x):
+        return self.features(x)
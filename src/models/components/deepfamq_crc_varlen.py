@@ -0,0 +1,111 @@
+from typing import List
+import torch
+import torch.nn as nn
+from torch.nn.utils.rnn import pack_padded_sequence, pad_packed_sequence
+from einops import rearrange
+
+
+class ConvBlock(nn.Module):
+    def __init__(
+        self,
+        input_dim: int = 4,
+        out_dim: int = 320,
+        kernel_size: int = 15,
+        pool_size: int = 3,
+        dropout: float = 0.2,
+    ):
+        super().__init__()
+        self.main = nn.Sequential(
+            nn.Conv1d(in_channels=input_dim, out_channels=out_dim, kernel_size=kernel_size, padding="same"),
+            nn.ReLU(),
+            nn.MaxPool1d(pool_size),
+            nn.Dropout(dropout)
+        )
+
+    def forward(self, x):
+        # x: (N, C, L)
+
+        return self.main(x)
+
+
+def one_hot_lengths(x):
+    """(N, L, C) right-padded one-hot -> (N,) position of the last non-zero column + 1"""
+    nonzero = x.abs().sum(dim=2) > 0
+    lengths = x.size(1) - nonzero.flip(1).int().argmax(dim=1)
+
+    return torch.where(nonzero.any(dim=1), lengths, torch.ones_like(lengths))
+
+
+class DeepFamQ_CRC_VarLen(nn.Module):
+    """DeepFamQ_CRC for right-padded batches of any length (datamodule `bucket_width`)
+
+    The BiLSTM runs on packed sequences, so it only steps through each sequence's own length, and
+    the FC head reads a masked mean + max pooling over positions instead of the flattened (C, L) map.
+    The prediction does not depend on how much padding the batch has. Lengths are read from the
+    input itself, so with the default A, T, C, G table (N = 0) trailing N count as padding.
+    Input: (N, L, 4).
+    """
+    def __init__(
+        self,
+        conv_out_dim: int = 320,
+        conv_kernel_size: List = [9, 15],
+        pool_size: int = 3,
+        lstm_hidden_dim: int = 320,
+        fc_hidden_dim: int = 64,
+        dropout1: float = 0.2,
+        dropout2: float = 0.5
+    ):
+        super().__init__()
+        self.pool_size = pool_size
+
+        conv_each_dim = int(conv_out_dim / len(conv_kernel_size))
+        self.conv_blocks1 = nn.ModuleList([ConvBlock(4, conv_each_dim, k, pool_size, dropout1) for k in conv_kernel_size])
+
+        self.lstm = nn.LSTM(input_size=conv_out_dim, hidden_size=lstm_hidden_dim, bidirectional=True)
+
+        conv_each_dim = int(lstm_hidden_dim / len(conv_kernel_size))
+        self.conv_blocks2 = nn.ModuleList([ConvBlock(lstm_hidden_dim * 2, conv_each_dim, k, pool_size, dropout1) for k in conv_kernel_size])
+
+        self.fc = nn.Sequential(
+            nn.Dropout(dropout2),
+            nn.Linear(lstm_hidden_dim * 2, fc_hidden_dim),
+            nn.ReLU(),
+            nn.Linear(fc_hidden_dim, fc_hidden_dim),
+            nn.ReLU(),
+            nn.Linear(fc_hidden_dim, 1)
+        )
+
+    def forward(self, x):
+        # positions whose pooling window reaches into the padding are dropped
+        lengths = (one_hot_lengths(x) // self.pool_size).clamp(min=1)
+        x = rearrange(x, "N L C -> N C L")
+
+        conv_outs = []
+        for conv in self.conv_blocks1:
+            conv_outs.append(conv(x))
+        x = torch.cat(conv_outs, dim=1)
+
+        x = rearrange(x, "N C L -> L N C")
+        total_length = x.size(0)
+        x = pack_padded_sequence(x, lengths.cpu(), enforce_sorted=False)
+        x, (h, c) = self.lstm(x)
+        x, _ = pad_packed_sequence(x, total_length=total_length)
+
+        x = rearrange(x, "L N C -> N C L")
+
+        conv_outs = []
+        for conv in self.conv_blocks2:
+            conv_outs.append(conv(x))
+        x = torch.cat(conv_outs, dim=1)
+
+        lengths = (lengths // self.pool_size).clamp(min=1)
+        mask = (torch.arange(x.size(2), device=x.device) < lengths[:, None]).unsqueeze(1)
+        mean = x.masked_fill(~mask, 0).sum(dim=2) / lengths[:, None]
+        max_ = x.masked_fill(~mask, float("-inf")).amax(dim=2)
+        x = torch.cat([mean, max_], dim=1)
+
+        x = self.fc(x)
+        x = rearrange(x, "N 1 -> N")
+
+        return x
+
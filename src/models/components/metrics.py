@@ -0,0 +1,134 @@
+from typing import Optional
+
+import torch
+from torchmetrics import Metric
+
+
+def pearson_from_sums(n, sum_x, sum_y, sum_xx, sum_yy, sum_xy):
+    """Pearson correlation of the running sums of x, y, x^2, y^2 and xy (float64)"""
+    cov = sum_xy - sum_x * sum_y / n
+    var_x = sum_xx - sum_x ** 2 / n
+    var_y = sum_yy - sum_y ** 2 / n
+
+    return cov / (var_x * var_y).sqrt()
+
+
+def midranks(counts):
+    """Mid-rank of every bin of a 1D histogram: all values of a bin tie, ranks start at 1"""
+    return counts.cumsum(0) - (counts - 1) / 2
+
+
+def spearman_from_histogram(counts):
+    """Spearman correlation of the (bins_x, bins_y) joint histogram of x and y.
+
+    The Pearson correlation of the bin mid-ranks weighted by the counts, which is the exact Spearman
+    correlation of the data with values tied within each bin.
+    """
+    n = counts.sum()
+    count_x, count_y = counts.sum(1), counts.sum(0)
+    rank_x = midranks(count_x) - (n + 1) / 2
+    rank_y = midranks(count_y) - (n + 1) / 2
+    cov = rank_x @ counts @ rank_y
+    var_x = (count_x * rank_x ** 2).sum()
+    var_y = (count_y * rank_y ** 2).sum()
+
+    return cov / (var_x * var_y).sqrt()
+
+
+def spearman_error_bound(counts):
+    """Bound on |binned - exact Spearman| of a (bins_x, bins_y) joint histogram.
+
+    With ranks / n in (0, 1], tying the values of a bin of mass p moves each of its ranks by at most p / 2, so
+    the rank covariance moves by at most (S_x + S_y) / 4 with S = sum p^2 over the bins of a marginal, i.e.
+    3 (S_x + S_y) on the correlation scale (rank variance 1/12). Ties also shrink the rank variances by the
+    factor 1 - sum p^3, which rescales the correlation by at most 1 / sqrt((1 - T_x)(1 - T_y)), T = sum p^3.
+    For values spread evenly over 1024 bins this is ~0.006; it is typically loose by an order of magnitude.
+    """
+    n = counts.sum()
+    p_x, p_y = counts.sum(1) / n, counts.sum(0) / n
+    scale = ((1 - (p_x ** 3).sum()) * (1 - (p_y ** 3).sum())).rsqrt()
+
+    return 3 * ((p_x ** 2).sum() + (p_y ** 2).sum()) * scale + (scale - 1)
+
+
+class StreamingPearsonCorrCoef(Metric):
+    """Pearson correlation from exact float64 running sums: O(1) memory, states are summed across processes"""
+    is_differentiable = False
+    higher_is_better = True
+    full_state_update = False
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # `n_total` as in torchmetrics' PearsonCorrCoef, read by the validation_epoch_end of the models
+        for name in ["n_total", "sum_x", "sum_y", "sum_xx", "sum_yy", "sum_xy"]:
+            self.add_state(name, default=torch.tensor(0.0, dtype=torch.float64), dist_reduce_fx="sum")
+
+    def update(self, preds: torch.Tensor, target: torch.Tensor):
+        x, y = preds.detach().reshape(-1).double(), target.detach().reshape(-1).double()
+        self.n_total += x.numel()
+        self.sum_x += x.sum()
+        self.sum_y += y.sum()
+        self.sum_xx += (x * x).sum()
+        self.sum_yy += (y * y).sum()
+        self.sum_xy += (x * y).sum()
+
+    def compute(self):
+        return pearson_from_sums(self.n_total, self.sum_x, self.sum_y, self.sum_xx, self.sum_yy, self.sum_xy).float()
+
+
+class StreamingSpearmanCorrCoef(Metric):
+    """Spearman correlation from a fixed-bin joint histogram of predictions and targets.
+
+    `bins` x `bins` counts over [`min_value`, `max_value`] (out-of-range values go to the edge bins) replace
+    the stored predictions: memory is fixed (8 MB for 1024 bins), the update is one `index_add_` and the
+    states are summed across processes. The result is exact up to ties within a bin, with
+    `error_bound()` (see `spearman_error_bound`, which also covers values clamped into the edge bins).
+    Without an explicit range, it is set on the first update to the target range of that batch widened by
+    `margin` of its span on both sides (min/max across processes under DDP), so it follows the target
+    scale, raw or normalized. The range is kept across `reset`, so every epoch uses the same bins.
+    """
+    is_differentiable = False
+    higher_is_better = True
+    full_state_update = False
+
+    def __init__(
+        self,
+        bins: int = 1024,
+        min_value: Optional[float] = None,
+        max_value: Optional[float] = None,
+        margin: float = 0.25,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.bins = bins
+        self.min_value = min_value
+        self.max_value = max_value
+        self.margin = margin
+        self.add_state("counts", default=torch.zeros(bins, bins, dtype=torch.float64), dist_reduce_fx="sum")
+
+    def set_range(self, target: torch.Tensor):
+        bounds = torch.stack([-target.min(), target.max()]).detach().double()
+        if torch.distributed.is_available() and torch.distributed.is_initialized():
+            # the same bins in every process, so that the histograms can be summed
+            torch.distributed.all_reduce(bounds, op=torch.distributed.ReduceOp.MAX)
+        lo, hi = -bounds[0].item(), bounds[1].item()
+        span = max(hi - lo, 1e-6)
+        self.min_value = lo - self.margin * span
+        self.max_value = hi + self.margin * span
+
+    def bin_index(self, x):
+        scaled = (x.detach().reshape(-1).double() - self.min_value) * (self.bins / (self.max_value - self.min_value))
+
+        return scaled.floor().clamp(0, self.bins - 1).long()
+
+    def update(self, preds: torch.Tensor, target: torch.Tensor):
+        if self.min_value is None or self.max_value is None:
+            self.set_range(target)
+        cells = self.bin_index(preds) * self.bins + self.bin_index(target)
+        self.counts.view(-1).index_add_(0, cells, torch.ones_like(cells, dtype=torch.float64))
+
+    def compute(self):
+        return spearman_from_histogram(self.counts).float()
+
+    def error_bound(self):
+        return spearman_error_bound(self.counts).float()
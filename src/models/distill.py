@@ -0,0 +1,130 @@
+from typing import List, Optional
+
+import hydra
+import torch
+import torch.nn as nn
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
+
+from src.models.huber import ConjoinedNet_AW_CA
+from src.scoring_pipeline import load_ensemble
+
+
+class DistillNet(ConjoinedNet_AW_CA):
+    """Knowledge distillation of a frozen teacher ensemble into the (smaller) student `net`.
+
+    `teacher_ckpts` are Lightning checkpoints of one architecture (e.g. fold0-4); their nets are loaded with
+    the run config next to them (or `teacher_config`) into a FoldEnsemble. Every view of the batch (fwd/RC,
+    shifted too with ShiftDataset) is scored by the teachers on the fly, and the student is fit view by view to
+    `alpha * loss(student, teacher) + (1 - alpha) * loss(student, y)`, so its mean over views approximates the
+    folds x views teacher. The teachers are kept out of the state dict and the optimizer.
+    Without `teacher_ckpts`, batches are (*x, y, teacher_y) with the teacher predictions of every view cached
+    on disk by the datamodule (`datamodule.teacher_ckpts`), and no teacher runs during training.
+    Validation and test also log the teacher ensemble metrics and the student/teacher retention.
+    """
+    def __init__(
+        self,
+        net: nn.Module,
+        teacher_ckpts: Optional[List[str]] = None,
+        teacher_config: Optional[str] = None,
+        alpha: float = 1.0,
+        lr: float = 1e-4,
+        weight_decay: float = 0,
+        max_epochs: int = 20,
+        eta_min: float = 0.0,
+        fused_views: bool = False
+    ):
+        super().__init__(net, lr, weight_decay, max_epochs, eta_min, fused_views)
+        self.alpha = alpha
+
+        # a plain list, so that the teachers are not registered as submodules
+        self.teachers = []
+        if teacher_ckpts:
+            ckpt_paths = [hydra.utils.to_absolute_path(path) for path in teacher_ckpts]
+            teacher_config = teacher_config and hydra.utils.to_absolute_path(teacher_config)
+            self.teachers.append(load_ensemble(ckpt_paths, teacher_config).requires_grad_(False))
+
+        self.val_teacher_pearson = StreamingPearsonCorrCoef()
+        self.test_teacher_pearson = StreamingPearsonCorrCoef()
+
+        # updated with the same targets as the student metrics, so both histograms get the same bins and the
+        # retention compares like with like on raw or normalized targets
+        self.val_teacher_spearman = StreamingSpearmanCorrCoef()
+        self.test_teacher_spearman = StreamingSpearmanCorrCoef()
+
+    def teacher_forward(self, tensors):
+        """(V, B) teacher ensemble predictions of every view"""
+        teacher = self.teachers[0].to(tensors[0].device)
+        with torch.no_grad():
+            return teacher(torch.cat(tensors)).view(len(tensors), -1)
+
+    def distill_step(self, batch):
+        if self.teachers:
+            Xs, y = batch[: -1], batch[-1]
+            soft_targets = self.teacher_forward(Xs)
+        else:
+            # (B, V) cached teacher predictions
+            Xs, y, teacher_y = batch[: -2], batch[-2], batch[-1]
+            soft_targets = teacher_y.T
+        preds = self(Xs)
+        losses = torch.stack([
+            self.alpha * self.criterion(pred, soft_target) + (1 - self.alpha) * self.criterion(pred, y)
+            for pred, soft_target in zip(preds, soft_targets)
+        ])
+
+        loss = losses.mean()
+        pred = torch.stack(preds).mean(dim=0)
+        teacher_pred = soft_targets.mean(dim=0)
+
+        return loss, pred, teacher_pred, y
+
+    def step(self, batch):
+        loss, pred, _, y = self.distill_step(batch)
+
+        return loss, pred, y
+
+    def validation_step(self, batch, batch_idx):
+        loss, preds, teacher_preds, targets = self.distill_step(batch)
+        self.val_spearman.update(preds, targets)
+        self.val_pearson.update(preds, targets)
+        self.val_teacher_spearman.update(teacher_preds, targets)
+        self.val_teacher_pearson.update(teacher_preds, targets)
+
+        metrics = {"val/loss": loss}
+        self.log_dict(metrics, on_step=False, on_epoch=True, prog_bar=True)
+
+    def validation_epoch_end(self, outputs):
+        self.log_retention("val", self.val_spearman, self.val_pearson, self.val_teacher_spearman, self.val_teacher_pearson)
+        super().validation_epoch_end(outputs)
+
+    def test_step(self, batch, batch_idx):
+        loss, preds, teacher_preds, targets = self.distill_step(batch)
+        self.test_spearman.update(preds, targets)
+        self.test_pearson.update(preds, targets)
+        self.test_teacher_spearman.update(teacher_preds, targets)
+        self.test_teacher_pearson.update(teacher_preds, targets)
+
+        metrics = {"test/loss": loss}
+        self.log_dict(metrics, on_step=False, on_epoch=True, prog_bar=True)
+
+    def test_epoch_end(self, outputs):
+        self.log_retention("test", self.test_spearman, self.test_pearson, self.test_teacher_spearman, self.test_teacher_pearson)
+        super().test_epoch_end(outputs)
+
+    def log_retention(self, prefix, spearman, pearson, teacher_spearman, teacher_pearson):
+        teacher_spearman_value = teacher_spearman.compute()
+        teacher_pearson_value = teacher_pearson.compute()
+
+        metrics = {
+            f"{prefix}/teacher_spearman": teacher_spearman_value,
+            f"{prefix}/teacher_pearson": teacher_pearson_value,
+            f"{prefix}/spearman_retention": spearman.compute() / teacher_spearman_value,
+            f"{prefix}/pearson_retention": pearson.compute() / teacher_pearson_value,
+        }
+        self.log_dict(metrics, on_epoch=True, prog_bar=True)
+
+        teacher_spearman.reset()
+        teacher_pearson.reset()
+
+    def predict_step(self, batch, batch_idx):
+        # student only, the predict set has no teacher predictions
+        return torch.stack(self(batch[: -1])).mean(dim=0)
@@ -1,14 +1,12 @@
 from typing import Any, List
-import json
-from collections import OrderedDict
-import numpy as np
-import pandas as pd
 
 import torch
 import torch.nn as nn
 from pytorch_lightning import LightningModule
-from torchmetrics import MaxMetric, PearsonCorrCoef, SpearmanCorrCoef
+from torchmetrics import MaxMetric
 from cosine_annealing_warmup import CosineAnnealingWarmupRestarts
+from src.utils.predictions import open_writer
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
 
 
 class MainNet(LightningModule):
@@ -28,11 +26,11 @@ class MainNet(LightningModule):
         
         self.criterion = nn.HuberLoss()
         
-        self.val_pearson = PearsonCorrCoef()
-        self.test_pearson = PearsonCorrCoef()
+        self.val_pearson = StreamingPearsonCorrCoef()
+        self.test_pearson = StreamingPearsonCorrCoef()
         
-        self.val_spearman = SpearmanCorrCoef()
-        self.test_spearman = SpearmanCorrCoef()
+        self.val_spearman = StreamingSpearmanCorrCoef()
+        self.test_spearman = StreamingSpearmanCorrCoef()
         
         # for logging best so far validation accuracy
         self.val_spearman_best = MaxMetric()
@@ -122,15 +120,14 @@ class MainNet(LightningModule):
         
         return preds
     
+    def on_predict_start(self):
+        self.submission = open_writer('../../../../../submission.json')
+        
+    def on_predict_batch_end(self, outputs, batch, batch_idx, dataloader_idx):
+        self.submission.write(outputs.float().cpu().numpy())
+    
     def on_predict_epoch_end(self, outputs):
-        data_path = '/data/project/ddp/data/dream/test_sequences.txt'
-        df = pd.read_csv(data_path, sep='\t', names=['sequence', 'measured_expression'])
-        pred = np.array(torch.cat(outputs[0]))
-        df['measured_expression'] = pred
-        
-        prediction_dict = {str(i): float(df.measured_expression.values[i]) for i in range(len(pred))}
-        with open('../../../../../submission.json', 'w') as f:
-            json.dump(prediction_dict, f)
+        self.submission.close()
 
         print("Saved submission file!")
         
@@ -150,11 +147,16 @@ class ConjoinedNet(MainNet):
         self,
         net: nn.Module,
         lr: float = 1e-3,
-        weight_decay: float = 1e-5
+        weight_decay: float = 1e-5,
+        fused_views: bool = False
     ):
         super().__init__(net, lr, weight_decay)
+        self.fused_views = fused_views
     
     def forward(self, tensors):     
+        if self.fused_views:
+            # single pass over all views concatenated along the batch dimension
+            return list(self.net(torch.cat(tensors)).split(len(tensors[0])))
         return [self.net(tensor) for tensor in tensors]
     
     def step(self, batch):
@@ -175,9 +177,10 @@ class ConjoinedNet_AW(ConjoinedNet):
         self,
         net: nn.Module,
         lr: float = 1e-3,
-        weight_decay: float = 1e-2
+        weight_decay: float = 1e-2,
+        fused_views: bool = False
     ):
-        super().__init__(net, lr, weight_decay)
+        super().__init__(net, lr, weight_decay, fused_views)
         
     def configure_optimizers(self):
         return torch.optim.AdamW(self.parameters(), 
@@ -198,9 +201,10 @@ class ConjoinedNet_CAW(ConjoinedNet):
         max_lr: float = 1e-2,
         min_lr: float = 1e-4,
         warmup_steps: int = 2,
-        gamma: float = 1.0
+        gamma: float = 1.0,
+        fused_views: bool = False
     ):
-        super().__init__(net, lr, weight_decay)
+        super().__init__(net, lr, weight_decay, fused_views)
         self.first_cycle_steps = first_cycle_steps
         self.cycle_mult = cycle_mult
         self.max_lr = max_lr
@@ -236,9 +240,10 @@ class ConjoinedNet_CA(ConjoinedNet):
         lr: float = 1e-4,
         weight_decay: float = 0,
         max_epochs: int = 20,
-        eta_min: float = 0.0
+        eta_min: float = 0.0,
+        fused_views: bool = False
     ):
-        super().__init__(net, lr, weight_decay)
+        super().__init__(net, lr, weight_decay, fused_views)
         self.max_epochs = max_epochs
         self.eta_min = eta_min
     
@@ -268,9 +273,10 @@ class ConjoinedNet_AW_CA(ConjoinedNet):
         lr: float = 1e-4,
         weight_decay: float = 0,
         max_epochs: int = 20,
-        eta_min: float = 0.0
+        eta_min: float = 0.0,
+        fused_views: bool = False
     ):
-        super().__init__(net, lr, weight_decay)
+        super().__init__(net, lr, weight_decay, fused_views)
         self.max_epochs = max_epochs
         self.eta_min = eta_min
     
@@ -304,9 +310,10 @@ class ConjoinedNet_AW_CAW(ConjoinedNet):
         max_lr: float = 1e-2,
         min_lr: float = 1e-4,
         warmup_steps: int = 2,
-        gamma: float = 1.0
+        gamma: float = 1.0,
+        fused_views: bool = False
     ):
-        super().__init__(net, lr, weight_decay)
+        super().__init__(net, lr, weight_decay, fused_views)
         self.first_cycle_steps = first_cycle_steps
         self.cycle_mult = cycle_mult
         self.max_lr = max_lr
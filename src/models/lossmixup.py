@@ -1,14 +1,13 @@
 from typing import Any, List
-import json
-from collections import OrderedDict
 import numpy as np
-import pandas as pd
 
 import torch
 import torch.nn as nn
 from pytorch_lightning import LightningModule
-from torchmetrics import MaxMetric, PearsonCorrCoef, SpearmanCorrCoef
+from torchmetrics import MaxMetric
 from cosine_annealing_warmup import CosineAnnealingWarmupRestarts
+from src.utils.predictions import open_writer, sample_submission_ids
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
 
 
 class LossMixupNet(LightningModule):
@@ -42,11 +41,11 @@ class LossMixupNet(LightningModule):
         
         self.criterion = nn.MSELoss()
         
-        self.val_pearson = PearsonCorrCoef()
-        self.test_pearson = PearsonCorrCoef()
+        self.val_pearson = StreamingPearsonCorrCoef()
+        self.test_pearson = StreamingPearsonCorrCoef()
         
-        self.val_spearman = SpearmanCorrCoef()
-        self.test_spearman = SpearmanCorrCoef()
+        self.val_spearman = StreamingSpearmanCorrCoef()
+        self.test_spearman = StreamingSpearmanCorrCoef()
         
         # for logging best so far validation accuracy
         self.val_spearman_best = MaxMetric()
@@ -169,20 +168,17 @@ class LossMixupNet(LightningModule):
         
         return preds
     
-    def on_predict_epoch_end(self, outputs):
-        with open("../../../../../sample_submission.json", "r") as f:
-            ground = json.load(f)
-    
-        indices = np.array([int(indice) for indice in list(ground.keys())])
-        PRED_DATA = OrderedDict()
-        Y_pred = np.array(torch.cat(outputs[0]))
-
-        for i in indices:
-            PRED_DATA[str(i)] = float(Y_pred[i])
-        
+    def on_predict_start(self):
+        self.submission = open_writer(
+            "../../../../../submission.json",
+            keep=sample_submission_ids("../../../../../sample_submission.json")
+        )
         
-        with open("../../../../../submission.json", "w") as f:
-            json.dump(PRED_DATA, f)
+    def on_predict_batch_end(self, outputs, batch, batch_idx, dataloader_idx):
+        self.submission.write(outputs.float().cpu().numpy())
+    
+    def on_predict_epoch_end(self, outputs):
+        self.submission.close()
 
         print("Saved submission file!")
         
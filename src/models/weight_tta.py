@@ -1,14 +1,12 @@
 from typing import Any, List
-import json
-from collections import OrderedDict
-import numpy as np
-import pandas as pd
 
 import torch
 import torch.nn as nn
 from pytorch_lightning import LightningModule
-from torchmetrics import MaxMetric, PearsonCorrCoef, SpearmanCorrCoef
+from torchmetrics import MaxMetric
 from cosine_annealing_warmup import CosineAnnealingWarmupRestarts
+from src.utils.predictions import open_writer, sample_submission_ids
+from src.models.components.metrics import StreamingPearsonCorrCoef, StreamingSpearmanCorrCoef
 
 
 class MainNet(LightningModule):
@@ -28,11 +26,11 @@ class MainNet(LightningModule):
         
         self.criterion = nn.MSELoss()
         
-        self.val_pearson = PearsonCorrCoef()
-        self.test_pearson = PearsonCorrCoef()
+        self.val_pearson = StreamingPearsonCorrCoef()
+        self.test_pearson = StreamingPearsonCorrCoef()
         
-        self.val_spearman = SpearmanCorrCoef()
-        self.test_spearman = SpearmanCorrCoef()
+        self.val_spearman = StreamingSpearmanCorrCoef()
+        self.test_spearman = StreamingSpearmanCorrCoef()
         
         # for logging best so far validation accuracy
         self.val_spearman_best = MaxMetric()
@@ -122,20 +120,17 @@ class MainNet(LightningModule):
         
         return preds
     
-    def on_predict_epoch_end(self, outputs):
-        with open("../../../../../sample_submission.json", "r") as f:
-            ground = json.load(f)
-    
-        indices = np.array([int(indice) for indice in list(ground.keys())])
-        PRED_DATA = OrderedDict()
-        Y_pred = np.array(torch.cat(outputs[0]))
-
-        for i in indices:
-            PRED_DATA[str(i)] = float(Y_pred[i])
-        
+    def on_predict_start(self):
+        self.submission = open_writer(
+            "../../../../../submission.json",
+            keep=sample_submission_ids("../../../../../sample_submission.json")
+        )
         
-        with open("../../../../../submission.json", "w") as f:
-            json.dump(PRED_DATA, f)
+    def on_predict_batch_end(self, outputs, batch, batch_idx, dataloader_idx):
+        self.submission.write(outputs.float().cpu().numpy())
+    
+    def on_predict_epoch_end(self, outputs):
+        self.submission.close()
 
         print("Saved submission file!")
         
@@ -156,11 +151,16 @@ class ConjoinedNet(MainNet):
         net: nn.Module,
         lr: float = 1e-3,
         weight_decay: float = 1e-5,
-        fwd_w: float = 0.6
+        fwd_w: float = 0.6,
+        fused_views: bool = False
     ):
         super().__init__(net, lr, weight_decay)
+        self.fused_views = fused_views
     
     def forward(self, tensors):     
+        if self.fused_views:
+            # single pass over all views concatenated along the batch dimension
+            return list(self.net(torch.cat(tensors)).split(len(tensors[0])))
         return [self.net(tensor) for tensor in tensors]
     
     def step(self, batch):
@@ -190,9 +190,10 @@ class ConjoinedNet_AW_CA(ConjoinedNet):
         weight_decay: float = 0,
         max_epochs: int = 20,
         eta_min: float = 0.0,
-        fwd_w: float = 0.7
+        fwd_w: float = 0.7,
+        fused_views: bool = False
     ):
-        super().__init__(net, lr, weight_decay, fwd_w)
+        super().__init__(net, lr, weight_decay, fwd_w, fused_views)
         self.max_epochs = max_epochs
         self.eta_min = eta_min
     
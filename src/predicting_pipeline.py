@@ -2,11 +2,15 @@ import os
 from typing import List
 
 import hydra
-from omegaconf import DictConfig
+import torch
+from omegaconf import DictConfig, open_dict
 from pytorch_lightning import LightningDataModule, LightningModule, Trainer, seed_everything
 from pytorch_lightning.loggers import LightningLoggerBase
 
 from src import utils
+from src.models.components.ensemble import FoldEnsemble
+from src.quantization_pipeline import is_quantized, load_quantized
+from src.scoring_pipeline import load_net, load_weights
 
 log = utils.get_logger(__name__)
 
@@ -28,6 +32,10 @@ def predict(config: DictConfig) -> None:
     # Convert relative ckpt path to absolute path if necessary
     if not os.path.isabs(config.ckpt_path):
         config.ckpt_path = os.path.join(hydra.utils.get_original_cwd(), config.ckpt_path)
+    ckpt_paths = [
+        path if os.path.isabs(path) else os.path.join(hydra.utils.get_original_cwd(), path)
+        for path in config.get("ckpt_paths") or []
+    ]
 
     # Init lightning datamodule
     log.info(f"Instantiating datamodule <{config.datamodule._target_}>")
@@ -37,6 +45,36 @@ def predict(config: DictConfig) -> None:
     log.info(f"Instantiating model <{config.model._target_}>")
     model: LightningModule = hydra.utils.instantiate(config.model)
 
+    ckpt_path = config.ckpt_path
+    if ckpt_paths:
+        # fold ensemble: every checkpoint's net runs on the same batches, the data is read and encoded once
+        log.info(f"Ensembling {len(ckpt_paths)} checkpoints ({config.ensemble_combine})")
+        nets, quantized = [], False
+        for path in ckpt_paths:
+            checkpoint = torch.load(path, map_location="cpu", weights_only=False)
+            if "quantization" in checkpoint:
+                nets.append(load_quantized(checkpoint))
+                quantized = True
+            else:
+                nets.append(load_weights(hydra.utils.instantiate(config.model.net), checkpoint))
+        model.net = FoldEnsemble(nets, config.get("ensemble_weights"), config.ensemble_combine)
+        ckpt_path = None
+    else:
+        quantized = is_quantized(ckpt_path)
+        if quantized:
+            # int8 net saved by quantize.py, not a Lightning checkpoint
+            log.info("Loading quantized net")
+            model.net = load_net(ckpt_path)
+            ckpt_path = None
+    if quantized:
+        # the quantized kernels only run on CPU
+        log.info("Quantized net: predicting on CPU")
+        with open_dict(config.trainer):
+            config.trainer.gpus = 0
+            config.trainer.accelerator = "cpu"
+            config.trainer.pop("strategy", None)
+            config.trainer.pop("sync_batchnorm", None)
+
     # Init lightning loggers
     logger: List[LightningLoggerBase] = []
     if "logger" in config:
@@ -51,7 +89,8 @@ def predict(config: DictConfig) -> None:
 
     # Log hyperparameters
     if trainer.logger:
-        trainer.logger.log_hyperparams({"ckpt_path": config.ckpt_path})
+        trainer.logger.log_hyperparams({"ckpt_path": ckpt_paths or config.ckpt_path})
 
     log.info("Starting predicting!")
-    trainer.predict(model=model, datamodule=datamodule, ckpt_path=config.ckpt_path)
+    # predictions are written batch by batch in `on_predict_batch_end`, so don't keep them in memory
+    trainer.predict(model=model, datamodule=datamodule, ckpt_path=ckpt_path, return_predictions=False)
@@ -0,0 +1,187 @@
+import copy
+import os
+import pickle
+import sys
+import time
+import warnings
+import zipfile
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+import hydra
+import numpy as np
+import pandas as pd
+import torch
+import torch.ao.quantization as tq
+import torch.nn as nn
+from omegaconf import OmegaConf
+from scipy import stats
+
+from src.datamodules.components.store import encode_many
+from src.scoring_pipeline import LAYOUTS, find_config, forward_strands, load_net
+
+
+def quantize_conv_blocks(net: nn.Module, engine: str = "x86") -> int:
+    """Prepares every `Sequential(Conv1d, ReLU, [MaxPool1d], ...)` of `net` (the ConvBlock.main of the DeepFamQ
+    nets) for static int8 quantization: Conv1d + ReLU are fused and run between a QuantStub and a DeQuantStub
+    together with the max pooling. Returns the number of blocks; `tq.prepare`/`tq.convert` do the rest.
+    """
+    blocks = [
+        (parent, name, child) for parent in net.modules() for name, child in parent.named_children()
+        if isinstance(child, nn.Sequential) and len(child) >= 2 and isinstance(child[0], nn.Conv1d) and isinstance(child[1], nn.ReLU)
+    ]
+    for parent, name, block in blocks:
+        conv = block[0]
+        if conv.padding == "same":
+            # quantized convolutions take explicit padding, which is symmetric only for odd kernels
+            assert all(k % 2 == 1 for k in conv.kernel_size), "padding='same' with an even kernel"
+            conv.padding = tuple(k // 2 for k in conv.kernel_size)
+            conv._reversed_padding_repeated_twice = [k // 2 for k in conv.kernel_size for _ in range(2)]
+        conv_relu = tq.fuse_modules(nn.Sequential(conv, block[1]), [["0", "1"]])[0]
+        pools = [layer for layer in list(block)[2:] if isinstance(layer, nn.MaxPool1d)]
+        rest = [layer for layer in list(block)[2:] if not isinstance(layer, nn.MaxPool1d)]
+        for layer in rest:
+            layer.qconfig = None
+        quantized = nn.Sequential(tq.QuantStub(), conv_relu, *pools, tq.DeQuantStub(), *rest)
+        quantized.qconfig = tq.get_default_qconfig(engine)
+        setattr(parent, name, quantized)
+
+    return len(blocks)
+
+
+def quantize(
+    net: nn.Module,
+    calibration: Optional[Iterable[torch.Tensor]] = None,
+    static_convs: bool = False,
+    engine: str = "x86"
+) -> nn.Module:
+    """int8 copy of `net`: dynamic quantization of the LSTM/GRU and Linear layers and, with `static_convs`,
+    static quantization of the conv blocks with activation ranges observed on the `calibration` input batches.
+    """
+    torch.backends.quantized.engine = engine
+    net = copy.deepcopy(net).eval()
+    if static_convs:
+        quantize_conv_blocks(net, engine)
+        tq.prepare(net, inplace=True)
+        with torch.no_grad():
+            for x in calibration or []:
+                net(x)
+        tq.convert(net, inplace=True)
+
+    return tq.quantize_dynamic(net, {nn.LSTM, nn.GRU, nn.Linear}, dtype=torch.qint8)
+
+
+def save_quantized(net: nn.Module, net_config, path: str, static_convs: bool = False, engine: str = "x86"):
+    """Artifact that `load_net` (score.py, serve.py, predict.py, ...) loads in place of a Lightning checkpoint"""
+    torch.save({
+        "quantization": {"static_convs": static_convs, "engine": engine},
+        "net_config": OmegaConf.to_container(net_config, resolve=True),
+        "state_dict": net.state_dict(),
+    }, path)
+
+
+def load_quantized(checkpoint: dict) -> nn.Module:
+    """Rebuilds the quantized net of a `save_quantized` artifact and loads its int8 weights and scales"""
+    quantization = checkpoint["quantization"]
+    torch.backends.quantized.engine = quantization["engine"]
+    net = hydra.utils.instantiate(checkpoint["net_config"]).eval()
+    with warnings.catch_warnings():
+        # observers are not run: scales and zero points come with the state dict
+        warnings.filterwarnings("ignore", message="must run observer")
+        net = quantize(net, None, quantization["static_convs"], quantization["engine"])
+    net.load_state_dict(checkpoint["state_dict"])
+
+    return net.eval()
+
+
+class _Stub:
+    # stands in for every pickled class: accepts any constructor arguments and state
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __setstate__(self, state):
+        pass
+
+
+class _ContainerUnpickler(pickle.Unpickler):
+    """Rebuilds the dicts, lists and strings of a torch.save pickle only: classes are `_Stub`s (nothing is
+    imported or run) and tensor storages are not read
+    """
+    def find_class(self, module, name):
+        return OrderedDict if (module, name) == ("collections", "OrderedDict") else _Stub
+
+    def persistent_load(self, pid):
+        return None
+
+
+def is_quantized(ckpt_path: str) -> bool:
+    """Whether `ckpt_path` is a `save_quantized` artifact, i.e. has a top-level "quantization" key, from the
+    pickled object of the torch.save archive only (a few kB): the tensor data is not read
+    """
+    if not zipfile.is_zipfile(ckpt_path):
+        return "quantization" in torch.load(ckpt_path, map_location="cpu", weights_only=False)
+    with zipfile.ZipFile(ckpt_path) as archive:
+        name = next(name for name in archive.namelist() if name.endswith("data.pkl"))
+        with archive.open(name) as f:
+            checkpoint = _ContainerUnpickler(f).load()
+
+    return isinstance(checkpoint, dict) and "quantization" in checkpoint
+
+
+def read_data(path: str, n: Optional[int] = None):
+    df = pd.read_csv(path, sep="\t", names=["seq", "target"], nrows=n)
+
+    return df.seq.tolist(), df.target.to_numpy(dtype=np.float32)
+
+
+def predict_all(net: nn.Module, seqs, layout: str = "onehot", rc: bool = True, batch_size: int = 1024):
+    """Predictions and seqs/sec of a whole list of sequences"""
+    start = time.perf_counter()
+    preds = np.concatenate([
+        forward_strands(net, *encode_many(seqs[i:i + batch_size]), layout, rc).numpy() for i in range(0, len(seqs), batch_size)
+    ])
+
+    return preds, len(seqs) / (time.perf_counter() - start)
+
+
+def report(net: nn.Module, quantized: nn.Module, seqs, targets, layout: str = "onehot", rc: bool = True, batch_size: int = 1024) -> pd.DataFrame:
+    """Accuracy and throughput of the fp32 and int8 nets on a labelled set"""
+    preds, rates = {}, {}
+    for name, model in [("fp32", net), ("int8", quantized)]:
+        preds[name], rates[name] = predict_all(model, seqs, layout, rc, batch_size)
+
+    rows = []
+    for name in preds:
+        rows.append({
+            "net": name,
+            "pearson": stats.pearsonr(preds[name], targets)[0],
+            "spearman": stats.spearmanr(preds[name], targets)[0],
+            "pearson_vs_fp32": stats.pearsonr(preds[name], preds["fp32"])[0],
+            "max_abs_diff_vs_fp32": np.abs(preds[name] - preds["fp32"]).max(),
+            "seqs_per_sec": rates[name],
+        })
+
+    return pd.DataFrame(rows).set_index("net")
+
+
+def main(args) -> None:
+    torch.set_num_threads(args.threads)
+    config = OmegaConf.load(args.config or find_config(args.ckpt))
+    net_config = config.model.net if "model" in config else config.net
+    net = load_net(args.ckpt, args.config)
+
+    calibration = None
+    if args.static_convs:
+        seqs, _ = read_data(args.data, args.calibration_batches * args.batch_size)
+        calibration = [LAYOUTS[args.layout](*encode_many(seqs[i:i + args.batch_size]))[0] for i in range(0, len(seqs), args.batch_size)]
+    quantized = quantize(net, calibration, args.static_convs, args.engine)
+    save_quantized(quantized, net_config, args.output, args.static_convs, args.engine)
+
+    size = os.path.getsize(args.output) / 2 ** 20
+    fp32_size = sum(t.numel() * t.element_size() for t in net.state_dict().values()) / 2 ** 20
+    print(f"Saved int8 net to {args.output} ({size:.1f} MB, fp32 weights {fp32_size:.1f} MB)", file=sys.stderr)
+
+    if args.report:
+        seqs, targets = read_data(args.data)
+        quantized = load_quantized(torch.load(args.output, map_location="cpu", weights_only=False))
+        print(report(net, quantized, seqs, targets, args.layout, not args.no_rc, args.batch_size).to_string(float_format="%.4f"))
@@ -0,0 +1,84 @@
+"""Loader of the nets written by export.py; needs only numpy and torch (TorchScript) or onnxruntime (ONNX).
+
+    from src.runtime import ExportedNet
+    net = ExportedNet("fold0.ts")
+    preds = net.predict(["TGCATTTTTTTCACATC...", ...])
+"""
+import json
+from typing import List, Optional
+
+import numpy as np
+
+from src.datamodules.components.encoding import BASE2IDX, INVALID, PAD_IDX, SCAFFOLD_RIGHT
+
+
+def metadata_path(path: str) -> str:
+    # ONNX files carry their metadata in a sidecar file
+    return f"{path}.json"
+
+
+def encode_inputs(seqs: List[str], layout: str = "onehot", width: int = 110) -> np.ndarray:
+    """(B, width) uint8 base indices as the exported graphs take them.
+
+    onehot: left-padded with X (an all-zero one-hot row like N, but told apart from N by the shift views),
+    sequences longer than `width` keep their last `width` bases. dh: first `width` bases followed by the
+    vector scaffold, as `scoring_pipeline.dh_layout`.
+    """
+    lengths = np.fromiter(map(len, seqs), dtype=np.int64, count=len(seqs))
+    buf = BASE2IDX[np.frombuffer("".join(seqs).encode("ascii"), dtype=np.uint8)]
+    if buf.size and buf.max() == INVALID:
+        raise ValueError("Unexpected character in sequences")
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    cols = np.arange(width)
+    if layout == "onehot":
+        pos = lengths[:, None] - width + cols
+        out = buf[np.clip(starts[:, None] + pos, 0, max(len(buf) - 1, 0))]
+        out[pos < 0] = PAD_IDX
+    elif layout == "dh":
+        out = buf[np.clip(starts[:, None] + cols, 0, max(len(buf) - 1, 0))]
+        scaffold = SCAFFOLD_RIGHT[np.clip(cols - lengths[:, None], 0, len(SCAFFOLD_RIGHT) - 1)]
+        out = np.where(cols < lengths[:, None], out, scaffold)
+    else:
+        raise ValueError(f"Unknown layout {layout}")
+
+    return out.astype(np.uint8)
+
+
+class ExportedNet:
+    """TorchScript (`.ts`/`.pt`) or ONNX (`.onnx`) inference graph of export.py: base indices -> views mean"""
+    def __init__(self, path: str, threads: Optional[int] = None):
+        if path.endswith(".onnx"):
+            import onnxruntime as ort
+
+            with open(metadata_path(path)) as f:
+                self.meta = json.load(f)
+            options = ort.SessionOptions()
+            if threads:
+                options.intra_op_num_threads = threads
+            self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+            self.module = None
+        else:
+            import torch
+
+            if threads:
+                torch.set_num_threads(threads)
+            extra_files = {"meta.json": ""}
+            self.module = torch.jit.load(path, map_location="cpu", _extra_files=extra_files)
+            self.meta = json.loads(extra_files["meta.json"])
+            self.session = None
+
+    def __call__(self, x: np.ndarray) -> np.ndarray:
+        """(B, width) uint8 base indices (see `encode_inputs`) -> (B,) float32"""
+        if self.session is not None:
+            return self.session.run(None, {"seqs": x})[0]
+
+        import torch
+
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(x)).numpy()
+
+    def predict(self, seqs: List[str], batch_size: int = 4096) -> np.ndarray:
+        return np.concatenate([
+            self(encode_inputs(seqs[i:i + batch_size], self.meta["layout"], self.meta["width"]))
+            for i in range(0, len(seqs), batch_size)
+        ] or [np.empty(0, dtype=np.float32)])
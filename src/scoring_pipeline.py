@@ -0,0 +1,335 @@
+import hashlib
+import os
+import resource
+import sys
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Iterable, List, Optional, Tuple, Union
+
+import hydra
+import numpy as np
+import torch
+import torch.nn as nn
+from omegaconf import OmegaConf
+
+from src.datamodules.components.encoding import ONE_HOT_ACGT, ONE_HOT_ATCG, SCAFFOLD_RIGHT
+from src.datamodules.components.store import encode_many, file_digest, pad_left_many
+from src.models.components.ensemble import FoldEnsemble
+
+
+def onehot_rc(x):
+    # (B, L, 4) in A, T, C, G order
+    return x.flip(1).index_select(2, torch.LongTensor([1, 0, 3, 2]))
+
+
+def dh_rc(x):
+    # (B, 4, L) in A, C, G, T order
+    return x.flip(2).index_select(1, torch.LongTensor([3, 2, 1, 0]))
+
+
+def onehot_layout(seqs, lengths, max_len=110):
+    """Same input as OneHotDataset: left-padded with N, (B, L, 4) in A, T, C, G order"""
+    x = torch.from_numpy(ONE_HOT_ATCG)[torch.from_numpy(pad_left_many(seqs, lengths, max_len)).long()]
+
+    return x, onehot_rc(x)
+
+
+def dh_layout(seqs, lengths, max_len=110):
+    """Same input as lrpadvec_dh.BaseDataset padding on the right: vector scaffold, (B, 4, L) in A, C, G, T order"""
+    cols = np.arange(max_len)
+    scaffold = SCAFFOLD_RIGHT[np.clip(cols - lengths[:, None], 0, len(SCAFFOLD_RIGHT) - 1)]
+    seqs = np.pad(seqs, ((0, 0), (0, max(0, max_len - seqs.shape[1]))))[:, :max_len]
+    seqs = np.where(cols < lengths[:, None], seqs, scaffold)
+    x = torch.from_numpy(ONE_HOT_ACGT)[torch.from_numpy(seqs).long()].transpose(1, 2)
+
+    return x, dh_rc(x)
+
+
+LAYOUTS = {"onehot": onehot_layout, "dh": dh_layout}
+REVERSE_COMPLEMENTS = {"onehot": onehot_rc, "dh": dh_rc}
+
+
+def find_config(ckpt_path: str) -> str:
+    # <log_dir>/checkpoints/best.ckpt -> <log_dir>/.hydra/config.yaml
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(ckpt_path))), ".hydra", "config.yaml")
+
+
+def load_net(ckpt_path: str, config_path: Optional[str] = None) -> nn.Module:
+    """Instantiates only the `net` component of the model config and loads its weights from a Lightning checkpoint.
+
+    `config_path` is either the composed run config (`.hydra/config.yaml`, default) or a `configs/model/*.yaml`.
+    int8 nets saved by quantize.py are rebuilt from the config stored with them.
+    """
+    checkpoint = torch.load(ckpt_path, map_location="cpu", weights_only=False)
+    if "quantization" in checkpoint:
+        from src.quantization_pipeline import load_quantized
+        return load_quantized(checkpoint)
+
+    config = OmegaConf.load(config_path or find_config(ckpt_path))
+    net_config = config.model.net if "model" in config else config.net
+    net = hydra.utils.instantiate(net_config)
+
+    return load_weights(net, checkpoint)
+
+
+def load_weights(net: nn.Module, ckpt: Union[str, dict]) -> nn.Module:
+    """Loads the `net.*` weights of a Lightning checkpoint (path or loaded dict) into `net`"""
+    checkpoint = torch.load(ckpt, map_location="cpu", weights_only=False) if isinstance(ckpt, str) else ckpt
+    state_dict = checkpoint["state_dict"]
+    state_dict = {k[len("net."):]: v for k, v in state_dict.items() if k.startswith("net.")}
+    net.load_state_dict(state_dict)
+
+    return net.eval()
+
+
+def load_ensemble(ckpt_paths: List[str], config_path: Optional[str] = None, weights: Optional[List[float]] = None,
+                  combine: str = "mean") -> FoldEnsemble:
+    """FoldEnsemble of the nets of several checkpoints of the same architecture, e.g. fold0-4"""
+    return FoldEnsemble([load_net(path, config_path) for path in ckpt_paths], weights, combine).eval()
+
+
+def read_chunks(f, chunk_size: int):
+    """Yields lists of sequences from a `seq` or `seq<TAB>target` file"""
+    while True:
+        lines = list(islice(f, chunk_size))
+        if not lines:
+            return
+        yield [line.split("\t", 1)[0].strip() for line in lines if line.strip()]
+
+
+def write_npy(path: str, batches: Iterable[np.ndarray], row_shape: Tuple[int, ...], dtype) -> int:
+    """Writes the (k, *row_shape) `batches` one after the other to the .npy file `path`, returns the number of rows.
+
+    The header is written for 0 rows and rewritten with the final count (the .npy header leaves room for the first
+    dimension to grow), so neither the input nor the output is held in memory and the count needn't be known ahead.
+    """
+    dtype = np.dtype(dtype)
+    header = {"descr": np.lib.format.dtype_to_descr(dtype), "fortran_order": False}
+    n = 0
+    with open(path, "wb") as f:
+        np.lib.format.write_array_header_1_0(f, {**header, "shape": (0, *row_shape)})
+        offset = f.tell()
+        for batch in batches:
+            assert batch.shape[1:] == tuple(row_shape), f"Expected rows of shape {row_shape}, got {batch.shape[1:]}"
+            f.write(np.ascontiguousarray(batch, dtype=dtype).tobytes())
+            n += len(batch)
+        f.seek(0)
+        np.lib.format.write_array_header_1_0(f, {**header, "shape": (n, *row_shape)})
+        assert f.tell() == offset
+
+    return n
+
+
+class PredictionCache:
+    """LRU cache of predictions keyed by a hash of the encoded sequence and the checkpoint fingerprint.
+
+    Holds at most `max_entries` predictions in memory. With `path`, every new prediction is also appended
+    to `<path>/<fingerprint>.bin` (16-byte key + float32 records), which is loaded back on the next run.
+    Only the last `max_entries` records are read, and the file is rewritten to the cached entries once it holds
+    more than `compact_factor * max_entries` records and on `close`, so it stays bounded across runs.
+    """
+    record = np.dtype([("key", "V16"), ("pred", "<f4")])
+
+    def __init__(self, fingerprint: str, max_entries: int = 1000000, path: Optional[str] = None, compact_factor: int = 2):
+        self.fingerprint = fingerprint.encode()
+        self.max_entries = max_entries
+        self.compact_factor = compact_factor
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.file = None
+        self.file_path = None
+        self.file_records = 0
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self.file_path = os.path.join(path, f"{fingerprint}.bin")
+            if os.path.exists(self.file_path):
+                # the most recently written records; a partial record of an interrupted write is ignored
+                n_records = os.path.getsize(self.file_path) // self.record.itemsize
+                skip = max(0, n_records - max_entries)
+                records = np.fromfile(self.file_path, dtype=self.record, count=n_records - skip, offset=skip * self.record.itemsize)
+                self.entries.update(zip(records["key"].tolist(), records["pred"].tolist()))
+                self.file_records = n_records
+            self.file = open(self.file_path, "ab")
+            if self.file_records > max_entries or os.path.getsize(self.file_path) % self.record.itemsize:
+                self.compact()
+
+    def keys(self, seqs, lengths):
+        return [
+            hashlib.blake2b(seq[:length].tobytes(), digest_size=16, key=self.fingerprint[:64]).digest()
+            for seq, length in zip(seqs, lengths)
+        ]
+
+    def get(self, key):
+        pred = self.entries.get(key)
+        if pred is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return pred
+
+    def put(self, keys, preds):
+        for key, pred in zip(keys, preds):
+            self.entries[key] = pred
+            self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        if self.file is not None:
+            records = np.empty(len(keys), dtype=self.record)
+            records["key"] = keys
+            records["pred"] = preds
+            records.tofile(self.file)
+            self.file.flush()
+            self.file_records += len(keys)
+            if self.file_records > self.compact_factor * self.max_entries:
+                self.compact()
+
+    def compact(self):
+        """Rewrites the file to the cached entries, least recently used first"""
+        self.file.close()
+        records = np.empty(len(self.entries), dtype=self.record)
+        records["key"] = list(self.entries.keys())
+        records["pred"] = list(self.entries.values())
+        tmp_path = f"{self.file_path}.{os.getpid()}.tmp"
+        records.tofile(tmp_path)
+        os.replace(tmp_path, self.file_path)
+        self.file = open(self.file_path, "ab")
+        self.file_records = len(records)
+
+    def hit_rate(self) -> float:
+        return self.hits / max(1, self.hits + self.misses)
+
+    def close(self):
+        if self.file is not None:
+            if self.file_records > self.max_entries:
+                self.compact()
+            self.file.close()
+            self.file = None
+
+
+def checkpoint_fingerprint(ckpt_path: Union[str, List[str]], layout: str = "onehot", rc: bool = True,
+                           combine: str = "mean", weights: Optional[List[float]] = None) -> str:
+    if isinstance(ckpt_path, str):
+        digest = file_digest(ckpt_path)
+    else:
+        # ensemble of checkpoints
+        members = f"{[file_digest(path) for path in ckpt_path]}-{combine}-{weights}"
+        digest = hashlib.blake2b(members.encode(), digest_size=8).hexdigest()
+
+    return f"{digest}-{layout}-{'rc' if rc else 'fwd'}"
+
+
+def predict_batch(net: nn.Module, seqs, layout: str = "onehot", rc: bool = True, cache: Optional[PredictionCache] = None) -> torch.Tensor:
+    """Predictions for a list of sequence strings.
+
+    With `rc`, the prediction is the mean over the forward and reverse-complement strands as in ConjoinedNet,
+    computed in a single pass over both strands. With `cache`, only sequences not in the cache go through the net.
+    """
+    seqs, lengths = encode_many(seqs)
+    if cache is None:
+        return forward_strands(net, seqs, lengths, layout, rc)
+
+    keys = cache.keys(seqs, lengths)
+    preds = np.array([cache.get(key) for key in keys], dtype=np.float32)
+    misses = np.flatnonzero(np.isnan(preds))
+    if len(misses):
+        # repeated sequences of the batch are scored once
+        first = {}
+        for i in misses:
+            first.setdefault(keys[i], i)
+        rows = np.array(list(first.values()))
+        computed = dict(zip(first, forward_strands(net, seqs[rows], lengths[rows], layout, rc).tolist()))
+        cache.put(list(computed), list(computed.values()))
+        preds[misses] = [computed[keys[i]] for i in misses]
+
+    return torch.from_numpy(preds)
+
+
+def forward_strands(net: nn.Module, seqs, lengths, layout: str = "onehot", rc: bool = True) -> torch.Tensor:
+    x, x_rev = LAYOUTS[layout](seqs, lengths)
+
+    return predict_views(net, x, x_rev if rc else None)
+
+
+def predict_views(net: nn.Module, x, x_rev=None) -> torch.Tensor:
+    """(B,) predictions of a net input batch, averaged with its reverse complement `x_rev` if given"""
+    with torch.inference_mode():
+        if x_rev is not None:
+            return net(torch.cat([x, x_rev])).view(2, -1).mean(dim=0)
+        return net(x).view(-1)
+
+
+def predict_members(ensemble: FoldEnsemble, x, x_rev=None) -> torch.Tensor:
+    """(M, B) per-member predictions of a net input batch, each averaged with `x_rev` if given"""
+    with torch.inference_mode():
+        if x_rev is not None:
+            return ensemble.members(torch.cat([x, x_rev])).view(len(ensemble.nets), 2, -1).mean(dim=1)
+        return ensemble.members(x)
+
+
+def score(
+    net: nn.Module,
+    input_file,
+    output_file,
+    layout: str = "onehot",
+    batch_size: int = 4096,
+    rc: bool = True,
+    cache: Optional[PredictionCache] = None,
+    members: bool = False
+) -> int:
+    """Writes `seq<TAB>prediction` lines to `output_file` chunk by chunk, see `predict_batch`.
+
+    With `members` (`net` is a FoldEnsemble), every line also has the prediction of each member, uncached.
+    """
+    n = 0
+    for chunk in read_chunks(input_file, batch_size):
+        if not chunk:
+            continue
+        if members:
+            x, x_rev = LAYOUTS[layout](*encode_many(chunk))
+            member_preds = predict_members(net, x, x_rev if rc else None)
+            rows = torch.cat([net.reduce(member_preds)[None], member_preds]).T.tolist()
+            output_file.writelines(f"{seq}\t" + "\t".join(f"{pred:.6f}" for pred in row) + "\n" for seq, row in zip(chunk, rows))
+        else:
+            preds = predict_batch(net, chunk, layout, rc, cache)
+            output_file.writelines(f"{seq}\t{pred:.6f}\n" for seq, pred in zip(chunk, preds.tolist()))
+        n += len(chunk)
+
+    return n
+
+
+def main(args) -> None:
+    torch.set_num_threads(args.threads)
+    if len(args.ckpt) > 1:
+        net = load_ensemble(args.ckpt, args.config, args.weights, args.combine)
+        ckpt = args.ckpt
+    else:
+        net = load_net(args.ckpt[0], args.config)
+        ckpt = args.ckpt[0]
+    cache = None
+    if (args.cache_entries or args.cache_dir) and not args.members:
+        fingerprint = checkpoint_fingerprint(ckpt, args.layout, not args.no_rc, args.combine, args.weights)
+        cache = PredictionCache(fingerprint, args.cache_entries or 1000000, args.cache_dir)
+
+    input_file = sys.stdin if args.input == "-" else open(args.input)
+    output_file = sys.stdout if args.output == "-" else open(args.output, "w")
+    start = time.perf_counter()
+    try:
+        n = score(net, input_file, output_file, args.layout, args.batch_size, not args.no_rc, cache, args.members and len(args.ckpt) > 1)
+    finally:
+        if cache is not None:
+            cache.close()
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Scored {n} sequences in {elapsed:.1f}s ({n / elapsed:.0f} seqs/sec), peak RSS {peak_rss:.0f} MB", file=sys.stderr)
+    if cache is not None:
+        print(f"Prediction cache: {cache.hits} hits, {cache.misses} misses ({100 * cache.hit_rate():.1f}% hit rate)", file=sys.stderr)
@@ -0,0 +1,284 @@
+import asyncio
+import http.client
+import json
+import os
+import socket
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from src.datamodules.components.encoding import BASE2IDX, INVALID
+from src.scoring_pipeline import PredictionCache, checkpoint_fingerprint, load_net, predict_batch
+
+
+class ServerMetrics:
+    """Request latency and batch fill over the last `window` requests/batches"""
+    def __init__(self, max_batch: int, window: int = 10000, cache: Optional[PredictionCache] = None):
+        self.max_batch = max_batch
+        self.cache = cache
+        self.latencies = deque(maxlen=window)
+        self.batch_sizes = deque(maxlen=window)
+        self.n_requests = 0
+        self.n_seqs = 0
+        self.n_batches = 0
+
+    def add_request(self, n_seqs: int, latency: float):
+        self.latencies.append(latency)
+        self.n_requests += 1
+        self.n_seqs += n_seqs
+
+    def add_batch(self, n_seqs: int):
+        self.batch_sizes.append(n_seqs)
+        self.n_batches += 1
+
+    def summary(self) -> dict:
+        latencies = 1000 * np.array(self.latencies) if self.latencies else np.zeros(1)
+        batch_sizes = np.array(self.batch_sizes) if self.batch_sizes else np.zeros(1)
+
+        summary = {
+            "requests": self.n_requests,
+            "sequences": self.n_seqs,
+            "batches": self.n_batches,
+            "latency_ms_p50": float(np.percentile(latencies, 50)),
+            "latency_ms_p99": float(np.percentile(latencies, 99)),
+            "batch_size_mean": float(batch_sizes.mean()),
+            "batch_fill_mean": float(np.minimum(batch_sizes / self.max_batch, 1).mean()),
+        }
+        if self.cache is not None:
+            summary["cache_hit_rate"] = self.cache.hit_rate()
+            summary["cache_entries"] = len(self.cache.entries)
+
+        return summary
+
+
+class MicroBatcher:
+    """Coalesces concurrent requests for one net into batches of up to `max_batch` sequences.
+
+    A batch is run as soon as it is full or `max_wait` seconds after its first request arrived.
+    The forward pass runs in a single worker thread so that the event loop keeps accepting requests.
+    """
+    def __init__(
+        self,
+        net: nn.Module,
+        layout: str = "onehot",
+        rc: bool = True,
+        max_batch: int = 1024,
+        max_wait: float = 0.005,
+        cache: Optional[PredictionCache] = None
+    ):
+        self.net = net
+        self.layout = layout
+        self.rc = rc
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.cache = cache
+        self.metrics = ServerMetrics(max_batch, cache=cache)
+        self.executor = ThreadPoolExecutor(1)
+        self.queue: Optional[asyncio.Queue] = None
+
+    async def score(self, seqs: List[str]) -> List[float]:
+        start = time.perf_counter()
+        # reject bad input here, so that it does not fail the whole batch it would be merged into
+        if BASE2IDX[np.frombuffer("".join(seqs).encode("ascii"), dtype=np.uint8)].max() == INVALID:
+            raise ValueError("Unexpected character in sequences")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((seqs, future))
+        preds = await future
+        self.metrics.add_request(len(seqs), time.perf_counter() - start)
+
+        return preds
+
+    async def next_batch(self):
+        items = [await self.queue.get()]
+        n = len(items[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        while n < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            getter = asyncio.ensure_future(self.queue.get())
+            done, _ = await asyncio.wait({getter}, timeout=timeout)
+            if getter not in done and getter.cancel():
+                # a cancelled get leaves its item in the queue
+                break
+            items.append(getter.result())
+            n += len(items[-1][0])
+
+        return items
+
+    async def run(self):
+        self.queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        while True:
+            items = await self.next_batch()
+            seqs = [seq for request_seqs, _ in items for seq in request_seqs]
+            try:
+                preds = await loop.run_in_executor(self.executor, predict_batch, self.net, seqs, self.layout, self.rc, self.cache)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.add_batch(len(seqs))
+
+            preds = preds.tolist()
+            start = 0
+            for request_seqs, future in items:
+                if not future.done():
+                    future.set_result(preds[start:start + len(request_seqs)])
+                start += len(request_seqs)
+
+
+class ScoringServer:
+    """Minimal HTTP/1.1 JSON server on localhost TCP or a Unix socket.
+
+    POST /score    {"seqs": [...], "model": optional name} -> {"preds": [...]}
+    GET  /metrics  per-model request latency p50/p99 and batch fill
+    GET  /models   names of the loaded nets
+    """
+    def __init__(self, batchers: Dict[str, MicroBatcher]):
+        self.batchers = batchers
+        self.default = next(iter(batchers))
+
+    async def route(self, method: str, path: str, body: bytes):
+        if method == "GET" and path == "/metrics":
+            return 200, {name: batcher.metrics.summary() for name, batcher in self.batchers.items()}
+        if method == "GET" and path == "/models":
+            return 200, {"models": list(self.batchers)}
+        if method == "POST" and path == "/score":
+            try:
+                request = json.loads(body)
+                seqs = request["seqs"]
+                batcher = self.batchers[request.get("model") or self.default]
+            except (ValueError, KeyError, TypeError) as e:
+                return 400, {"error": f"bad request: {e!r}"}
+            # a string would be scored base by base, an empty sequence has no prediction
+            if not isinstance(seqs, list) or not all(isinstance(seq, str) and seq for seq in seqs):
+                return 400, {"error": "bad request: seqs must be a list of non-empty strings"}
+            if not seqs:
+                return 200, {"preds": []}
+            try:
+                return 200, {"preds": await batcher.score(seqs)}
+            except (ValueError, TypeError) as e:
+                return 400, {"error": str(e)}
+
+        return 404, {"error": f"no route {method} {path}"}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # keep-alive: serve requests on this connection until the client closes it
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    key, value = line.decode("latin-1").split(":", 1)
+                    headers[key.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                try:
+                    status, payload = await self.route(method, path, body)
+                except Exception as e:
+                    # e.g. the net failing on a batch: answer instead of dropping the connection
+                    status, payload = 500, {"error": f"internal error: {e!r}"}
+                data = json.dumps(payload).encode()
+                writer.write(
+                    f"HTTP/1.1 {status} {http.client.responses[status]}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 8008, unix_socket: Optional[str] = None, started=None):
+        workers = [asyncio.create_task(batcher.run()) for batcher in self.batchers.values()]
+        if unix_socket:
+            server = await asyncio.start_unix_server(self.handle, unix_socket)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        if started is not None:
+            started.set()
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for worker in workers:
+                worker.cancel()
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost")
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+class ScoringClient:
+    """Blocking client of ScoringServer, keeps one connection open"""
+    def __init__(self, host: str = "127.0.0.1", port: int = 8008, unix_socket: Optional[str] = None):
+        if unix_socket:
+            self.conn = UnixHTTPConnection(unix_socket)
+        else:
+            self.conn = http.client.HTTPConnection(host, port)
+
+    def request(self, method: str, path: str, payload=None):
+        body = None if payload is None else json.dumps(payload)
+        self.conn.request(method, path, body, {"Content-Type": "application/json"})
+        response = self.conn.getresponse()
+        result = json.loads(response.read())
+        if response.status != 200:
+            raise RuntimeError(f"{response.status}: {result.get('error')}")
+
+        return result
+
+    def score(self, seqs: List[str], model: Optional[str] = None) -> List[float]:
+        return self.request("POST", "/score", {"seqs": seqs, "model": model})["preds"]
+
+    def metrics(self) -> dict:
+        return self.request("GET", "/metrics")
+
+    def close(self):
+        self.conn.close()
+
+
+def model_name(spec: str) -> str:
+    # `name=path/to/best.ckpt`, or the run directory of <run>/checkpoints/best.ckpt
+    if "=" in spec:
+        return spec.split("=", 1)[0]
+    return os.path.basename(os.path.dirname(os.path.dirname(os.path.abspath(spec))))
+
+
+def main(args) -> None:
+    torch.set_num_threads(args.threads)
+    batchers = {}
+    for spec in args.ckpt:
+        name, ckpt = model_name(spec), spec.split("=", 1)[-1]
+        if name in batchers:
+            name = f"{name}_{len(batchers)}"
+        net = load_net(ckpt, args.config)
+        cache = None
+        if args.cache_entries:
+            cache = PredictionCache(checkpoint_fingerprint(ckpt, args.layout, not args.no_rc), args.cache_entries, args.cache_dir)
+        batchers[name] = MicroBatcher(net, args.layout, not args.no_rc, args.max_batch, args.max_wait / 1000, cache)
+
+    where = args.unix_socket or f"http://{args.host}:{args.port}"
+    print(f"Serving {', '.join(batchers)} on {where}", file=sys.stderr)
+    asyncio.run(ScoringServer(batchers).serve(args.host, args.port, args.unix_socket))
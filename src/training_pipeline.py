@@ -1,8 +1,12 @@
+import copy
+import logging
 import os
+from multiprocessing.connection import wait
 from typing import List, Optional
 
 import hydra
-from omegaconf import DictConfig
+import torch.multiprocessing as mp
+from omegaconf import DictConfig, OmegaConf
 from pytorch_lightning import (
     Callback,
     LightningDataModule,
@@ -13,6 +17,7 @@ from pytorch_lightning import (
 from pytorch_lightning.loggers import LightningLoggerBase
 
 from src import utils
+from src.datamodules.components.store import SequenceStore
 
 log = utils.get_logger(__name__)
 
@@ -28,10 +33,6 @@ def train(config: DictConfig) -> Optional[float]:
         Optional[float]: Metric score for hyperparameter optimization.
     """
 
-    # Set seed for random number generators in pytorch, numpy and python.random
-    if config.get("seed"):
-        seed_everything(config.seed, workers=True)
-
     # Convert relative ckpt path to absolute path if necessary
     ckpt_path = config.trainer.get("resume_from_checkpoint")
     if ckpt_path and not os.path.isabs(ckpt_path):
@@ -39,6 +40,13 @@ def train(config: DictConfig) -> Optional[float]:
             hydra.utils.get_original_cwd(), ckpt_path
         )
 
+    if config.get("fold") == "all":
+        return train_folds(config)
+
+    # Set seed for random number generators in pytorch, numpy and python.random
+    if config.get("seed"):
+        seed_everything(config.seed, workers=True)
+
     # Init lightning datamodule
     log.info(f"Instantiating datamodule <{config.datamodule._target_}>")
     datamodule: LightningDataModule = hydra.utils.instantiate(config.datamodule)
@@ -119,3 +127,89 @@ def train(config: DictConfig) -> Optional[float]:
 
     # Return metric score for hyperparameter optimization
     return score
+
+
+def train_folds(config: DictConfig) -> Optional[float]:
+    """Trains the CV folds in `config.folds` as sibling processes.
+
+    The data files are compiled to sequence stores once here and every fold process memory-maps
+    the same store, so the training file is parsed and encoded only once. Each fold runs the
+    regular pipeline in its own `fold{i}` log directory next to the current one, so checkpoints
+    end up where single-fold runs put them.
+
+    Returns:
+        Optional[float]: Mean metric score over folds.
+    """
+    # the fold processes run in their own directory, outside of Hydra: make relative paths absolute here
+    for section in ("datamodule", "model"):
+        if section in config:
+            _absolute_paths(config[section])
+
+    dm_conf = config.datamodule
+    if "cache_dir" in dm_conf:
+        for key in ("train_dir", "test_dir", "predict_dir"):
+            if dm_conf.get(key):
+                log.info(f"Compiling sequence store of <{dm_conf[key]}>")
+                dm_conf[key] = SequenceStore.compile(dm_conf[key], dm_conf.cache_dir).path
+
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    pending, running = list(config.folds), []
+    while pending or running:
+        while pending and len(running) < config.get("fold_parallel", len(config.folds)):
+            fold = pending.pop(0)
+            fold_config = copy.deepcopy(config)
+            fold_config.fold = fold
+            if config.get("fold_gpus"):
+                fold_config.trainer.gpus = config.fold_gpus[list(config.folds).index(fold)]
+            # resolve here, hydra resolvers are not available in the child processes
+            fold_config = OmegaConf.to_container(fold_config, resolve=True)
+            work_dir = os.path.join(os.path.dirname(os.getcwd()), f"fold{fold}")
+            log.info(f"Starting fold {fold} in <{work_dir}>")
+            process = ctx.Process(target=_train_fold, args=(fold_config, work_dir, queue))
+            process.start()
+            running.append((fold, process))
+
+        # whichever fold finishes first frees its slot
+        finished = wait([process.sentinel for _, process in running])
+        for fold, process in [(fold, process) for fold, process in running if process.sentinel in finished]:
+            process.join()
+            running.remove((fold, process))
+            if process.exitcode != 0:
+                # don't leave the other folds training (and holding their GPUs) behind
+                for _, other in running:
+                    other.terminate()
+                for _, other in running:
+                    other.join()
+                raise RuntimeError(f"Training fold {fold} failed with exit code {process.exitcode}")
+
+    scores = dict(queue.get() for _ in config.folds)
+    log.info(f"Fold scores: {scores}")
+    scores = [score for score in scores.values() if score is not None]
+
+    return sum(scores) / len(scores) if scores else None
+
+
+PATH_SUFFIXES = ("_dir", "_path", "_paths", "_ckpts", "_config")
+
+
+def _absolute_paths(conf: DictConfig) -> None:
+    """Resolves path-valued entries (keys ending with PATH_SUFFIXES, nested too) against the original cwd"""
+    for key in list(conf.keys()):
+        value = conf[key]
+        if isinstance(value, DictConfig):
+            _absolute_paths(value)
+        elif value is not None and str(key).endswith(PATH_SUFFIXES):
+            if isinstance(value, str):
+                conf[key] = hydra.utils.to_absolute_path(value)
+            elif OmegaConf.is_list(value):
+                conf[key] = [hydra.utils.to_absolute_path(path) for path in value]
+
+
+def _train_fold(config: dict, work_dir: str, queue) -> None:
+    logging.basicConfig(level=logging.INFO, format=f"[fold{config['fold']}][%(name)s][%(levelname)s] - %(message)s")
+    os.makedirs(work_dir, exist_ok=True)
+    os.chdir(work_dir)
+
+    score = train(OmegaConf.create(config))
+    queue.put((config["fold"], None if score is None else float(score)))
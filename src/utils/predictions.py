@@ -0,0 +1,156 @@
+import json
+import os
+import re
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+
+class PredictionWriter:
+    """Appends predictions to a file batch by batch instead of building the whole submission in memory.
+
+    Row ids default to the running position in prediction order (i.e. the row of the predict file).
+    With `keep`, only those row ids are written (e.g. the keys of sample_submission.json).
+    """
+    mode = "w"
+
+    def __init__(self, path: str, keep: Optional[np.ndarray] = None):
+        self.f = open(path, self.mode)
+        self.keep = None if keep is None else np.asarray(keep)
+        self.n = 0
+        self.open()
+
+    def write(self, preds, ids=None):
+        preds = np.asarray(preds).reshape(-1)
+        if ids is None:
+            ids = np.arange(self.n, self.n + len(preds))
+        self.n += len(preds)
+        if self.keep is not None:
+            mask = np.isin(ids, self.keep)
+            preds, ids = preds[mask], np.asarray(ids)[mask]
+        if len(preds):
+            self.write_rows(ids, preds)
+
+    def open(self):
+        pass
+
+    def write_rows(self, ids, preds):
+        raise NotImplementedError
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JsonWriter(PredictionWriter):
+    """`{"id": prediction, ...}`, same output as `json.dump` of the submission dict"""
+    def open(self):
+        self.f.write("{")
+        self.first = True
+
+    def write_rows(self, ids, preds):
+        # json.dump writes floats with repr, except for NaN/Infinity
+        values = map(repr if np.isfinite(preds).all() else json.dumps, preds.tolist())
+        rows = ", ".join(f'"{i}": {v}' for i, v in zip(ids, values))
+        self.f.write(rows if self.first else ", " + rows)
+        self.first = False
+
+    def close(self):
+        self.f.write("}\n")
+        super().close()
+
+
+class TsvWriter(PredictionWriter):
+    """`id<TAB>prediction` lines"""
+    def write_rows(self, ids, preds):
+        self.f.writelines(f"{i}\t{v!r}\n" for i, v in zip(ids, preds.tolist()))
+
+
+class BinaryWriter(PredictionWriter):
+    """Raw float32 predictions, readable with np.memmap.
+
+    Rows are in prediction order. Ids are not stored while they are the row positions; once they are not
+    (`keep`, or ids passed to `write`), they go to an int64 sidecar `<path>.ids` read back by `read_predictions`.
+    """
+    mode = "wb"
+
+    def open(self):
+        self.rows = 0
+        self.ids_file = None
+        if os.path.exists(ids_path(self.f.name)):
+            os.remove(ids_path(self.f.name))
+
+    def write_rows(self, ids, preds):
+        ids = np.asarray(ids, dtype=np.int64)
+        if self.ids_file is None and not np.array_equal(ids, np.arange(self.rows, self.rows + len(ids))):
+            self.ids_file = open(ids_path(self.f.name), "wb")
+            np.arange(self.rows, dtype=np.int64).tofile(self.ids_file)
+        if self.ids_file is not None:
+            ids.tofile(self.ids_file)
+        preds.astype(np.float32).tofile(self.f)
+        self.rows += len(preds)
+
+    def close(self):
+        if self.ids_file is not None:
+            self.ids_file.close()
+        super().close()
+
+
+def ids_path(path: str) -> str:
+    return f"{path}.ids"
+
+
+WRITERS = {".json": JsonWriter, ".tsv": TsvWriter, ".txt": TsvWriter, ".bin": BinaryWriter}
+
+
+def open_writer(path: str, keep: Optional[np.ndarray] = None) -> PredictionWriter:
+    return WRITERS[os.path.splitext(path)[1]](path, keep)
+
+
+def sample_submission_ids(path: str) -> np.ndarray:
+    with open(path) as f:
+        return np.array([int(i) for i in json.load(f)])
+
+
+JSON_ITEM = re.compile(r'"((?:[^"\\]|\\.)*)"\s*:\s*([^,\s}]+)')
+
+
+def read_predictions(path: str, chunk_size: int = 1 << 20) -> Iterator[Tuple[list, np.ndarray]]:
+    """Yields (ids, predictions) chunks from a file written by any of the writers above"""
+    ext = os.path.splitext(path)[1]
+    if ext == ".bin":
+        preds = np.memmap(path, dtype=np.float32, mode="r")
+        ids = np.memmap(ids_path(path), dtype=np.int64, mode="r") if os.path.exists(ids_path(path)) else None
+        for start in range(0, len(preds), chunk_size):
+            stop = min(start + chunk_size, len(preds))
+            chunk_ids = list(range(start, stop)) if ids is None else ids[start:stop].tolist()
+            yield chunk_ids, np.asarray(preds[start:stop], dtype=np.float64)
+    elif ext == ".json":
+        # flat {"id": number, ...} object, parsed chunk by chunk up to the last complete item
+        with open(path) as f:
+            rest = ""
+            for buf in iter(lambda: f.read(chunk_size), ""):
+                buf = rest + buf
+                end = buf.rfind(",")
+                if end < 0:
+                    rest = buf
+                    continue
+                items = JSON_ITEM.findall(buf, 0, end)
+                rest = buf[end:]
+                yield [k for k, _ in items], np.array([v for _, v in items], dtype=np.float64)
+            items = JSON_ITEM.findall(rest)
+            if items:
+                yield [k for k, _ in items], np.array([v for _, v in items], dtype=np.float64)
+    else:
+        with open(path) as f:
+            while True:
+                lines = f.readlines(chunk_size)
+                if not lines:
+                    return
+                ids, values = zip(*(line.rstrip("\n").split("\t") for line in lines))
+                yield list(ids), np.array(values, dtype=np.float64)